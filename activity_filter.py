@@ -0,0 +1,88 @@
+"""Rules deciding which Destiny 2 activities Hawthorne reports.
+
+Rules are compiled into hash sets, so checking an activity costs a few set lookups however many rules there are. They
+can be given as a dict (e.g. parsed from JSON in Redis or an environment variable):
+    {
+        "pairs": [[82913930, 2166136261]],   # (activity hash, activity mode hash) pairs never to report
+        "activities": [3903562779],          # activity hashes never to report, whatever the mode
+        "modes": [2166136261],               # activity mode hashes never to report, whatever the activity
+        "repeats": [1019949956]              # activity hashes not to report again when played back-to-back
+    }
+
+Example usage:
+    activity_filter = ActivityFilter.from_json(my_redis.get('activity_filter'), base_rules=DEFAULT_RULES)
+    if not activity_filter.is_blacklisted(activity_hash, activity_mode_hash):
+        ...
+"""
+import json
+
+RULE_KEYS = ('pairs', 'activities', 'modes', 'repeats')
+
+
+class ActivityFilter:
+    """A compiled set of activity reporting rules."""
+    __slots__ = ('pairs', 'activities', 'modes', 'repeats')
+
+    def __init__(self, pairs=(), activities=(), modes=(), repeats=()):
+        self.pairs = frozenset((int(activity_hash), int(mode_hash)) for activity_hash, mode_hash in pairs)
+        self.activities = frozenset(int(activity_hash) for activity_hash in activities)
+        self.modes = frozenset(int(mode_hash) for mode_hash in modes)
+        self.repeats = frozenset(int(activity_hash) for activity_hash in repeats)
+
+    @classmethod
+    def from_rules(cls, *rule_sets):
+        """Compile one or more rule dicts into a single filter; later rule sets add to earlier ones.
+
+        :param rule_sets: dicts with any of the keys in RULE_KEYS
+        :return: ActivityFilter
+        :raises ValueError: if a rule set isn't a dict of lists of hashes (or of pairs of hashes, for 'pairs')
+        """
+        merged = {key: [] for key in RULE_KEYS}
+        for rules in rule_sets:
+            rules = rules or {}
+            if not isinstance(rules, dict):
+                raise ValueError(f"Activity filter rules must be an object, not {type(rules).__name__}")
+            unknown = set(rules) - set(RULE_KEYS)
+            if unknown:
+                raise ValueError(f"Unknown activity filter rules: {', '.join(sorted(unknown))}")
+            for key in RULE_KEYS:
+                values = rules.get(key, [])
+                if not isinstance(values, (list, tuple)):
+                    raise ValueError(f"Activity filter rule '{key}' must be a list, not {type(values).__name__}")
+                merged[key].extend(values)
+        try:
+            return cls(**merged)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid activity filter rules: {e}") from e
+
+    @classmethod
+    def from_json(cls, *documents, base_rules=None):
+        """Compile rule sets given as JSON documents, skipping any that are empty or None.
+
+        :param documents: JSON strings
+        :param base_rules: a rule dict that the documents add to
+        :return: ActivityFilter
+        :raises ValueError: if a document isn't valid JSON or doesn't hold valid rules
+        """
+        return cls.from_rules(base_rules, *(json.loads(document) for document in documents if document))
+
+    def is_blacklisted(self, activity_hash, activity_mode_hash):
+        """Whether an activity should never be reported.
+
+        :param activity_hash:
+        :param activity_mode_hash:
+        :return: bool
+        """
+        return (
+            (activity_hash, activity_mode_hash) in self.pairs
+            or activity_hash in self.activities
+            or activity_mode_hash in self.modes
+        )
+
+    def suppresses_repeats(self, activity_hash):
+        """Whether an activity should not be reported again when a player plays it back-to-back.
+
+        :param activity_hash:
+        :return: bool
+        """
+        return activity_hash in self.repeats
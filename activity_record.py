@@ -0,0 +1,78 @@
+"""A compact record of a player's current Destiny 2 activity, as reported on by Hawthorne.
+
+Only the fields that announcing, deduplicating and listing activities need are kept, rather than the Bungie.net
+responses they were derived from, and records are stored in Redis as a JSON array of the format's version followed by
+those fields, in slot order.
+
+Example usage:
+    record = ActivityRecord(slack_id='U0123456', destiny_player_name='Louis', membership_type=3, ...)
+    my_redis.set(key, record.to_json())
+    record = ActivityRecord.from_json(my_redis.get(key))
+"""
+import json
+
+
+class ActivityRecord:
+    """A player's most recent activity, with the Slack member and Destiny character it belongs to."""
+    __slots__ = (
+        'slack_id', 'slack_display_name', 'destiny_player_name', 'membership_type', 'membership_id',
+        'active_character', 'character_class_hash', 'activity_hash', 'activity_mode_hash', 'started',
+        'activity_name', 'blacklisted', 'party',
+    )
+    # Bump whenever the slots change (even if their number doesn't), so that records cached in the old layout are
+    # ignored rather than loaded into the wrong fields.
+    FORMAT_VERSION = 1
+
+    def __init__(self, slack_id, slack_display_name, destiny_player_name, membership_type, membership_id,
+                 active_character=None, character_class_hash=None, activity_hash=None, activity_mode_hash=None,
+                 started=0, activity_name=None, blacklisted=False, party=()):
+        """
+        :param slack_id:
+        :param slack_display_name:
+        :param destiny_player_name:
+        :param membership_type:
+        :param membership_id:
+        :param active_character: the id of the character that played most recently, or None if none has
+        :param character_class_hash: the active character's classHash, as a str
+        :param activity_hash: the activity's hash
+        :param activity_mode_hash: the activity mode's hash
+        :param started: the activity's start time, in seconds since the epoch
+        :param activity_name: the activity's display name, or None if it wasn't looked up (e.g. it's blacklisted)
+        :param blacklisted: whether the activity filter says not to report the activity
+        :param party: the membership ids of the player's fireteam, from their profile's transitory data
+        """
+        self.slack_id = slack_id
+        self.slack_display_name = slack_display_name
+        self.destiny_player_name = destiny_player_name
+        self.membership_type = membership_type
+        self.membership_id = membership_id
+        self.active_character = active_character
+        self.character_class_hash = character_class_hash
+        self.activity_hash = activity_hash
+        self.activity_mode_hash = activity_mode_hash
+        self.started = started
+        self.activity_name = activity_name
+        self.blacklisted = blacklisted
+        self.party = tuple(party)
+
+    @classmethod
+    def from_json(cls, document):
+        """Load a record serialized by to_json().
+
+        :param document: a JSON string
+        :return: ActivityRecord, or None if the document isn't a serialized record (e.g. it's in another format version)
+        """
+        if not document:
+            return None
+        fields = json.loads(document)
+        if not isinstance(fields, list) or len(fields) != len(cls.__slots__) + 1 or fields[0] != cls.FORMAT_VERSION:
+            return None
+        return cls(*fields[1:])
+
+    def to_json(self):
+        return json.dumps(
+            [self.FORMAT_VERSION] + [getattr(self, field) for field in self.__slots__], separators=(',', ':'))
+
+    def __repr__(self):
+        fields = ', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)
+        return f'ActivityRecord({fields})'
@@ -0,0 +1,181 @@
+"""End-to-end throughput benchmark for Hawthorne against a local fake Bungie.net/Slack server.
+
+Runs Hawthorne.report_player_activity() (and slash_list(), when requested) tick after tick against
+benchmarks.fake_services, and reports ticks per second, p50/p99 tick latency and API calls per member per tick.
+Use it as the baseline for any performance change.
+
+With --startup, it first times how long a new bot takes from begin() to finishing its first report, ticking as the
+worker does: cold (empty Redis) and warm (restarting against the state the cold bot left behind).
+
+A real Redis is required; the benchmark FLUSHES the database it is given, so point it at a scratch database:
+    export BENCH_REDIS_URL=redis://localhost:6379/15
+
+Usage:
+    python -m benchmarks.bench_hawthorne --members 100 --ticks 20 --bungie-latency 0.05 --slash-every 5 --startup
+"""
+import argparse
+import json
+import os
+import time
+
+import redis
+from slack import WebClient
+
+import hawthorne
+from benchmarks.fake_services import FakeServices, SLACK_CHANNEL, SLACK_LOG_CHANNEL
+from bungie_wrapper import BungieApi
+from hawthorne import Hawthorne
+from slack_wrapper import SlackApi
+
+MAX_STARTUP_TICKS = 50
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def build_bot(services, redis_url, flush=True):
+    """Wire up a Hawthorne instance whose Bungie.net, Slack and Redis clients all point at benchmark backends."""
+    bungie = BungieApi('bench-api-token', base_url=services.bungie_url, content_url=services.content_url)
+    slack = SlackApi(oauth_user_token='xoxp-bench', oauth_bot_token='xoxb-bench')
+    slack.slack_as_user = WebClient('xoxp-bench', base_url=services.slack_url)
+    slack.slack_as_bot = WebClient('xoxb-bench', base_url=services.slack_url)
+    bench_redis = redis.from_url(redis_url, decode_responses=True)
+    if flush:
+        bench_redis.flushdb()
+    return Hawthorne(
+        'xoxp-bench', None, None, None, 'xoxp-bench', 'bench-api-token', None,
+        SLACK_CHANNEL, SLACK_LOG_CHANNEL, 'UBENCHBOT', slack, bungie, bench_redis
+    )
+
+
+def timed(method, *args, **kwargs):
+    """Call a method, returning its duration in seconds and whether it raised."""
+    started = time.perf_counter()
+    try:
+        method(*args, **kwargs)
+        failed = False
+    except Exception as e:
+        print(f"  {method.__name__} raised {type(e).__name__}: {e}")
+        failed = True
+    return time.perf_counter() - started, failed
+
+
+def time_startup(services, redis_url, flush):
+    """Time a new bot from begin() until its first report_player_activity() has finished, ticking as the worker does.
+
+    :return: the seconds taken, and the number of ticks
+    """
+    # Start as a new process would, without the manifest definitions cached by bots built earlier.
+    hawthorne.MANIFEST_CACHE.clear()
+    bot = build_bot(services, redis_url, flush=flush)
+    started = time.perf_counter()
+    bot.begin()
+    report = next(action for action in bot.action_registry if action['method'] == bot.report_player_activity)
+    ticks = 0
+    while report['last'] == 0 and ticks < MAX_STARTUP_TICKS:
+        bot.tick(sleep=0)
+        ticks += 1
+    return time.perf_counter() - started, ticks
+
+
+def run(args):
+    services = FakeServices(
+        roster_size=args.members,
+        bungie_latency=args.bungie_latency,
+        slack_latency=args.slack_latency,
+        latency_jitter=args.jitter,
+        bungie_error_rate=args.bungie_error_rate,
+        slack_error_rate=args.slack_error_rate,
+        change_rate=args.change_rate,
+        seed=args.seed,
+    ).start()
+    try:
+        startup = {}
+        if args.startup:
+            startup['cold_start_seconds'], startup['cold_start_ticks'] = time_startup(services, args.redis_url, True)
+            services.advance()
+            startup['warm_start_seconds'], startup['warm_start_ticks'] = time_startup(services, args.redis_url, False)
+
+        bot = build_bot(services, args.redis_url)
+
+        setup_seconds, _ = timed(bot.cache_bungie_manifests)
+        prime_seconds, _ = timed(bot.cache_player_activities)
+        services.reset_counters()
+
+        tick_seconds = []
+        slash_seconds = []
+        errors = 0
+        started = time.perf_counter()
+        for tick in range(args.ticks):
+            services.advance()
+            seconds, failed = timed(bot.report_player_activity)
+            tick_seconds.append(seconds)
+            errors += failed
+            if args.slash_every and tick % args.slash_every == 0:
+                bot.redis.lpush(f'slash.list!{SLACK_CHANNEL}', f'{SLACK_CHANNEL},U00000000')
+                seconds, failed = timed(bot.slash_list)
+                slash_seconds.append(seconds)
+                errors += failed
+        elapsed = time.perf_counter() - started
+    finally:
+        services.stop()
+
+    calls = services.calls_by_service()
+    member_ticks = args.members * args.ticks
+    results = {
+        'members': args.members,
+        'ticks': args.ticks,
+        **startup,
+        'manifest_seconds': setup_seconds,
+        'prime_seconds': prime_seconds,
+        'ticks_per_second': args.ticks / elapsed if elapsed else float('nan'),
+        'tick_p50_ms': percentile(tick_seconds, 50) * 1000,
+        'tick_p99_ms': percentile(tick_seconds, 99) * 1000,
+        'slash_list_p50_ms': percentile(slash_seconds, 50) * 1000,
+        'bungie_calls_per_member_tick': calls['bungie'] / member_ticks,
+        'slack_calls_per_tick': calls['slack'] / args.ticks,
+        'bytes_per_member_tick': services.bytes_sent / member_ticks,
+        'errors': errors,
+        'calls_by_endpoint': {f'{service} {endpoint}': count for (service, endpoint), count in
+                              sorted(services.calls.items())},
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=100, help='Slack channel roster size')
+    parser.add_argument('--ticks', type=int, default=20, help='report_player_activity() ticks to time')
+    parser.add_argument('--slash-every', type=int, default=0, help='also run slash_list() every N ticks')
+    parser.add_argument('--bungie-latency', type=float, default=0.0, help='seconds per Bungie.net call')
+    parser.add_argument('--slack-latency', type=float, default=0.0, help='seconds per Slack call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds of random latency jitter')
+    parser.add_argument('--bungie-error-rate', type=float, default=0.0, help='fraction of Bungie.net calls that 503')
+    parser.add_argument('--slack-error-rate', type=float, default=0.0, help='fraction of Slack calls that 429')
+    parser.add_argument('--change-rate', type=float, default=0.1, help='chance a player changes activity per tick')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--startup', action='store_true', help='also time cold and warm starts to the first report')
+    parser.add_argument('--redis-url', default=os.environ.get('BENCH_REDIS_URL', 'redis://localhost:6379/15'))
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+    calls_by_endpoint = results.pop('calls_by_endpoint')
+    for key, value in results.items():
+        print(f"{key:>30}: {value:.3f}" if isinstance(value, float) else f"{key:>30}: {value}")
+    print(f"{'calls by endpoint':>30}:")
+    for key, value in calls_by_endpoint.items():
+        print(f"{key:>40}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Microbenchmark: parsing Bungie.net timestamps across a simulated roster.
+
+Each simulated poll parses one activity start time per character for every member of the roster, which is what
+BungieApi.get_current_activity() does on every report_player_activity() tick. Most start times repeat between polls.
+
+Usage:
+    python -m benchmarks.bench_timestamps [--members 500] [--characters 3] [--polls 20]
+"""
+import argparse
+import datetime
+import random
+import time
+
+from utilities import BUNGIE_TIMESTAMP_FORMAT, parse_bungie_timestamp
+
+
+def simulated_polls(members, characters, polls, change_rate=0.05, seed=0):
+    """Build the timestamps seen on each poll, with a fraction of characters starting a new activity each poll."""
+    rng = random.Random(seed)
+    start = datetime.datetime(2019, 11, 1, tzinfo=datetime.timezone.utc)
+    current = [
+        (start + datetime.timedelta(seconds=rng.randrange(86400))).strftime('%Y-%m-%dT%H:%M:%SZ')
+        for _ in range(members * characters)
+    ]
+    result = []
+    for poll in range(polls):
+        for i in range(len(current)):
+            if rng.random() < change_rate:
+                started = start + datetime.timedelta(days=1, seconds=poll * 30 + rng.randrange(30))
+                current[i] = started.strftime('%Y-%m-%dT%H:%M:%SZ')
+        result.append(list(current))
+    return result
+
+
+def run(parse, polls):
+    started = time.perf_counter()
+    for timestamps in polls:
+        for timestamp in timestamps:
+            parse(timestamp).timestamp()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=500)
+    parser.add_argument('--characters', type=int, default=3)
+    parser.add_argument('--polls', type=int, default=20)
+    args = parser.parse_args()
+
+    polls = simulated_polls(args.members, args.characters, args.polls)
+    parsed = args.members * args.characters * args.polls
+    for timestamps in polls[:1]:
+        for timestamp in timestamps:
+            assert parse_bungie_timestamp(timestamp) == datetime.datetime.strptime(timestamp, BUNGIE_TIMESTAMP_FORMAT)
+    parse_bungie_timestamp.cache_clear()
+
+    baseline = run(lambda value: datetime.datetime.strptime(value, BUNGIE_TIMESTAMP_FORMAT), polls)
+    uncached = run(parse_bungie_timestamp.__wrapped__, polls)
+    cached = run(parse_bungie_timestamp, polls)
+
+    print(f"{args.members} members x {args.characters} characters x {args.polls} polls = {parsed} timestamps")
+    for name, seconds in (('strptime', baseline), ('fromisoformat', uncached), ('parse_bungie_timestamp', cached)):
+        print(f"{name:>24}: {seconds * 1000:8.1f} ms  {seconds / parsed * 1e6:6.2f} us/timestamp"
+              f"  {baseline / seconds:5.1f}x")
+    print(f"{'cache':>24}: {parse_bungie_timestamp.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
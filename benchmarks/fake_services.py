@@ -0,0 +1,443 @@
+"""A local stand-in for the Bungie.net and Slack endpoints that Hawthorne calls, for offline benchmarking.
+
+FakeServices serves a simulated Slack channel roster and the Destiny players behind it from a single threaded HTTP
+server. BungieApi and slack.WebClient can be pointed at it via their base URLs. Latency, error rates, roster size and
+how often players change activity are all configurable, and every request is counted per endpoint.
+
+Example usage:
+    services = FakeServices(roster_size=100, bungie_latency=0.05)
+    services.start()
+    bungie = BungieApi('bench', base_url=services.bungie_url, content_url=services.content_url)
+    slack_bot = WebClient('xoxb-bench', base_url=services.slack_url)
+    ...
+    services.advance()  # Move the simulation on by one tick.
+    ...
+    services.stop()
+"""
+import collections
+import json
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse as urllib_parse
+
+SLACK_CHANNEL = 'CBENCH0001'
+SLACK_LOG_CHANNEL = 'CBENCHLOG1'
+MEMBERSHIP_ID_BASE = 4611686018400000000
+CHARACTER_CLASS_HASHES = [2271682572, 3655393761, 671679327]
+
+"""Simulated activities: (activity hash, activity mode hash, name, light level)."""
+ACTIVITIES = [
+    (82913930, 2166136261, 'Orbit', 0),
+    (3903562779, 1589650888, 'The Tower', 0),
+    (1019949956, 3497767639, 'Gofannon Forge', 0),
+    (2122313384, 2043403989, 'Garden of Salvation', 0),
+    (2032534090, 608898761, 'The Shattered Throne', 0),
+    (1813752023, 3789021730, 'The Corrupted', 950),
+    (2591274210, 4110605575, 'Lake of Shadows', 0),
+    (3711931140, 3497767639, 'The Dreaming City', 0),
+    (1717505396, 1164760504, 'Javelin-4', 0),
+    (2274172949, 2394616003, 'Altar of Flame', 0),
+    (3371547, 1418469392, 'Shattered Realm: Ruins of Wrath', 0),
+    (4078656646, 1164760504, 'Vostok', 0),
+]
+
+"""Simulated activity modes: mode hash -> (name, DestinyActivityModeType values)."""
+ACTIVITY_MODES = {
+    2166136261: ('Orbit', [0]),
+    1589650888: ('Social', [40]),
+    3497767639: ('Explore', [6, 7]),
+    2043403989: ('Raid', [4, 7]),
+    608898761: ('Dungeon', [82, 7]),
+    3789021730: ('Scored Nightfall Strikes', [46, 16, 18, 7]),
+    4110605575: ('Normal Strikes', [3, 18, 7]),
+    1164760504: ('Control', [10, 5]),
+    2394616003: ('Gambit', [63, 64]),
+    1418469392: ('Story', [2, 7]),
+}
+
+
+class FakeServices:
+    """A simulated Bungie.net + Slack backend running on a local HTTP server."""
+
+    def __init__(self, roster_size=100, characters_per_player=3, bungie_latency=0.0, slack_latency=0.0,
+                 latency_jitter=0.0, bungie_error_rate=0.0, slack_error_rate=0.0, change_rate=0.1,
+                 online_rate=0.5, no_gamertag_rate=0.05, unknown_gamertag_rate=0.05, available_activities=200,
+                 seed=0):
+        self.roster_size = roster_size
+        self.characters_per_player = characters_per_player
+        self.bungie_latency = bungie_latency
+        self.slack_latency = slack_latency
+        self.latency_jitter = latency_jitter
+        self.bungie_error_rate = bungie_error_rate
+        self.slack_error_rate = slack_error_rate
+        self.change_rate = change_rate
+        self.online_rate = online_rate
+        self.available_activities = available_activities
+
+        self.calls = collections.Counter()
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._message_ts = 1570000000.000100
+
+        self.members = []
+        self.players_by_gamertag = {}
+        self.players_by_membership_id = {}
+        for i in range(roster_size):
+            slack_id = 'U{:08d}'.format(i)
+            gamertag = 'player-{:05d}'.format(i)
+            roll = self._rng.random()
+            has_gamertag = roll >= no_gamertag_rate
+            is_findable = roll >= no_gamertag_rate + unknown_gamertag_rate
+            player = {
+                'slack_id': slack_id,
+                'gamertag': gamertag if has_gamertag else None,
+                'membership_type': 2,
+                'membership_id': str(MEMBERSHIP_ID_BASE + i),
+                'characters': {
+                    str(MEMBERSHIP_ID_BASE * 10 + i * 10 + c): CHARACTER_CLASS_HASHES[c % 3]
+                    for c in range(characters_per_player)
+                },
+            }
+            self._roll_activity(player, time.time() - self._rng.randrange(86400))
+            self.members.append(player)
+            if is_findable:
+                self.players_by_gamertag[gamertag] = player
+                self.players_by_membership_id[player['membership_id']] = player
+
+        self._server = None
+        self._thread = None
+
+    # region LIFECYCLE
+
+    def start(self):
+        """Start serving on an ephemeral localhost port in a background thread."""
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.services = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return 'http://{}:{}'.format(host, port)
+
+    @property
+    def bungie_url(self):
+        return self.base_url + '/Platform'
+
+    @property
+    def content_url(self):
+        return self.base_url
+
+    @property
+    def slack_url(self):
+        return self.base_url + '/slack/api/'
+
+    # endregion
+
+    # region SIMULATION
+
+    def advance(self):
+        """Move the simulation on by one tick: some players change activity, and players come and go online."""
+        now = time.time()
+        with self._lock:
+            for player in self.members:
+                if self._rng.random() < self.change_rate:
+                    self._roll_activity(player, now)
+
+    def reset_counters(self):
+        """Zero the per-endpoint call counters."""
+        with self._lock:
+            self.calls.clear()
+            self.bytes_sent = 0
+
+    def calls_by_service(self):
+        """Total calls per service ('bungie' or 'slack')."""
+        totals = collections.Counter()
+        for (service, _), count in self.calls.items():
+            totals[service] += count
+        return totals
+
+    def _roll_activity(self, player, started):
+        activity_hash, mode_hash, _, _ = self._rng.choice(ACTIVITIES)
+        player['online'] = self._rng.random() < self.online_rate
+        player['active_character'] = self._rng.choice(list(player['characters']))
+        player['activity_hash'] = activity_hash
+        player['activity_mode_hash'] = mode_hash
+        player['started'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(started))
+
+    # endregion
+
+    # region BUNGIE.NET
+
+    def bungie_search(self, match, query):
+        player = self.players_by_gamertag.get(urllib_parse.unquote(match['display_name']))
+        if not player or str(player['membership_type']) != match['membership_type']:
+            return []
+        return [self._user_info_card(player)]
+
+    def bungie_memberships_by_id(self, match, query):
+        player = self._player(match['membership_id'])
+        return {'destinyMemberships': [self._user_info_card(player)], 'bungieNetUser': {}}
+
+    def bungie_linked_profiles(self, match, query):
+        player = self._player(match['membership_id'])
+        profile = dict(self._user_info_card(player), isOverridden=False, isCrossSavePrimary=False)
+        return {'profiles': [profile], 'bnetMembership': {}, 'profilesWithErrors': []}
+
+    def bungie_profile(self, match, query):
+        player = self._player(match['membership_id'])
+        components = set(query.get('components', [''])[0].split(','))
+        response = {}
+        if '100' in components:
+            response['profile'] = {'privacy': 1, 'data': {
+                'userInfo': self._user_info_card(player),
+                'dateLastPlayed': player['started'],
+                'characterIds': list(player['characters']),
+            }}
+        if '204' in components:
+            available = [{'activityHash': a, 'isNew': False, 'canLead': True, 'canJoin': True, 'isCompleted': False,
+                          'isVisible': True, 'displayLevel': 50, 'recommendedLight': 750, 'difficultyTier': 0}
+                         for a in range(self.available_activities)]
+            data = {}
+            for character_id in player['characters']:
+                is_active = character_id == player['active_character']
+                # Like Bungie.net, an offline player's last character keeps its start time but reports no activity.
+                is_playing = is_active and player['online']
+                data[character_id] = {
+                    'dateActivityStarted': player['started'] if is_active else '2019-10-01T00:00:00Z',
+                    'availableActivities': available,
+                    'currentActivityHash': player['activity_hash'] if is_playing else 0,
+                    'currentActivityModeHash': player['activity_mode_hash'] if is_playing else 0,
+                    'currentActivityModeType': 0,
+                    'currentActivityModeHashes': [player['activity_mode_hash']] if is_playing else [],
+                    'currentActivityModeTypes': [],
+                    'currentPlaylistActivityHash': player['activity_hash'] if is_playing else 0,
+                    'lastCompletedStoryHash': 0,
+                }
+            response['characterActivities'] = {'privacy': 2, 'data': data}
+        if '1000' in components:
+            transitory = {'privacy': 2}
+            if player['online']:
+                transitory['data'] = {
+                    'partyMembers': [{'membershipId': player['membership_id'], 'emblemHash': 0,
+                                      'displayName': player['gamertag'], 'status': 11}],
+                    'currentActivity': {'startTime': player['started'], 'score': 0.0, 'highestOpposingFactionScore': 0.0,
+                                        'numberOfOpponents': 0, 'numberOfPlayers': 1},
+                    'joinability': {'openSlots': 5, 'privacySetting': 0, 'closedReasons': 0},
+                    'tracking': [],
+                }
+            response['profileTransitoryData'] = transitory
+        return response
+
+    def bungie_character(self, match, query):
+        player = self._player(match['membership_id'])
+        class_hash = player['characters'].get(match['character_id'], 0)
+        return {'character': {'privacy': 1, 'data': {'characterId': match['character_id'], 'classHash': class_hash}}}
+
+    def bungie_manifest(self, match, query):
+        return {'version': 'bench', 'jsonWorldComponentContentPaths': {'en': {
+            'DestinyActivityDefinition': '/content/DestinyActivityDefinition.json',
+            'DestinyActivityModeDefinition': '/content/DestinyActivityModeDefinition.json',
+        }}}
+
+    def content_activity_definitions(self, match, query):
+        definitions = {}
+        for activity_hash, mode_hash, name, light_level in ACTIVITIES:
+            mode_types = ACTIVITY_MODES[mode_hash][1]
+            definitions[str(activity_hash)] = {
+                'hash': activity_hash,
+                'displayProperties': {'name': name, 'description': '', 'hasIcon': False},
+                'activityLightLevel': light_level,
+                'activityModeHashes': [mode_hash],
+                'activityModeTypes': mode_types,
+                'directActivityModeHash': mode_hash,
+                'directActivityModeType': mode_types[0],
+            }
+        return definitions
+
+    def content_activity_mode_definitions(self, match, query):
+        return {
+            str(mode_hash): {'hash': mode_hash, 'displayProperties': {'name': name}, 'modeType': mode_types[0]}
+            for mode_hash, (name, mode_types) in ACTIVITY_MODES.items()
+        }
+
+    def _player(self, membership_id):
+        player = self.players_by_membership_id.get(membership_id)
+        if player is None:
+            raise _NotFound()
+        return player
+
+    @staticmethod
+    def _user_info_card(player):
+        return {'displayName': player['gamertag'], 'membershipType': player['membership_type'],
+                'membershipId': player['membership_id'], 'crossSaveOverride': 0, 'iconPath': ''}
+
+    # endregion
+
+    # region SLACK
+
+    def slack_auth_test(self, params):
+        return {'ok': True, 'team': 'bench', 'user': 'hawthorne', 'team_id': 'TBENCH', 'user_id': 'UBENCHBOT'}
+
+    def slack_channels_info(self, params):
+        members = [player['slack_id'] for player in self.members]
+        return {'ok': True, 'channel': {'id': params.get('channel'), 'name': 'hawthorne', 'members': members}}
+
+    def slack_users_profile_get(self, params):
+        i = int(params.get('user', 'U0')[1:])
+        player = self.members[i]
+        fields = {}
+        if player['gamertag']:
+            fields['Xf0DB6LM46'] = {'value': player['gamertag'], 'alt': ''}
+        profile = {'display_name': 'member{}'.format(i), 'real_name': 'Member {}'.format(i), 'fields': fields}
+        return {'ok': True, 'profile': profile}
+
+    def slack_chat_post_message(self, params):
+        with self._lock:
+            self._message_ts += 0.0001
+            ts = '{:.6f}'.format(self._message_ts)
+        return {'ok': True, 'channel': params.get('channel'), 'ts': ts, 'message': {'text': params.get('text')}}
+
+    def slack_chat_post_ephemeral(self, params):
+        return {'ok': True, 'message_ts': '{:.6f}'.format(self._message_ts)}
+
+    def slack_chat_update(self, params):
+        return {'ok': True, 'channel': params.get('channel'), 'ts': params.get('ts'), 'text': params.get('text')}
+
+    # endregion
+
+
+class _NotFound(Exception):
+    pass
+
+
+BUNGIE_ROUTES = [
+    ('SearchDestinyPlayer', r'/Platform/Destiny2/SearchDestinyPlayer/(?P<membership_type>\d+)/(?P<display_name>[^/]+)/',
+     FakeServices.bungie_search),
+    ('GetMembershipsById', r'/Platform/User/GetMembershipsById/(?P<membership_id>\d+)/(?P<membership_type>\d+)/',
+     FakeServices.bungie_memberships_by_id),
+    ('GetLinkedProfiles', r'/Platform/Destiny2/(?P<membership_type>\d+)/Profile/(?P<membership_id>\d+)/LinkedProfiles/',
+     FakeServices.bungie_linked_profiles),
+    ('GetCharacter',
+     r'/Platform/Destiny2/(?P<membership_type>\d+)/Profile/(?P<membership_id>\d+)/Character/(?P<character_id>\d+)/',
+     FakeServices.bungie_character),
+    ('GetProfile', r'/Platform/Destiny2/(?P<membership_type>\d+)/Profile/(?P<membership_id>\d+)/',
+     FakeServices.bungie_profile),
+    ('GetDestinyManifest', r'/Platform/Destiny2/Manifest/', FakeServices.bungie_manifest),
+]
+CONTENT_ROUTES = {
+    '/content/DestinyActivityDefinition.json': FakeServices.content_activity_definitions,
+    '/content/DestinyActivityModeDefinition.json': FakeServices.content_activity_mode_definitions,
+}
+SLACK_ROUTES = {
+    'auth.test': FakeServices.slack_auth_test,
+    'channels.info': FakeServices.slack_channels_info,
+    'users.profile.get': FakeServices.slack_users_profile_get,
+    'chat.postMessage': FakeServices.slack_chat_post_message,
+    'chat.postEphemeral': FakeServices.slack_chat_post_ephemeral,
+    'chat.update': FakeServices.slack_chat_update,
+}
+BUNGIE_ROUTES = [(name, re.compile(pattern + '$'), handler) for name, pattern, handler in BUNGIE_ROUTES]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        services = self.server.services  # type: FakeServices
+        url = urllib_parse.urlsplit(self.path)
+        query = urllib_parse.parse_qs(url.query)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        if url.path.startswith('/slack/api/'):
+            self._slack(services, url.path[len('/slack/api/'):], query, body)
+        elif url.path in CONTENT_ROUTES:
+            self._count(services, 'content', url.path)
+            self._send(200, CONTENT_ROUTES[url.path](services, None, query))
+        else:
+            self._bungie(services, url.path, query)
+
+    def _bungie(self, services, path, query):
+        for name, pattern, handler in BUNGIE_ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            self._send(404, {'ErrorCode': 2, 'ErrorStatus': 'NotFound', 'Message': 'Not found'})
+            return
+        self._count(services, 'bungie', name)
+        self._delay(services.bungie_latency, services.latency_jitter)
+        if services._rng.random() < services.bungie_error_rate:
+            self._send(503, {'ErrorCode': 5, 'ErrorStatus': 'SystemDisabled', 'Message': 'Simulated outage'})
+            return
+        try:
+            response = handler(services, match.groupdict(), query)
+        except _NotFound:
+            self._send(200, {'ErrorCode': 1601, 'ErrorStatus': 'DestinyAccountNotFound', 'Message': 'Not found'})
+            return
+        self._send(200, {'Response': response, 'ErrorCode': 1, 'ThrottleSeconds': 0, 'ErrorStatus': 'Success',
+                         'Message': 'Ok', 'MessageData': {}})
+
+    def _slack(self, services, method, query, body):
+        handler = SLACK_ROUTES.get(method)
+        if handler is None:
+            self._send(200, {'ok': False, 'error': 'unknown_method'})
+            return
+        self._count(services, 'slack', method)
+        self._delay(services.slack_latency, services.latency_jitter)
+        if services._rng.random() < services.slack_error_rate:
+            self._send(429, {'ok': False, 'error': 'ratelimited'}, headers={'Retry-After': '1'})
+            return
+        params = {key: values[0] for key, values in query.items()}
+        if body:
+            if 'json' in (self.headers.get('Content-Type') or ''):
+                params.update(json.loads(body))
+            else:
+                params.update({key: values[0] for key, values in urllib_parse.parse_qs(body.decode()).items()})
+        self._send(200, handler(services, params))
+
+    @staticmethod
+    def _count(services, service, endpoint):
+        with services._lock:
+            services.calls[(service, endpoint)] += 1
+
+    @staticmethod
+    def _delay(latency, jitter):
+        if latency or jitter:
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        with self.server.services._lock:
+            self.server.services.bytes_sent += len(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
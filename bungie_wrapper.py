@@ -44,9 +44,14 @@ Example usage:
 import requests
 import os
 import datetime
+import functools
 import pprint
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 
-from utilities import logger
+from metrics import Metrics
+from tracing import tracer
+from utilities import logger, parse_bungie_timestamp, TtlCache
 
 
 pp = pprint.PrettyPrinter(indent=4)
@@ -75,9 +80,61 @@ class ResponseWasNotSuccessfulException(Exception):
         # Now for your custom code...
         self.response = response
 
+def project(data, fields):
+    """Keep only the parts of a decoded API response named by a list of dotted field paths.
+
+    A path segment of '*' matches every key of a dict (e.g. each character in a component keyed by character id),
+    lists are projected element by element, and a path that ends at a dict or list keeps it whole. Missing fields
+    are simply left out. For example, ['characterActivities.data.*.currentActivityHash'] reduces a GetProfile
+    response to the current activity hash of each character.
+
+    Projection works on an already decoded response, so it shrinks what is retained and cached rather than the cost
+    of decoding it.
+
+    :param data: a decoded JSON response
+    :param fields: an iterable of dotted field paths
+    :return: a pruned copy of data
+    """
+    return _apply_projection(data, _compile_projection(tuple(fields)))
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_projection(fields):
+    """Turn dotted field paths into a nested dict of path segments, where None marks a subtree that is kept whole."""
+    tree = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split('.')
+        for part in parents:
+            if part in node and node[part] is None:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+def _apply_projection(data, tree):
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [_apply_projection(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for key, subtree in tree.items():
+        if key == '*':
+            for data_key, value in data.items():
+                result[data_key] = _apply_projection(value, subtree)
+        elif key in data:
+            result[key] = _apply_projection(data[key], subtree)
+    return result
+
+
 class BungieApi:
     """A lean method-per-API-endpoint-based interface around the Bungie API."""
     BASE_URL = 'https://stats.bungie.net/Platform'
+    CONTENT_URL = 'https://www.bungie.net'
     MEMBERSHIP_TYPES = {'xbox': '1', 'xbone': '1', 'psn': '2', 'pc': '4', 'ps4': '2'}
     COMPONENTS_ALL = [
         'Profiles', 'VendorReceipts', 'ProfileInventories', 'ProfileCurrencies', 'ProfileProgression', 'Characters',
@@ -86,8 +143,24 @@ class BungieApi:
         'ItemPlugStates', 'Vendors', 'VendorCategories', 'VendorSales', 'Kiosks', 'CurrentLookups', 'PresentationNodes',
         'Collectibles', 'Records'
     ]
+    MAX_CONCURRENT_REQUESTS = 8
+    PROFILE_CACHE_TTL = 60
+    PRIMARY_MEMBERSHIP_CACHE_TTL = 6 * 60 * 60
+    # Memberships without a primary are soon looked up again, as they may just not have linked their platforms yet.
+    PRIMARY_MEMBERSHIP_MISS_CACHE_TTL = 5 * 60
+    CACHE_MAXSIZE = 10000
+
+    # Field projections (see project()) for the profile lookups made by the multi-call operations below.
+    CURRENT_ACTIVITY_FIELDS = [
+        'characterActivities.data.*.dateActivityStarted',
+        'characterActivities.data.*.currentActivityHash',
+        'characterActivities.data.*.currentActivityModeHash',
+        'characterActivities.data.*.currentPlaylistActivityHash',
+        'profileTransitoryData.data',
+    ]
+    LAST_PLAYED_FIELDS = ['profile.data.dateLastPlayed']
 
-    def __init__(self, api_token=None, oauth_token=None):
+    def __init__(self, api_token=None, oauth_token=None, base_url=None, content_url=None, session=None):
         if api_token:
             self.api_token = api_token
         else:
@@ -98,17 +171,43 @@ class BungieApi:
 
         self._oauth_token = oauth_token
 
+        # Allow pointing the client at a stand-in server, e.g. for the offline benchmarks.
+        if base_url:
+            self.BASE_URL = base_url
+        if content_url:
+            self.CONTENT_URL = content_url
+
         self.headers = dict()
         self.headers["X-API-Key"] = self.api_token
         self.headers["User-Agent"] = os.environ.get('BUNGIE_OAUTH_USER_AGENT', '')
 
-    def _get(self, url, extra_headers=None, params=None, as_user=False):
-        bearer_header = {}
-        if as_user and self._oauth_token and 'access_token' in self._oauth_token:
-            bearer_header['Authorization'] = 'Bearer {}'.format(self._oauth_token.get('access_token'))
-        extra_headers = extra_headers or {}
-        request_headers = {**self.headers, **extra_headers, **bearer_header}
+        # A pooled session sized for the concurrent operations below, so parallel calls reuse connections. Clients for
+        # different users can share one by passing another client's session.
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.MAX_CONCURRENT_REQUESTS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
 
+        self._profile_cache = TtlCache(self.PROFILE_CACHE_TTL, maxsize=self.CACHE_MAXSIZE)
+        self._primary_membership_cache = TtlCache(self.PRIMARY_MEMBERSHIP_CACHE_TTL, maxsize=self.CACHE_MAXSIZE)
+
+        # Per-endpoint call counts, latencies and bytes received; see metrics.Metrics.
+        self.metrics = Metrics('bungie_api')
+
+        # Optionally a token_store.TokenStore, which persists the OAuth token and refreshes it ahead of expiry.
+        self.token_store = None
+
+    @property
+    def oauth_token(self):
+        return self._oauth_token
+
+    @oauth_token.setter
+    def oauth_token(self, token):
+        self._oauth_token = token
+
+    def _get(self, url, extra_headers=None, params=None, as_user=False, fields=None, endpoint=None):
         if self._oauth_token and 'expires_at' in self._oauth_token and self.is_token_expired():
             if self.is_token_refresh_expired():
                 raise AuthenticationExpiredException(
@@ -117,19 +216,49 @@ class BungieApi:
                 )
             print('Token has expired, but we can try to refresh it.')
             #self.get_oauth_token(self.api_token, True)
-            self.refresh_oauth_token(persist=True)
+            if self.token_store is not None:
+                self.token_store.refresh()
+            else:
+                self.refresh_oauth_token(persist=True)
 
-        response = requests.get(url, headers=request_headers, params=params)
+        bearer_header = {}
+        if as_user and self._oauth_token and 'access_token' in self._oauth_token:
+            bearer_header['Authorization'] = 'Bearer {}'.format(self._oauth_token.get('access_token'))
+        extra_headers = extra_headers or {}
+        request_headers = {**self.headers, **extra_headers, **bearer_header}
+
+        endpoint = endpoint or url[len(self.BASE_URL):]
+        with tracer.span('bungie', endpoint):
+            request_started = time.monotonic()
+            try:
+                response = self.session.get(url, headers=request_headers, params=params)
+            except requests.RequestException as e:
+                # Count connection errors and timeouts too, so they show up in the error rates.
+                self.metrics.observe_request(endpoint, 'error', type(e).__name__, time.monotonic() - request_started, 0)
+                raise
+            request_seconds = time.monotonic() - request_started
         if response.status_code != 200:
+            try:
+                error_status = response.json().get('ErrorStatus', '')
+            except (ValueError, AttributeError):
+                error_status = ''
+            self.metrics.observe_request(endpoint, response.status_code, error_status, request_seconds,
+                                         len(response.content))
             raise Non200ResponseException(
                 "API returned non-200 status code: {} - {} - {}".format(response.status_code,
                                                                         response.reason,
                                                                         response.text),
                 response
             )
+        response_bytes = len(response.content)
         response = response.json()
+        self.metrics.observe_request(endpoint, 200, response.get('ErrorStatus', ''), request_seconds, response_bytes)
         if response['ErrorStatus'] != 'Success':
             raise ResponseWasNotSuccessfulException("API returned error: {}".format(response), response)
+        if fields is not None:
+            # The whole payload has been decoded by now, so this doesn't save parsing time or peak memory; it only
+            # shrinks what callers keep hold of, cache and store.
+            return project(response['Response'], fields)
         return response['Response']
 
     def is_token_expired(self):
@@ -240,7 +369,10 @@ class BungieApi:
             if self.is_token_refresh_expired():
                 print('token is expired and cannot be refreshed')
                 return False
-            self.refresh_oauth_token(persist=True)
+            if self.token_store is not None:
+                self.token_store.refresh()
+            else:
+                self.refresh_oauth_token(persist=True)
 
         if validate:
             current_user = self.get_user_currentuser_membership()
@@ -279,11 +411,13 @@ class BungieApi:
         :param display_name: 
         :return: 
         """
+        endpoint = '/Destiny2/SearchDestinyPlayer/{membershipType}/{displayName}/'
         r = self._get(
-            self.BASE_URL + '/Destiny2/SearchDestinyPlayer/{membershipType}/{displayName}/'.format(
+            self.BASE_URL + endpoint.format(
                 membershipType=membership_type,
                 displayName=display_name
-            )
+            ),
+            endpoint=endpoint
         )
         return r
 
@@ -295,29 +429,35 @@ class BungieApi:
         :param membership_type: 
         :return: 
         """
+        endpoint = '/User/GetMembershipsById/{membershipId}/{membershipType}/'
         r = self._get(
-            self.BASE_URL + '/User/GetMembershipsById/{membershipId}/{membershipType}/'.format(
+            self.BASE_URL + endpoint.format(
                 membershipId=membership_id,
                 membershipType=membership_type
-            )
+            ),
+            endpoint=endpoint
         )
         return r
 
-    def get_d2_profile(self, membership_id, membership_type, components):
+    def get_d2_profile(self, membership_id, membership_type, components, fields=None):
         # https://bungie-net.github.io/#Destiny2.GetProfile
         """
         
         :param membership_id: 
         :param membership_type: 
         :param components: Destiny.DestinyComponentType https://bungie-net.github.io/#/components/schemas/Destiny.DestinyComponentType
+        :param fields: optional dotted field paths to keep from the response; see project()
         :return: 
         """
+        endpoint = '/Destiny2/{membershipType}/Profile/{destinyMembershipId}/'
         r = self._get(
-            self.BASE_URL + '/Destiny2/{membershipType}/Profile/{destinyMembershipId}/'.format(
+            self.BASE_URL + endpoint.format(
                 membershipType=membership_type,
                 destinyMembershipId=membership_id
             ),
-            params={'components': ','.join(components)}
+            params={'components': ','.join(components)},
+            fields=fields,
+            endpoint=endpoint
         )
         return r
 
@@ -329,11 +469,13 @@ class BungieApi:
         :param membership_type: 
         :return: 
         """
+        endpoint = '/Destiny2/{membershipType}/Profile/{membershipId}/LinkedProfiles/'
         r = self._get(
-            self.BASE_URL + '/Destiny2/{membershipType}/Profile/{membershipId}/LinkedProfiles/'.format(
+            self.BASE_URL + endpoint.format(
                 membershipType=membership_type,
                 membershipId=membership_id
-            )
+            ),
+            endpoint=endpoint
         )
         return r
 
@@ -347,13 +489,15 @@ class BungieApi:
         :param components: Destiny.DestinyComponentType https://bungie-net.github.io/#/components/schemas/Destiny.DestinyComponentType
         :return: 
         """
+        endpoint = '/Destiny2/{membershipType}/Profile/{destinyMembershipId}/Character/{characterId}/'
         r = self._get(
-            self.BASE_URL + '/Destiny2/{membershipType}/Profile/{destinyMembershipId}/Character/{characterId}/'.format(
+            self.BASE_URL + endpoint.format(
                 membershipType=membership_type,
                 destinyMembershipId=membership_id,
                 characterId=character_id
             ),
-            params={'components': ','.join(components)}
+            params={'components': ','.join(components)},
+            endpoint=endpoint
         )
         return r
 
@@ -365,6 +509,18 @@ class BungieApi:
         """
         return self._get(self.BASE_URL + '/Destiny2/Manifest/')
 
+    def get_d2_manifest_component(self, manifest, component, language='en'):
+        """Download one of the JSON world content components (e.g. DestinyActivityDefinition) listed in a manifest.
+
+        :param manifest: a manifest, as returned by get_d2_manifest()
+        :param component: the definition name, e.g. 'DestinyActivityDefinition'
+        :param language:
+        :return: a dict of definitions keyed by hash
+        """
+        path = manifest['jsonWorldComponentContentPaths'][language][component]
+        with tracer.span('bungie', component):
+            return self.session.get('{}/{}'.format(self.CONTENT_URL, path.lstrip('/'))).json()
+
     def get_d2_character_activities(self, membership_type, membership_id, character_id, count=None, mode=None, page=None):
         # https://bungie-net.github.io/#Destiny2.GetActivityHistory
         """
@@ -384,13 +540,15 @@ class BungieApi:
             request_params['mode'] = mode
         if page:
             request_params['page'] = page
+        endpoint = '/Destiny2/{membershipType}/Account/{destinyMembershipId}/Character/{characterId}/Stats/Activities/'
         r = self._get(
-            self.BASE_URL + '/Destiny2/{membershipType}/Account/{destinyMembershipId}/Character/{characterId}/Stats/Activities/'.format(
+            self.BASE_URL + endpoint.format(
                 membershipType=membership_type,
                 destinyMembershipId=membership_id,
                 characterId=character_id
             ),
-            params=request_params
+            params=request_params,
+            endpoint=endpoint
         )
         return r
 
@@ -401,10 +559,12 @@ class BungieApi:
         :param activity_id: 
         :return: a post game carnage report object (dict)
         """
+        endpoint = '/Destiny2/Stats/PostGameCarnageReport/{activityId}/'
         r = self._get(
-            self.BASE_URL + '/Destiny2/Stats/PostGameCarnageReport/{activityId}/'.format(
+            self.BASE_URL + endpoint.format(
                 activityId=activity_id
-            )
+            ),
+            endpoint=endpoint
         )
         return r
 
@@ -416,26 +576,35 @@ class BungieApi:
         :param membership_id: 
         :return: 
         """
+        endpoint = '/GroupV2/User/{membershipType}/{membershipId}/0/1/'
         r = self._get(
-            self.BASE_URL + '/GroupV2/User/{membershipType}/{membershipId}/0/1/'.format(
+            self.BASE_URL + endpoint.format(
                 membershipType=membership_type,
                 membershipId=membership_id
-            )
+            ),
+            endpoint=endpoint
         )
         return r
 
-    def get_clan_members(self, clan_id):
+    def get_clan_members(self, clan_id, page=None):
         # https://bungie-net.github.io/#GroupV2.GetMembersOfGroup
         # /GroupV2/{groupId}/Members/
         """Get the members of a group (clan).
         
         :param clan_id: 
+        :param page: the 1-based page of results to fetch; Bungie returns the first page when omitted
         :return: 
         """
+        request_params = {}
+        if page:
+            request_params['currentpage'] = page
+        endpoint = '/GroupV2/{groupId}/Members/'
         r = self._get(
-            self.BASE_URL + '/GroupV2/{groupId}/Members/'.format(
+            self.BASE_URL + endpoint.format(
                 groupId=clan_id
-            )
+            ),
+            params=request_params,
+            endpoint=endpoint
         )
         return r
 
@@ -444,28 +613,121 @@ class BungieApi:
     More-complex API operations below here, things that require >1 API call.
     """
 
-    def get_primary_membership(self, membership_type, membership_id):
+    def get_primary_membership(self, membership_type, membership_id, use_cache=True):
         """For a given player "membership", fetch the canonical membership associated with their cross-save config.
+
+        Results are cached for PRIMARY_MEMBERSHIP_CACHE_TTL seconds, both for the requested membership and for every
+        membership that cross-save overrides with the same primary; see invalidate_primary_membership(). Memberships
+        without a primary are only cached for PRIMARY_MEMBERSHIP_MISS_CACHE_TTL seconds.
         
         :param membership_type: 
         :param membership_id: 
+        :param use_cache: set to False to bypass (and refresh) the cache
         :return: a two-tuple of membership type (int) and membership id (int)
         """
+        cache_key = (str(membership_type), str(membership_id))
+        if use_cache:
+            primary_membership = self._primary_membership_cache.get(cache_key)
+            if primary_membership is not None:
+                return primary_membership
+
+        primary_membership, overridden_keys = self._resolve_primary_membership(membership_type, membership_id)
+        if primary_membership == (None, None):
+            self._primary_membership_cache.set(
+                cache_key, primary_membership, ttl=self.PRIMARY_MEMBERSHIP_MISS_CACHE_TTL)
+            return primary_membership
+        self._primary_membership_cache.set(cache_key, primary_membership)
+        for overridden_key in overridden_keys:
+            self._primary_membership_cache.set(overridden_key, primary_membership)
+        return primary_membership
+
+    def _resolve_primary_membership(self, membership_type, membership_id):
+        """Look up a membership's primary membership via the API, without consulting the cache.
+
+        :param membership_type:
+        :param membership_id:
+        :return: a two-tuple of the primary membership two-tuple and a list of cache keys for overridden memberships
+        """
+        requested_key = (str(membership_type), str(membership_id))
         memberships = self.get_user_membership(membership_id, membership_type)
         memberships = memberships['destinyMemberships']
-        primary_membership_type = None
-        primary_membership_id = None
         for membership in memberships:
-            if primary_membership_id:
-                break
-            membership_id = membership['membershipId']
-            membership_type = membership['membershipType']
-            linked_profiles = self.get_d2_linked_profiles(membership_id, membership_type)
-            for profile in linked_profiles['profiles']:
-                if profile['isOverridden'] is False:
-                    primary_membership_id = profile['membershipId']
-                    primary_membership_type = profile['membershipType']
-        return primary_membership_type, primary_membership_id
+            linked_profiles = self.get_d2_linked_profiles(membership['membershipId'], membership['membershipType'])
+            primary_profiles = [p for p in linked_profiles['profiles'] if p['isOverridden'] is False]
+            if not primary_profiles:
+                continue
+            # Without cross-save every profile is its own primary, so prefer the membership we were asked about.
+            primary_profile = primary_profiles[-1]
+            for profile in primary_profiles:
+                if (str(profile['membershipType']), str(profile['membershipId'])) == requested_key:
+                    primary_profile = profile
+            overridden_keys = [
+                (str(p['membershipType']), str(p['membershipId']))
+                for p in linked_profiles['profiles'] if p['isOverridden'] is True
+            ]
+            return (primary_profile['membershipType'], primary_profile['membershipId']), overridden_keys
+        return (None, None), []
+
+    def invalidate_primary_membership(self, membership_type=None, membership_id=None):
+        """Forget cached primary memberships: a single membership's, or all of them when none is specified.
+
+        Forgetting a membership's primary also forgets it for the memberships that were cached as sharing it (see
+        get_primary_membership()), since a cross-save change affects all of them.
+
+        :param membership_type:
+        :param membership_id:
+        :return:
+        """
+        if membership_type is None and membership_id is None:
+            self._primary_membership_cache.invalidate()
+            return
+        cache_key = (str(membership_type), str(membership_id))
+        cached = {key: primary_membership for key, primary_membership, _ in self._primary_membership_cache.items()}
+        primary_membership = cached.get(cache_key)
+        self._primary_membership_cache.invalidate(cache_key)
+        if primary_membership is None or primary_membership == (None, None):
+            return
+        for key, other_primary_membership in cached.items():
+            if other_primary_membership == primary_membership:
+                self._primary_membership_cache.invalidate(key)
+
+    def get_primary_memberships(self, players):
+        """Resolve the primary membership of every player in a roster at once.
+
+        Each player is resolved at most once, however many platforms they list: a cached answer for any of their
+        memberships is reused, otherwise only their first membership is looked up. Players that share a membership
+        are resolved together, and lookups run concurrently.
+
+        :param players: an iterable of players, each a list of (membership_type, membership_id) two-tuples
+        :return: a list of primary membership two-tuples, in the same order as players
+        """
+        players = [list(memberships) for memberships in players]
+        primaries = [None] * len(players)
+        pending = {}
+        for i, memberships in enumerate(players):
+            for membership_type, membership_id in memberships:
+                primary_membership = self._primary_membership_cache.get((str(membership_type), str(membership_id)))
+                if primary_membership is not None:
+                    primaries[i] = primary_membership
+                    break
+            else:
+                if memberships:
+                    membership_type, membership_id = memberships[0]
+                    pending.setdefault((str(membership_type), str(membership_id)), []).append(i)
+                else:
+                    primaries[i] = (None, None)
+
+        get_primary_membership = tracer.bind(self.get_primary_membership)
+        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_REQUESTS) as executor:
+            futures = {
+                executor.submit(get_primary_membership, membership_type, membership_id): indices
+                for (membership_type, membership_id), indices in pending.items()
+            }
+            for future in as_completed(futures):
+                for i in futures[future]:
+                    primaries[i] = future.result()
+
+        return primaries
 
     def get_latest_activity(self, membership_type, membership_id):
         """Fetch the single most recent activity record of a player's N characters.
@@ -474,13 +736,13 @@ class BungieApi:
         :param membership_id: 
         :return: an activity object (dict)
         """
-        profile = self.get_d2_profile(membership_id, membership_type, ['100'])
+        profile = self.get_d2_profile(membership_id, membership_type, ['100'], fields=['profile.data.characterIds'])
         latest_activity = None
         latest_activity_dt = None
         for character in profile['profile']['data']['characterIds']:
             activities = self.get_d2_character_activities(membership_type, membership_id, character, count=1, page=0)
             activity = activities['activities'][0]
-            dt = datetime.datetime.strptime(activity['period'], '%Y-%m-%dT%H:%M:%S%z')
+            dt = parse_bungie_timestamp(activity['period'])
             if not latest_activity:
                 latest_activity = activity
                 latest_activity_dt = dt
@@ -501,16 +763,13 @@ class BungieApi:
         # as the current activity on a character that isn't actually logged in. More details:
         # * https://github.com/Bungie-net/api/issues/1030
         # * https://github.com/Bungie-net/api/wiki/Affinitization:-benefits,-drawbacks,-how-to
-        activities = self.get_d2_profile(membership_id, membership_type, ['204', '1000'])
-        characters = activities['characterActivities'].get('data', {})
-        transitory_data = activities['profileTransitoryData'].get('data', {})
+        activities = self.get_d2_profile(membership_id, membership_type, ['204', '1000'],
+                                         fields=self.CURRENT_ACTIVITY_FIELDS)
+        characters = activities.get('characterActivities', {}).get('data', {})
+        transitory_data = activities.get('profileTransitoryData', {}).get('data', {})
         for key in characters:
-            characters[key].pop('availableActivities', None)
-            characters[key].pop('currentActivityModeType', None)
-            characters[key].pop('currentActivityModeTypes', None)
-            characters[key].pop('lastCompletedStoryHash', None)
             tmp_activity_start_time = characters[key].get('dateActivityStarted', '1980-01-01T01:01:01Z')
-            tmp_activity_start_time = datetime.datetime.strptime(tmp_activity_start_time, '%Y-%m-%dT%H:%M:%S%z')
+            tmp_activity_start_time = parse_bungie_timestamp(tmp_activity_start_time)
             tmp_activity_start_time = tmp_activity_start_time.timestamp()
             characters[key]['epochActivityStarted'] = tmp_activity_start_time
             characters[key]['characterId'] = key
@@ -523,29 +782,85 @@ class BungieApi:
         return result_dict
 
 
+    def get_d2_profile_cached(self, membership_id, membership_type, components, fields=None):
+        """Fetch a profile via get_d2_profile(), reusing responses fetched within the last PROFILE_CACHE_TTL seconds.
+
+        :param membership_id:
+        :param membership_type:
+        :param components:
+        :param fields:
+        :return:
+        """
+        cache_key = (str(membership_id), str(membership_type), tuple(components), tuple(fields or ()))
+        profile = self._profile_cache.get(cache_key)
+        if profile is None:
+            profile = self.get_d2_profile(membership_id, membership_type, components, fields=fields)
+            self._profile_cache.set(cache_key, profile)
+        return profile
+
+    def _clan_member_last_on(self, member):
+        """Build a clan roster row for a group member, including the last time they played.
+
+        :param member:
+        :return: dict
+        """
+        profile = self.get_d2_profile_cached(
+            member['destinyUserInfo']['membershipId'],
+            member['destinyUserInfo']['membershipType'],
+            components=['100'],
+            fields=self.LAST_PLAYED_FIELDS)
+        last_played = profile['profile']['data']['dateLastPlayed']
+        last_played = parse_bungie_timestamp(last_played)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        time_since_last_played = now - last_played
+        return {
+            'name': member['destinyUserInfo']['displayName'],
+            'joinDate': member['joinDate'],
+            'lastPlayed': last_played,
+            'timeSinceLastPlayed': str(time_since_last_played),
+            'isOnline': member['isOnline']
+        }
+
+    def iter_clan_last_on(self, clan_id):
+        """Stream a clan's roster, yielding each member's row as soon as their profile has been fetched.
+
+        Profiles are fetched concurrently (up to MAX_CONCURRENT_REQUESTS at a time), starting as soon as each page of
+        the roster arrives, so rows arrive in completion order rather than roster order. Closing the generator early
+        cancels the fetches that haven't started.
+
+        :param clan_id:
+        :return: a generator of dicts, one per member of the clan roster
+        """
+        clan_member_last_on = tracer.bind(self._clan_member_last_on)
+        get_clan_members = tracer.bind(self.get_clan_members)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT_REQUESTS) as executor:
+            # The roster's pages are fetched in the pool too, so rows are yielded while the next page is on its way.
+            page = 1
+            page_future = executor.submit(get_clan_members, clan_id, page=page)
+            try:
+                while page_future or pending:
+                    done, _ = wait(pending | {page_future} - {None}, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future is page_future:
+                            clan_members = future.result()
+                            for member in clan_members['results']:
+                                pending.add(executor.submit(clan_member_last_on, member))
+                            page_future = None
+                            if clan_members.get('hasMore'):
+                                page += 1
+                                page_future = executor.submit(get_clan_members, clan_id, page=page)
+                        else:
+                            pending.remove(future)
+                            yield future.result()
+            finally:
+                for future in pending | {page_future} - {None}:
+                    future.cancel()
+
     def get_clan_last_on(self, clan_id):
         """Return a clan's roster including the last time each member played and when they joined.
     
         :param clan_id: 
         :return: List of dicts, each member of the clan roster
         """
-        clan_members = self.get_clan_members(clan_id)
-        clan_members_clean = []
-        for member in clan_members['results']:
-            profile = self.get_d2_profile(
-                member['destinyUserInfo']['membershipId'],
-                member['destinyUserInfo']['membershipType'],
-                components=['100'])
-            last_played = profile['profile']['data']['dateLastPlayed']
-            last_played = datetime.datetime.strptime(last_played, '%Y-%m-%dT%H:%M:%S%z')
-            now = datetime.datetime.now(datetime.timezone.utc)
-            time_since_last_played = now - last_played
-            clan_members_clean.append(
-                {
-                    'name': member['destinyUserInfo']['displayName'],
-                    'joinDate': member['joinDate'],
-                    'lastPlayed': last_played,
-                    'timeSinceLastPlayed': str(time_since_last_played),
-                    'isOnline': member['isOnline']
-                })
-        return sorted(clan_members_clean, key=lambda i: i['lastPlayed'])
+        return sorted(self.iter_clan_last_on(clan_id), key=lambda i: i['lastPlayed'])
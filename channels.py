@@ -0,0 +1,46 @@
+"""The Slack channels Hawthorne runs in, as configured in the environment.
+
+Kept apart from the bot itself, so that the web app can tell which channels are served without importing it.
+
+Example usage:
+    for channel_config in channel_configs_from_environment():
+        print(channel_config['channel'], channel_config['log_channel'])
+"""
+import json
+import os
+
+
+def channel_configs_from_environment():
+    """Retrieve the channels to run Hawthorne in.
+
+    HAWTHORNE_CHANNELS holds a JSON list of channel configs, e.g.
+    `[{"channel": "CR0NPJWBT", "log_channel": "CRDP36TMX"}, {"channel": "C0FFEE", "log_channel": "C0FFEF",
+    "slack_api_token": "xoxp-...", "slack_api_bot_token": "xoxb-..."}]`, where the Slack tokens (for channels in
+    another workspace) are optional. Without it, the single channel in SLACK_CHANNEL_HAWTHORNE is used.
+
+    :return: a list of dicts
+    """
+    channels = os.environ.get('HAWTHORNE_CHANNELS')
+    if not channels:
+        return [{
+            'channel': _required_environment_variable('SLACK_CHANNEL_HAWTHORNE'),
+            'log_channel': _required_environment_variable('SLACK_CHANNEL_LOG'),
+            'staging_channel': os.environ.get('SLACK_CHANNEL_FOR_STAGING_WITH_REAL_USERS'),
+            'redis_prefix': '',
+            'slash_commands': True,
+        }]
+
+    channel_configs = json.loads(channels)
+    for config in channel_configs:
+        config.setdefault('staging_channel', None)
+        # Keep each channel's activity history separate, since a player may be in several channels.
+        config.setdefault('redis_prefix', f"{config['channel']}!")
+        config.setdefault('slash_commands', True)
+    return channel_configs
+
+
+def _required_environment_variable(varname):
+    envvar_value = os.environ.get(varname, None)
+    if not envvar_value:
+        raise Exception(f"Missing environment variable {varname}")
+    return envvar_value
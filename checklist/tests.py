@@ -1,3 +1,171 @@
-from django.test import TestCase
+import os
+import hmac
+import json
+import time
+import hashlib
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+from django.test import SimpleTestCase, TestCase
+
+
+class MetricsViewTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        for instance, count in (('worker.1:10', 1), ('worker.2:20', 2)):
+            self.redis.set(f'metrics.bungie_api!{instance}', (
+                '# TYPE bungie_api_requests_total counter\n'
+                f'bungie_api_requests_total{{endpoint="/Profile/"}} {count}\n'))
+        patcher = mock.patch('checklist.views.redis_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_not_served_without_a_metrics_token(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('METRICS_TOKEN', None)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
+
+    def test_rejects_a_missing_or_wrong_token(self):
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': 'secret'}):
+            for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}, {'HTTP_AUTHORIZATION': 'secret'}):
+                with self.subTest(headers=headers):
+                    response = self.client.get('/metrics', **headers)
+                    self.assertEqual(response.status_code, 401)
+                    self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+                    self.assertNotIn(b'bungie_api', response.content)
+
+    def test_serves_every_workers_metrics_with_the_token(self):
+        with mock.patch.dict(os.environ, {'METRICS_TOKEN': 'secret'}):
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertEqual(response.content.decode(), (
+            '# TYPE bungie_api_requests_total counter\n'
+            'bungie_api_requests_total{instance="worker.1:10",endpoint="/Profile/"} 1\n'
+            'bungie_api_requests_total{instance="worker.2:20",endpoint="/Profile/"} 2\n'))
+
+
+class OAuthCallbackViewTest(TestCase):
+    def setUp(self):
+        self.shared_client = mock.MagicMock()
+        self.user_client = mock.MagicMock()
+        self.user_client.get_oauth_token.return_value = {'access_token': 'new-token'}
+        self.user_client.get_user_currentuser_membership.return_value = {
+            'destinyMemberships': [{'membershipId': '4611686018467284386', 'membershipType': 3}]}
+        for target, kwargs in (
+            ('checklist.views.bungie_client', {'return_value': self.shared_client}),
+            ('checklist.views.cached_manifest', {'return_value': {'version': 'v1'}}),
+            ('bungie_wrapper.BungieApi', {'return_value': self.user_client}),
+        ):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_logs_in_and_shows_the_memberships(self):
+        response = self.client.get('/auth', {'code': 'oauth-code'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '4611686018467284386')
+        self.user_client.get_oauth_token.assert_called_once_with('oauth-code', persist=True)
+        self.assertEqual(self.client.session['oauth_token'], {'access_token': 'new-token'})
+        # The page only shows the memberships, so their profiles aren't fetched.
+        self.shared_client.get_d2_profile.assert_not_called()
+        self.user_client.get_d2_profile.assert_not_called()
+
+    def test_reuses_the_token_in_the_session(self):
+        session = self.client.session
+        session['oauth_token'] = {'access_token': 'old-token'}
+        session.save()
+        response = self.client.get('/auth')
+        self.assertEqual(response.status_code, 200)
+        self.user_client.get_oauth_token.assert_not_called()
+        self.assertContains(response, 'old-token')
+
+
+class BotSlashCommandViewTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch('checklist.views.redis_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        channels = [{'channel': 'C1', 'log_channel': 'L1'},
+                    {'channel': 'C2', 'log_channel': 'L2', 'slash_commands': False}]
+        patcher = mock.patch.dict(os.environ, {'HAWTHORNE_CHANNELS': json.dumps(channels)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def list_in(self, channel_id):
+        return self.client.post('/bot-slash-command', {
+            'response_url': 'https://hooks.slack.com/commands/1', 'channel_id': channel_id, 'user_id': 'U1',
+            'text': 'list'})
+
+    def test_list_is_queued_for_the_channels_bot(self):
+        response = self.list_in('C1')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Hang on a sec')
+        self.assertEqual(self.redis.lrange('slash.list!C1', 0, -1), ['C1,U1'])
+
+    def test_list_in_an_unserved_channel_is_refused(self):
+        for channel_id in ('C2', 'D0123456', 'C9'):
+            with self.subTest(channel_id=channel_id):
+                response = self.list_in(channel_id)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "isn't available in this channel")
+                self.assertFalse(self.redis.exists(f'slash.list!{channel_id}'))
+
+
+class SlackEventsViewTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch('checklist.views.redis_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(os.environ, {'SLACK_SIGNING_SECRET': 'signing-secret'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, payload, timestamp=None, secret='signing-secret'):
+        body = json.dumps(payload).encode()
+        timestamp = str(int(time.time()) if timestamp is None else timestamp)
+        signature = 'v0=' + hmac.new(
+            secret.encode(), b'v0:' + timestamp.encode() + b':' + body, hashlib.sha256).hexdigest()
+        return self.client.post('/slack-events', body, content_type='application/json',
+                                HTTP_X_SLACK_REQUEST_TIMESTAMP=timestamp, HTTP_X_SLACK_SIGNATURE=signature)
+
+    def event(self, event):
+        return self.post({'type': 'event_callback', 'event': event})
+
+    def test_rejects_requests_not_signed_by_slack(self):
+        self.assertEqual(self.post({'type': 'url_verification'}, secret='wrong-secret').status_code, 403)
+        self.assertEqual(self.client.post('/slack-events', '{}', content_type='application/json').status_code, 403)
+        self.assertEqual(self.client.get('/slack-events').status_code, 403)
+
+    def test_rejects_stale_requests(self):
+        response = self.post({'type': 'url_verification'}, timestamp=int(time.time()) - 10 * 60)
+        self.assertEqual(response.status_code, 403)
+
+    def test_rejects_everything_without_a_signing_secret(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('SLACK_SIGNING_SECRET')
+            self.assertEqual(self.post({'type': 'url_verification'}, secret='').status_code, 403)
+
+    def test_answers_the_url_verification_challenge(self):
+        response = self.post({'type': 'url_verification', 'challenge': 'the-challenge'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'the-challenge')
+
+    def test_members_joining_and_leaving_update_the_roster(self):
+        self.redis.sadd('roster!C1!members', 'U1')
+        self.assertEqual(self.event({'type': 'member_joined_channel', 'channel': 'C1', 'user': 'U2'}).status_code, 200)
+        self.assertEqual(self.event({'type': 'member_left_channel', 'channel': 'C1', 'user': 'U1'}).status_code, 200)
+        self.assertEqual(self.redis.smembers('roster!C1!members'), {'U2'})
+
+    def test_user_change_updates_stored_profiles_only(self):
+        self.redis.hset('roster!profiles', 'U1', json.dumps({'slack_id': 'U1', 'destiny_psn_id': 'psn-name'}))
+        for user_id in ('U1', 'U2'):
+            self.event({'type': 'user_change', 'user': {'id': user_id, 'profile': {'display_name': 'New Name'}}})
+        record = json.loads(self.redis.hget('roster!profiles', 'U1'))
+        self.assertEqual(record['slack_display_name'], 'New Name')
+        # Without custom profile fields in the event, the stored gamertags are kept.
+        self.assertEqual(record['destiny_psn_id'], 'psn-name')
+        self.assertIsNone(self.redis.hget('roster!profiles', 'U2'))
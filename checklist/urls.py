@@ -22,5 +22,7 @@ from checklist import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('bot-slash-command', views.bot_slash_command, name='bot_slash_command'),
-    path('auth', views.oauth_callback, name='oauth_callback')
+    path('auth', views.oauth_callback, name='oauth_callback'),
+    path('metrics', views.metrics, name='metrics'),
+    path('slack-events', views.slack_events, name='slack_events')
 ]
@@ -1,18 +1,76 @@
 import os
+import hmac
 import json
+import time
 import redis
+import asyncio
+import hashlib
 import datetime
+import threading
 
-r = redis.from_url(os.environ.get("REDIS_URL"), decode_responses=True)
+from asgiref.sync import sync_to_async
 
 from django.shortcuts import render
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.template import loader
 from django.views.decorators.csrf import csrf_exempt
 
-from bungie_wrapper import BungieApi
-from hawthorne import Hawthorne
-from utilities import logger
+import roster
+from channels import channel_configs_from_environment
+from metrics import merge_prometheus
+from utilities import logger, TtlCache
+
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 10))
+SLACK_REQUEST_MAX_AGE = 5 * 60
+MANIFEST_CACHE_TTL = 60 * 60
+METRICS_REDIS_KEY_PREFIX = 'metrics.bungie_api!'
+
+_redis_pool = None
+_redis_pool_lock = threading.Lock()
+_bungie_client = None
+_bungie_client_lock = threading.Lock()
+_manifest_cache = TtlCache(MANIFEST_CACHE_TTL)
+
+
+def redis_client():
+    """Return a Redis client on this process's shared connection pool, creating the pool on first use.
+
+    The pool is created lazily, rather than at import time, so that it is never shared across gunicorn's forks.
+    """
+    global _redis_pool
+    if _redis_pool is None:
+        with _redis_pool_lock:
+            if _redis_pool is None:
+                _redis_pool = redis.BlockingConnectionPool.from_url(
+                    os.environ.get("REDIS_URL"), decode_responses=True, max_connections=REDIS_MAX_CONNECTIONS)
+    return redis.Redis(connection_pool=_redis_pool)
+
+
+def bungie_client():
+    """Return this process's shared, app-authenticated Bungie.net client, creating it on first use."""
+    global _bungie_client
+    if _bungie_client is None:
+        with _bungie_client_lock:
+            if _bungie_client is None:
+                # Imported here so that the other views don't pay for importing requests and the Bungie.net client.
+                from bungie_wrapper import BungieApi
+                _bungie_client = BungieApi(os.environ.get('BUNGIE_API_TOKEN'))
+    return _bungie_client
+
+
+def cached_manifest():
+    """Return the Destiny 2 manifest, fetching it at most once every MANIFEST_CACHE_TTL seconds."""
+    manifest = _manifest_cache.get('manifest')
+    if manifest is None:
+        manifest = bungie_client().get_d2_manifest()
+        _manifest_cache.set('manifest', manifest)
+    return manifest
+
+
+
+def slash_command_channels():
+    """Return the channels whose bots answer /hawthorne list requests, as configured for the worker."""
+    return {config['channel'] for config in channel_configs_from_environment() if config['slash_commands']}
 
 
 def home(request):
@@ -33,35 +91,89 @@ def home(request):
     }
     return HttpResponse(template.render(context, request))
 
-def oauth_callback(request):
-    oauth_token = request.session.get('oauth_token')
+async def oauth_callback(request):
+    """Complete a Bungie.net login and show the user's memberships.
+
+    The Bungie.net calls run concurrently in threads, over the connection pool of the shared client.
+    """
+    from bungie_wrapper import BungieApi
+
+    def in_thread(method):
+        return sync_to_async(method, thread_sensitive=False)
+
+    shared_client = bungie_client()
+    oauth_token = await sync_to_async(request.session.get)('oauth_token')
+    user_client = BungieApi(os.environ.get('BUNGIE_API_TOKEN'), oauth_token=oauth_token, session=shared_client.session)
     if not oauth_token:
         oauth_code = request.GET.get('code')
-        bungie_client = BungieApi(os.environ.get('BUNGIE_API_TOKEN'))
-        oauth_token = bungie_client.get_oauth_token(oauth_code, persist=True)
-        request.session['oauth_token'] = oauth_token
-
-    bungie_client = BungieApi(os.environ.get('BUNGIE_API_TOKEN'), oauth_token=request.session['oauth_token'])
-
-    current_user = bungie_client.get_user_currentuser_membership()
-    memberships = []
-    for membership in current_user.get('destinyMemberships'):
-        bungie_client.get_d2_profile(
-            membership.get('membershipId'),
-            membership.get('membershipType'),
-            ['100']
-        )
-        memberships.append(membership)
+        oauth_token = await in_thread(user_client.get_oauth_token)(oauth_code, persist=True)
+        await sync_to_async(request.session.__setitem__)('oauth_token', oauth_token)
+
+    current_user, manifest = await asyncio.gather(
+        in_thread(user_client.get_user_currentuser_membership)(),
+        in_thread(cached_manifest)(),
+    )
+    memberships = list(current_user.get('destinyMemberships'))
 
     template = loader.get_template('checklist/oauth_callback.html')
     context = {
-        'manifest': bungie_client.get_d2_manifest(),
+        'manifest': manifest,
         'oauth_token': json.dumps(oauth_token, indent=4),
         'current_user': json.dumps(current_user, indent=4),
         'memberships': json.dumps(memberships, indent=4),
     }
     return HttpResponse(template.render(context, request))
 
+def metrics(request):
+    """Serve the workers' Bungie.net API metrics in Prometheus text format, to scrapers bearing METRICS_TOKEN.
+
+    Each worker process publishes its own to Redis every minute (see Hawthorne.export_metrics()), and they're served
+    together, labelled by instance. Without a METRICS_TOKEN set, the metrics aren't served at all.
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if not token:
+        raise Http404()
+    if not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        response = HttpResponse('Unauthorized', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    client = redis_client()
+    keys = sorted(client.scan_iter(match=f'{METRICS_REDIS_KEY_PREFIX}*'))
+    texts = {
+        key[len(METRICS_REDIS_KEY_PREFIX):]: text for key, text in zip(keys, client.mget(keys) if keys else []) if text
+    }
+    return HttpResponse(merge_prometheus(texts), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def slack_request_is_valid(request):
+    """Verify a request's Slack signature, using the app's signing secret in SLACK_SIGNING_SECRET.
+
+    See https://api.slack.com/authentication/verifying-requests-from-slack
+    """
+    signing_secret = os.environ.get('SLACK_SIGNING_SECRET')
+    timestamp = request.META.get('HTTP_X_SLACK_REQUEST_TIMESTAMP', '')
+    signature = request.META.get('HTTP_X_SLACK_SIGNATURE', '')
+    if not signing_secret or not timestamp.isdigit() or abs(time.time() - int(timestamp)) > SLACK_REQUEST_MAX_AGE:
+        return False
+    basestring = b'v0:' + timestamp.encode() + b':' + request.body
+    expected = 'v0=' + hmac.new(signing_secret.encode(), basestring, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+@csrf_exempt
+def slack_events(request):
+    """Receive Slack Events API callbacks, keeping the channel rosters in Redis up to date.
+
+    Subscribe the Slack app to the member_joined_channel, member_left_channel and user_change events, with this
+    view's URL as the request URL.
+    """
+    if request.method != 'POST' or not slack_request_is_valid(request):
+        return HttpResponse(status=403)
+    payload = json.loads(request.body)
+    if payload.get('type') == 'url_verification':
+        return HttpResponse(payload.get('challenge', ''), content_type='text/plain')
+    if payload.get('type') == 'event_callback':
+        roster.handle_event(redis_client(), payload.get('event', {}))
+    return HttpResponse()
+
 @csrf_exempt
 def bot_slash_command(request):
     """Handle Slack /hawthorne commands.
@@ -88,7 +200,7 @@ def bot_slash_command(request):
         return HttpResponse(template.render(context, request))
     if command == 'unmute':
         # /hawthorne unmute
-        r.delete(f'mute.{user_id}')
+        redis_client().delete(f'mute.{user_id}')
         return HttpResponse('Your status will appear in #hawthorne again.')
     if command.startswith('mute '):
         # /hawthorne mute 1h
@@ -102,11 +214,14 @@ def bot_slash_command(request):
                 ' You provided `{command.split(' ')[1]}` which does not match the integer format `8h` or `8`.'
             ))
         timestamp = datetime.datetime.now().timestamp() + (hours * 60.0 * 60.0)
-        r.set(f'mute.{user_id}', timestamp)
+        redis_client().set(f'mute.{user_id}', timestamp)
         return HttpResponse(f'I will hide your activity for {hours} hours.')
     if command == 'list':
         # /hawthorne list
-        r.lpush('slash.list', f'{channel_id},{user_id}')
+        # Each channel's bot only answers its own channel's queue, so don't queue requests nobody will answer.
+        if channel_id not in slash_command_channels():
+            return HttpResponse("Sorry, `/hawthorne list` isn't available in this channel.")
+        redis_client().lpush(f'slash.list!{channel_id}', f'{channel_id},{user_id}')
         return HttpResponse(":wave: Hang on a sec, I'll fetch player activities and get back to you.")
     return HttpResponse(
         ("I couldn't understand your command. Try `/hawthorne help`.\n"
@@ -0,0 +1,17 @@
+"""
+ASGI config for destiny_roll_checklist project.
+
+It exposes the ASGI callable as a module-level variable named ``application``. The web process serves it with
+uvicorn workers, so that async views (e.g. the OAuth callback) don't hold a worker while they wait on Bungie.net.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'destiny_roll_checklist.settings')
+
+application = get_asgi_application()
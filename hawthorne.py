@@ -6,17 +6,28 @@ import json
 import pprint
 import shlex
 import datetime
+import heapq
 import time
 import signal
+import socket
+import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 import redis
-import requests
 import humanize
 from asyncio import TimeoutError
 
+from activity_filter import ActivityFilter
+from activity_record import ActivityRecord
+from channels import channel_configs_from_environment
+from roster import Roster, member_record
 from slack_wrapper import SlackApi
-from bungie_wrapper import BungieApi, Non200ResponseException
+from bungie_wrapper import BungieApi, Non200ResponseException, project
+from sharding import ShardCoordinator
+from token_store import TokenStore
+from tracing import tracer, traced
+from utilities import parse_bungie_timestamp, TtlCache
 
 MEMBERSHIP_TYPE_XBOX = 1
 MEMBERSHIP_TYPE_PSN = 2
@@ -27,9 +38,13 @@ MEMBERSHIP_TYPE_STADIA = 5
 # #hawthorne-log = CRDP36TMX
 # #hawthorne-playground = CRJERJ0S3
 # #destiny-export = CQDKVNF3R
-SLACK_FIELD_PSN = 'Xf0DB6LM46'
-SLACK_FIELD_XBL = 'XfMDV8FH3K'
-SLACK_FIELD_STM = 'XfMKSQK1S8'
+
+"""Slack member gamertag fields and their Bungie.net membership types, in order of preference."""
+GAMERTAG_FIELDS = [
+    ('destiny_psn_id', MEMBERSHIP_TYPE_PSN),
+    ('destiny_stm_id', MEMBERSHIP_TYPE_STEAM),
+    ('destiny_xbl_id', MEMBERSHIP_TYPE_XBOX),
+]
 
 CLASSES = {
     '2271682572': {'name': 'Warlock', 'emoji': ':warlock:'},
@@ -37,7 +52,19 @@ CLASSES = {
     '671679327': {'name': 'Hunter', 'emoji': ':hunter:'}
 }
 
-"""Activities that should not be reported at all."""
+"""Emoji for activities by their DestinyActivityModeType(s), most specific first: e.g. a Nightfall is also a Strike."""
+ACTIVITY_MODE_TYPE_EMOJI = [
+    ({4}, ':raid2:'),  # Raid
+    ({82}, ':dungeon:'),  # Dungeon
+    ({16, 17, 46, 47}, ':nightfall:'),  # Nightfall, HeroicNightfall, ScoredNightfall, ScoredHeroicNightfall
+    ({63, 75}, ':gambit:'),  # Gambit, GambitPrime
+    ({3, 18}, ':vanguard2:'),  # Strike, AllStrikes
+    ({5}, ':crucible:'),  # AllPvP
+    ({6}, ':fireteam:'),  # Patrol
+    ({2}, ':fireteam:'),  # Story
+]
+
+"""(Activity hash, activity mode hash) pairs that should not be reported at all."""
 ACTIVITY_BLACKLIST = [
     (0, 0),
     (82913930, 2166136261),  # Orbit
@@ -50,8 +77,63 @@ ACTIVITY_DUPE_BLACKLIST = [
     1019949956  # Forges
 ]
 
+"""Activity filter rules (see activity_filter.py) always in force; more can be added at runtime through
+HAWTHORNE_ACTIVITY_FILTER or the Redis key in ACTIVITY_FILTER_REDIS_KEY."""
+DEFAULT_ACTIVITY_RULES = {'pairs': ACTIVITY_BLACKLIST, 'repeats': ACTIVITY_DUPE_BLACKLIST}
+ACTIVITY_FILTER_REDIS_KEY = 'activity_filter'
+
+"""Message templates for announcing activities; a fireteam's activity is announced once, listing its players."""
+PLAYER_TEMPLATE = '{class_emoji} {display_name}'
+ACTIVITY_TEMPLATE = '{activity_emoji} *{activity_name}*'
+PLAYING_TEMPLATE = '{player} is playing {activity}'
+STARTED_PLAYING_TEMPLATE = '{player} started playing {activity} _{started}_'
+FIRETEAM_PLAYING_TEMPLATE = '{players} are playing {activity}'
+FIRETEAM_HEADER_TEMPLATE = '{activity} with a fireteam of {count}'
+PLAYERS_HEADER_TEMPLATE = '{count} players started {activity}'
+SESSION_HISTORY_TEMPLATE = 'Earlier this session: {activities}'
+SESSION_ENDED_TEMPLATE = '{players} played {activities} for {duration}.'
+"""Players starting the same activity within this many seconds of each other are announced together."""
+ANNOUNCEMENT_WINDOW = 120
+"""Seconds to keep editing a play session's message in place, since it last changed."""
+SESSION_TTL = 12 * 60 * 60
+"""Seconds after a player was last seen playing for which their session is still live, and can be added to."""
+SESSION_IDLE_TIMEOUT = 10 * 60
+
 MAINTENANCE_SLEEP_TIME = 300
+LEASE_TTL = int(os.environ.get('HAWTHORNE_LEASE_TTL', 30))
+MEMBERSHIP_CACHE_TTL = 15 * 60
+"""Bounds on the per-user caches: how many users each holds, and for how long a user is remembered."""
+USER_CACHE_MAXSIZE = int(os.environ.get('HAWTHORNE_USER_CACHE_MAXSIZE', 10000))
+"""Every user ever welcomed is kept in a Redis set, so these only bound the in-process copy of it."""
+SLACK_SEEN_CACHE_TTL = 30 * 24 * 60 * 60
+UNABLE_TO_FIND_USERS_SQUELCH_TTL = 24 * 60 * 60
+"""The longest a player's poll is put off while a fireteam-mate's poll shows them still in the same activity."""
+FIRETEAM_DEFER_MAX = int(os.environ.get('HAWTHORNE_FIRETEAM_DEFER_MAX', 120))
+"""The most members to poll per report tick, most likely to have changed activity first; 0 to poll everyone."""
+POLL_BUDGET = int(os.environ.get('HAWTHORNE_POLL_BUDGET', 0))
+"""Seconds since starting their current activity for which a player counts as recently active."""
+RECENTLY_ACTIVE_WINDOW = 30 * 60
+"""Seconds of waiting it takes a member to catch up with the next most likely tier, so that nobody is starved."""
+POLL_PRIORITY_AGING = 120
+POLL_STATE_TTL = 24 * 60 * 60
+"""Each worker process publishes its own metrics, which expire a few export intervals after the process stops."""
+METRICS_REDIS_KEY = 'metrics.bungie_api!{instance}'
+METRICS_TTL = 5 * 60
+METRICS_INSTANCE = '{}:{}'.format(os.environ.get('DYNO', socket.gethostname()), os.getpid())
+SLOW_TICK_SECONDS = float(os.environ.get('HAWTHORNE_SLOW_TICK_SECONDS', 20))
+PROFILE_DIRECTORY = os.environ.get('HAWTHORNE_PROFILE_DIRECTORY', '/tmp')
 SIGTERM_RECEIVED = False
+
+"""Bungie.net manifest components by manifest version, shared by every bot in the process."""
+MANIFEST_CACHE = {}
+"""The parts of the manifest components the bot uses (see bungie_wrapper.project()), which are all that is kept."""
+ACTIVITY_DEFINITION_FIELDS = ['*.displayProperties.name', '*.activityLightLevel']
+ACTIVITY_MODE_DEFINITION_FIELDS = ['*.displayProperties.name']
+MANIFEST_SNAPSHOT_KEY = 'manifest!snapshot'
+"""Seconds after a report for which a restarted bot can trust the activity state in Redis, and skip re-priming it."""
+PRIMED_TTL = 10 * 60
+"""Seconds for which a checkpoint of a bot's per-user state is kept after it was last written."""
+WORKER_STATE_TTL = 7 * 24 * 60 * 60
 pp = pprint.PrettyPrinter(indent=4)
 
 
@@ -76,7 +158,9 @@ class Hawthorne:
             slack_wrapper,
             bungie_wrapper,
             redis_wrapper,
-            slack_channel_for_staging_with_real_users=None
+            slack_channel_for_staging_with_real_users=None,
+            redis_prefix='',
+            handles_slash_commands=True
     ):
         self.slack_api_token = slack_api_token
         self.slack_incoming_webhook_url = slack_incoming_webhook_url
@@ -91,22 +175,37 @@ class Hawthorne:
         self.slack_bot_user_id = slack_bot_user_id
         self.slack = slack_wrapper  # type: SlackApi
         self.bungie = bungie_wrapper  # type: BungieApi
-        self.redis = redis_wrapper  # type: redis.Redis
-
-        self.unable_to_find_users_squelch = {}
-        self.slack_seen_cache = {}
+        self.redis = traced(redis_wrapper, 'redis')  # type: redis.Redis
+        self.redis_prefix = redis_prefix
+        # Sent to Redis by its SHA1 (EVALSHA), and only sent in full the first time a Redis server sees it.
+        self.claim_activity_script = redis_wrapper.register_script(self.CLAIM_ACTIVITY_SCRIPT)
+        self.handles_slash_commands = handles_slash_commands
+
+        self.unable_to_find_users_squelch = TtlCache(UNABLE_TO_FIND_USERS_SQUELCH_TTL, maxsize=USER_CACHE_MAXSIZE)
+        self.slack_seen_cache = TtlCache(SLACK_SEEN_CACHE_TTL, maxsize=USER_CACHE_MAXSIZE)
+        self.membership_cache = TtlCache(MEMBERSHIP_CACHE_TTL, maxsize=USER_CACHE_MAXSIZE)
+        self.last_polled = TtlCache(FIRETEAM_DEFER_MAX, maxsize=USER_CACHE_MAXSIZE)
+        self.poll_state = TtlCache(POLL_STATE_TTL, maxsize=USER_CACHE_MAXSIZE)
+        self.activity_filter = ActivityFilter.from_rules(DEFAULT_ACTIVITY_RULES)
         self.bungie_manifest = None
         self.bungie_manifest_activity_definitions = None
         self.bungie_manifest_activity_mode_definitions = None
+        self.activity_emoji = {}
         self.keep_running = False
         self.back_pressure = None
+        self.back_off_until = None
         self.status_thread_ts = None
         self.status_log_thread_ts = None
+        self.action_registry = []
+        self.suppress_first_seen = False
 
     @staticmethod
-    def instantiate_from_environment(cache_manifests=False):
+    def instantiate_from_environment(cache_manifests=False, interactive=None):
         """Instantiate a Hawthorne() from environment variables.
 
+            :param cache_manifests: 
+            :param interactive: whether to prompt for new credentials when needed, rather than failing; by default,
+                only when attached to a terminal and HAWTHORNE_NON_INTERACTIVE is not set
             :return: 
             """
         # Fetch environment variables.
@@ -116,10 +215,10 @@ class Hawthorne:
         slack_oauth_client_id = required_environment_variable('SLACK_OAUTH_CLIENT_ID')
         slack_oauth_client_secret = required_environment_variable('SLACK_OAUTH_CLIENT_SECRET')
         slack_oauth_token = optional_environment_variable('SLACK_OAUTH_TOKEN')
-        slack_channel_hawthorne = required_environment_variable('SLACK_CHANNEL_HAWTHORNE')
-        slack_channel_for_staging_with_real_users = optional_environment_variable(
-            'SLACK_CHANNEL_FOR_STAGING_WITH_REAL_USERS')
-        slack_channel_log = required_environment_variable('SLACK_CHANNEL_LOG')
+        channel_config = channel_configs_from_environment()[0]
+        slack_channel_hawthorne = channel_config['channel']
+        slack_channel_for_staging_with_real_users = channel_config['staging_channel']
+        slack_channel_log = channel_config['log_channel']
         slack_bot_user_id = required_environment_variable('SLACK_BOT_USER_ID')
         bungie_api_token = required_environment_variable('BUNGIE_API_TOKEN')
         bungie_oauth_token = optional_environment_variable('BUNGIE_OAUTH_TOKEN')
@@ -129,10 +228,29 @@ class Hawthorne:
 
         # Fetch command-line arguments.
         # ---
+        if interactive is None:
+            interactive = sys.stdin.isatty() and not optional_environment_variable('HAWTHORNE_NON_INTERACTIVE')
+
+        # Authenticate with Redis
+        my_redis = redis.from_url(redis_url, decode_responses=True)
+
+        # Authenticate with Bungie, preferring the token persisted (and kept fresh) by previous runs.
+        bungie = BungieApi(bungie_api_token)
+        token_store = TokenStore(my_redis, bungie)
+        bungie_oauth_token = token_store.load() or bungie_oauth_token
+        if not bungie_oauth_token:
+            if not interactive:
+                raise Exception(
+                    "No Bungie.net OAuth token in Redis or BUNGIE_OAUTH_TOKEN, and not running interactively.")
+            print('No oauth token in Redis or BUNGIE_OAUTH_TOKEN, so fetching a new one.')
+            bungie_oauth_token = cli_bungie_auth(bungie_api_token)
+        bungie.oauth_token = bungie_oauth_token
 
         # Authenticate with Slack
         oauth_scope = ['users.profile:read']
         if not slack_oauth_token:
+            if not interactive:
+                raise Exception("Missing environment variable SLACK_OAUTH_TOKEN, and not running interactively.")
             slack = SlackApi(oauth_client_id=slack_oauth_client_id,
                              oauth_client_secret=slack_oauth_client_secret,
                              oauth_scope=oauth_scope,
@@ -144,28 +262,30 @@ class Hawthorne:
             slack.finish_auth(code)
         else:
             slack = SlackApi(oauth_user_token=slack_oauth_token, incoming_webhook_url=slack_incoming_webhook_url)
-            slack.auth(slack_oauth_token, slack_api_bot_token)
 
-        # Authenticate with Bungie
-        if not bungie_oauth_token:
-            print('No oauth token in BUNGIE_OAUTH_TOKEN, so fetching a new one.')
-            bungie_oauth_token = cli_bungie_auth(bungie_api_token)
-        bungie = BungieApi(bungie_api_token, bungie_oauth_token)
-        print("Verifying Bungie API connection.")
+        # Verify the Slack and Bungie credentials concurrently.
+        print("Verifying Slack and Bungie API connections.")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            slack_auth = None
+            if slack_oauth_token:
+                slack_auth = executor.submit(slack.auth, slack_oauth_token, slack_api_bot_token)
+            bungie_auth = executor.submit(bungie.is_authenticated, validate=True)
+        if slack_auth:
+            slack_auth.result()
         try:
-            if not bungie.is_authenticated(validate=True):
-                print("Unable to proceed, not authenticated with valid credentials.")
-                return
+            authenticated = bungie_auth.result()
         except Exception as e:
+            if not interactive:
+                raise
             print("Exception encountered when authenticating - fetching new credentials.")
-            bungie_oauth_token = cli_bungie_auth(bungie_api_token)
-            bungie = BungieApi(bungie_api_token, bungie_oauth_token)
-            if not bungie.is_authenticated(validate=True):
-                print("Unable to proceed, not authenticated with valid credentials.")
-                return
-
-        # Authenticate with Redis
-        my_redis = redis.from_url(redis_url, decode_responses=True)
+            bungie.oauth_token = cli_bungie_auth(bungie_api_token)
+            authenticated = bungie.is_authenticated(validate=True)
+        if not authenticated:
+            print("Unable to proceed, not authenticated with valid credentials.")
+            return
+        bungie_oauth_token = bungie.oauth_token
+        token_store.save(bungie_oauth_token)
+        token_store.start()
 
         # Start the bot.
         bot = Hawthorne(
@@ -182,12 +302,44 @@ class Hawthorne:
             slack,
             bungie,
             my_redis,
-            slack_channel_for_staging_with_real_users=slack_channel_for_staging_with_real_users
+            slack_channel_for_staging_with_real_users=slack_channel_for_staging_with_real_users,
+            redis_prefix=channel_config['redis_prefix'],
+            handles_slash_commands=channel_config['slash_commands']
         )
         if cache_manifests:
             bot.cache_bungie_manifests()
         return bot
 
+    def for_channel(self, channel_config):
+        """Instantiate a Hawthorne() for another channel, sharing this bot's Bungie.net and Redis clients.
+
+        :param channel_config: a dict as returned by channel_configs_from_environment()
+        :return: 
+        """
+        slack = self.slack
+        if channel_config.get('slack_api_token'):
+            slack = SlackApi(oauth_user_token=channel_config['slack_api_token'],
+                             incoming_webhook_url=self.slack_incoming_webhook_url)
+            slack.auth(channel_config['slack_api_token'], channel_config['slack_api_bot_token'])
+        return Hawthorne(
+            channel_config.get('slack_api_token') or self.slack_api_token,
+            self.slack_incoming_webhook_url,
+            self.slack_oauth_client_id,
+            self.slack_oauth_client_secret,
+            channel_config.get('slack_api_token') or self.slack_oauth_token,
+            self.bungie_api_token,
+            self.bungie_oauth_token,
+            channel_config['channel'],
+            channel_config['log_channel'],
+            channel_config.get('slack_bot_user_id') or self.slack_bot_user_id,
+            slack,
+            self.bungie,
+            self.redis,
+            slack_channel_for_staging_with_real_users=channel_config['staging_channel'],
+            redis_prefix=channel_config['redis_prefix'],
+            handles_slash_commands=channel_config['slash_commands']
+        )
+
     # endregion
 
 
@@ -206,132 +358,221 @@ class Hawthorne:
         :return: 
         """
         try:
-            if self.keep_running:
-                raise Exception("Bot instance is already running.")
+            self.begin()
+            while self.keep_running is True:
+                if not self.tick():
+                    break
+        except Exception as e:
+            exc = traceback.format_exc()
+            ts = self.log(f":big-red-siren: Exception occurred: `{e}`")
+            self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+
+    def begin(self, takeover=False):
+        """Announce the bot and register the actions that the ticker loop will run, without running any of them.
+
+        :param takeover: whether the bot is taking over from another that was running the channel until just now (e.g.
+            on a hot standby during a deploy), in which case it starts quietly
+        :return: 
+        """
+        if self.keep_running:
+            raise Exception("Bot instance is already running.")
 
-            # This is a simple loop-based ticker. Every tick of the loop, we execute zero or one actions from the registry.
-            # It is not guaranteed to call from the registry at the exactly-correct time: time will drift if call runtime
-            # exceeds the frequency or if another method call results in an execution time being missed, but it will attempt
-            # to execute things as soon as possible after they are scheduled to be run.
+        # This is a simple loop-based ticker. Every tick of the loop, we execute zero or one actions from the registry.
+        # It is not guaranteed to call from the registry at the exactly-correct time: time will drift if call runtime
+        # exceeds the frequency or if another method call results in an execution time being missed, but it will attempt
+        # to execute things as soon as possible after they are scheduled to be run.
 
+        if not takeover:
             self.announce("I'm back! [Bot started.]")
 
-            # Register actions that the loop will tick against.
-            action_registry = [
-                {'method': self.heartbeat, 'frequency': 300, 'last': 0, 'wait': 0, 'calls-api': False},
-                {'method': self.cache_bungie_manifests, 'frequency': 86400, 'last': 0, 'wait': 0, 'calls-api': True},
-                {'method': self.slash_list, 'frequency': 1, 'last': 0, 'wait': 0, 'calls-api': True},
-                {'method': self.cache_player_activities, 'frequency': None, 'last': 0, 'wait': 0, 'calls-api': True},
-                {'method': self.report_player_activity, 'frequency': 30, 'last': 0, 'wait': 0, 'calls-api': True},
-                {'method': self.dump_slack_history, 'frequency': 86400, 'last': 0, 'wait': 86400, 'calls-api': False},
-            ]
-            for i, action in enumerate(action_registry):
-                action_registry[i]['seq'] = i
-            # Enqueue future things that we're waiting on by setting their 'last' to the future.
-            for i, action in enumerate(action_registry):
-                wait = action['wait']
-                if wait > 0:
-                    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
-                    action_registry[i]['last'] = now + wait
-
-            # Start the loop.
-            self.log(":information_source: Starting action ticker.")
-            self.keep_running = True
-            while self.keep_running is True:
-                if SIGTERM_RECEIVED:
-                    self.keep_running = False
-                    msg = "I need to feed Louis before he freaks out again, brb. [Heroku is probably restarting me.]"
-                    self.announce(msg)
-                if self.keep_running is False:
-                    self.log(':information_source: Hawthorne has been instructed to stop. Breaking out of tick loop.')
-                    break
-                self.back_off_if_needed()
-                time.sleep(1)  # We sleep by one second to prevent bot spam.
-                self.debug('TICK')
-
-                # Try to find an action to call, call it, then break as soon as we call one action.
-                sorted_registry = sorted(action_registry, key=lambda x: (x['last'], x['seq']))
-                for i, action in enumerate(sorted_registry):
-                    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
-                    last = action['last']
-                    frequency = action['frequency']
-                    # Skip actions that don't repeat (their frequency is None) after they've run once:
-                    if frequency is None:
-                        frequency = 0
-                        if last > 0:
-                            continue
-                    if last + frequency < now:
-                        action_call = action['method']
-                        if bool(os.environ.get('HAWTHORNE_DEBUG', False)):
-                            action_call_name = action_call.__name__
-                            self.debug(f"Ticking on {action_call_name}. [DEBUG]")
-                            action_call()
-                        else:
-                            try:
-                                action_call_name = action_call.__name__
-                                self.debug(f"Ticking on {action_call_name}.")
-                                action_call()
-                                if self.status_thread_ts:
-                                    self.status_thread_ts = None
-                                    self.status_log_thread_ts = None
-                            except Non200ResponseException as e:
-                                exc = traceback.format_exc()
-                                try:
-                                    response_data = json.loads(e.response.text)
-                                except json.decoder.JSONDecodeError as e2:
-                                    if e.response.status_code == 503:
-                                        ts = self.log(f":warning: 503 error occurred during {action_call_name}")
-                                        self.log_thread(ts, f"```\n{e.response.text}\n```")
-                                        break
-                                    exc = traceback.format_exc()
-                                    ts = self.log(f":warning: Exception occurred when parsing json during Non200ResponseException for status code `{e.response.status_code}`")
-                                    self.log_thread(ts, f"```\ne.response.text\n```")
-                                    self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
-                                    self.log_thread(ts, f"```\n{e2}\n```")
-                                    break
-                                if response_data.get('ErrorStatus') == 'SystemDisabled':
-                                    if self.status_thread_ts:
-                                        self.log_thread(self.status_log_thread_ts, f'Maintenance message: `{e.response.text}`')
-                                        self.log_thread(self.status_thread_ts, 'Bungie.net is still down for maintenance. Will check again in 5 minutes.')
-                                        self.back_pressure = MAINTENANCE_SLEEP_TIME
-                                        break
-                                    self.status_log_thread_ts = self.log(f'Maintenance message: `{e.response.text}`')
-                                    self.status_thread_ts = self.announce(
-                                        "Looks like Bungie.net is down for maintenance. :thread: for status updates.")
-                                    self.back_pressure = MAINTENANCE_SLEEP_TIME
-                                    break
-                                ts = self.log(f":warning: Non200ResponseException occurred when ticking on {action_call_name}: `{e}`")
-                                self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+        # Start from the state persisted by previous runs where we can: the manifest definitions, so that activities can
+        # be named straight away, and the players' activities, if they were reported on recently enough that we can
+        # skip priming them (and, since everyone in the channel was seen then, skip welcoming them).
+        self.restore_manifest_snapshot()
+        primed = self.activity_state_is_primed()
+        self.restore_state()
+        # Members seen by previous runs are kept in Redis; without any, treat everyone already in the channel as seen.
+        self.suppress_first_seen = primed and not self.redis.exists(f"{self.redis_prefix}slack_seen")
+
+        # Register actions that the loop will tick against. Slash commands come first, so they're served right away.
+        action_registry = [
+            {'method': self.slash_list, 'frequency': 1, 'last': 0, 'wait': 0, 'calls-api': True},
+            {'method': self.heartbeat, 'frequency': 300, 'last': 0, 'wait': 0, 'calls-api': False},
+            {'method': self.reload_activity_filter, 'frequency': 60, 'last': 0, 'wait': 0, 'calls-api': False},
+            {'method': self.cache_bungie_manifests, 'frequency': 86400, 'last': 0, 'wait': 0, 'calls-api': True},
+            {'method': self.cache_player_activities, 'frequency': None, 'last': 1 if primed else 0, 'wait': 0,
+             'calls-api': True},
+            {'method': self.report_player_activity, 'frequency': 30, 'last': 0, 'wait': 0, 'calls-api': True},
+            {'method': self.dump_slack_history, 'frequency': 86400, 'last': 0, 'wait': 86400, 'calls-api': False},
+            {'method': self.export_metrics, 'frequency': 60, 'last': 0, 'wait': 60, 'calls-api': False},
+            {'method': self.checkpoint_state, 'frequency': 60, 'last': 0, 'wait': 60, 'calls-api': False},
+            {'method': self.log_metrics_summary, 'frequency': 3600, 'last': 0, 'wait': 3600, 'calls-api': False},
+        ]
+        for i, action in enumerate(action_registry):
+            action_registry[i]['seq'] = i
+        # Enqueue future things that we're waiting on by setting their 'last' to the future.
+        for i, action in enumerate(action_registry):
+            wait = action['wait']
+            if wait > 0:
+                now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+                action_registry[i]['last'] = now + wait
+        self.action_registry = action_registry
+
+        # Start the loop.
+        self.log(":information_source: Starting action ticker.")
+        self.keep_running = True
+
+    def tick(self, sleep=1):
+        """Run one iteration of the ticker loop, calling at most one action that is due.
+
+        :param sleep: seconds to wait before looking for an action
+        :return: False once the bot has been instructed to stop, otherwise True
+        """
+        if SIGTERM_RECEIVED:
+            self.keep_running = False
+            msg = "I need to feed Louis before he freaks out again, brb. [Heroku is probably restarting me.]"
+            self.announce(msg)
+        if self.keep_running is False:
+            self.log(':information_source: Hawthorne has been instructed to stop. Breaking out of tick loop.')
+            self.checkpoint_state()
+            return False
+        backing_off = self.back_off_if_needed()
+        time.sleep(sleep)  # We sleep by one second to prevent bot spam.
+        self.debug('TICK')
+
+        # Try to find an action to call, call it, then break as soon as we call one action.
+        sorted_registry = sorted(self.action_registry, key=lambda x: (x['last'], x['seq']))
+        for i, action in enumerate(sorted_registry):
+            if backing_off and action['calls-api']:
+                continue
+            now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+            last = action['last']
+            frequency = action['frequency']
+            # Skip actions that don't repeat (their frequency is None) after they've run once:
+            if frequency is None:
+                frequency = 0
+                if last > 0:
+                    continue
+            if last + frequency < now:
+                action_call = action['method']
+                if bool(os.environ.get('HAWTHORNE_DEBUG', False)):
+                    action_call_name = action_call.__name__
+                    self.debug(f"Ticking on {action_call_name}. [DEBUG]")
+                    self.run_action(action_call)
+                else:
+                    try:
+                        action_call_name = action_call.__name__
+                        self.debug(f"Ticking on {action_call_name}.")
+                        self.run_action(action_call)
+                        # Only a successful Bungie.net call shows that maintenance is over; until then, keep updating
+                        # the same status thread.
+                        if self.status_thread_ts and action['calls-api']:
+                            self.status_thread_ts = None
+                            self.status_log_thread_ts = None
+                    except Non200ResponseException as e:
+                        exc = traceback.format_exc()
+                        try:
+                            response_data = json.loads(e.response.text)
+                        except json.decoder.JSONDecodeError as e2:
+                            if e.response.status_code == 503:
+                                ts = self.log(f":warning: 503 error occurred during {action_call_name}")
+                                self.log_thread(ts, f"```\n{e.response.text}\n```")
                                 break
-                            except Exception as e:
-                                exc = traceback.format_exc()
-                                ts = self.log(f":warning: Exception occurred when ticking on {action_call_name}: `{e}`")
-                                self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+                            exc = traceback.format_exc()
+                            ts = self.log(f":warning: Exception occurred when parsing json during Non200ResponseException for status code `{e.response.status_code}`")
+                            self.log_thread(ts, f"```\ne.response.text\n```")
+                            self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+                            self.log_thread(ts, f"```\n{e2}\n```")
+                            break
+                        if response_data.get('ErrorStatus') == 'SystemDisabled':
+                            if self.status_thread_ts:
+                                self.log_thread(self.status_log_thread_ts, f'Maintenance message: `{e.response.text}`')
+                                self.log_thread(self.status_thread_ts, 'Bungie.net is still down for maintenance. Will check again in 5 minutes.')
+                                self.back_pressure = MAINTENANCE_SLEEP_TIME
                                 break
-                        action_registry[action['seq']]['last'] = now
+                            self.status_log_thread_ts = self.log(f'Maintenance message: `{e.response.text}`')
+                            self.status_thread_ts = self.announce(
+                                "Looks like Bungie.net is down for maintenance. :thread: for status updates.")
+                            self.back_pressure = MAINTENANCE_SLEEP_TIME
+                            break
+                        ts = self.log(f":warning: Non200ResponseException occurred when ticking on {action_call_name}: `{e}`")
+                        self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+                        break
+                    except Exception as e:
+                        exc = traceback.format_exc()
+                        ts = self.log(f":warning: Exception occurred when ticking on {action_call_name}: `{e}`")
+                        self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
                         break
+                self.action_registry[action['seq']]['last'] = now
+                break
 
-                # END TICK
-                self.debug('TOCK')
-        except Exception as e:
-            exc = traceback.format_exc()
-            ts = self.log(f":big-red-siren: Exception occurred: `{e}`")
-            self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+        # END TICK
+        self.debug('TOCK')
+        return True
+
+    def run_action(self, action_call):
+        """Run a single action from the ticker's registry, tracing it and reporting on it if it was slow.
+
+        :param action_call: 
+        :return: 
+        """
+        action_call_name = action_call.__name__
+        tick = None
+        try:
+            with tracer.tick(action_call_name) as tick, tracer.span('hawthorne', action_call_name):
+                action_call()
+        finally:
+            if tick is not None:
+                self.report_tick(tick)
+
+    def report_tick(self, tick):
+        """Attribute a traced tick's time to subsystems, and dump a profile of it if it was slow.
+
+        :param tick: a tracing.Tick
+        :return: 
+        """
+        if not tracer.enabled:
+            return
+        self.debug(tick.summary())
+        if tick.duration < SLOW_TICK_SECONDS:
+            return
+        slowest_members = ', '.join(f'{span.name} {span.duration:.2f}s' for span in tick.slowest('member'))
+        self.log_local(f"Slow tick: {tick.summary()}. Slowest members: {slowest_members or 'n/a'}")
+        if tick.profile:
+            path = os.path.join(PROFILE_DIRECTORY, f"hawthorne-{tick.name}-{int(time.time())}.folded")
+            tick.profile.dump(path)
+            self.log_local(f"Slow tick profile written to {path}")
 
     # endregion
 
 
     # region LOGGERS
 
-    def announce(self, message):
+    def announce(self, message, blocks=None):
         """Announce a message to the default Slack channel as the bot user.
         
         :param message: 
+        :param blocks: Block Kit blocks to show instead of the message, which then serves as the notification text
         :return: 
         """
         now = datetime.datetime.now(datetime.timezone.utc)
         print(f"{now} SLACK: {message}")
-        return self.slack.slack_as_bot.chat_postMessage(channel=self.slack_channel_hawthorne, text=message).get('ts')
+        kwargs = {'blocks': blocks} if blocks else {}
+        return self.slack.slack_as_bot.chat_postMessage(
+            channel=self.slack_channel_hawthorne, text=message, **kwargs).get('ts')
+
+    def update_announcement(self, ts, message, blocks=None):
+        """Edit a message previously announced to the default Slack channel.
+
+        :param ts: the message's ts, as returned by announce()
+        :param message: 
+        :param blocks: 
+        :return: 
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        print(f"{now} SLACK UPDATE {ts}: {message}")
+        kwargs = {'blocks': blocks} if blocks else {}
+        return self.slack.slack_as_bot.chat_update(channel=self.slack_channel_hawthorne, ts=ts, text=message, **kwargs)
 
     def log(self, message):
         """Log something pertinent to the Slack log channel (and the console).
@@ -382,19 +623,26 @@ class Hawthorne:
     # region TICKER METHODS
 
     def back_off_if_needed(self):
-        """Check whether we have received backpressure from the API and wait a bit.
-        
-        :return: 
-        """
-        if self.back_pressure is None:
-            return
+        """Check whether we have received backpressure from the API, and whether we should still be backing off.
 
-        seconds = self.back_pressure
-        self.log(f':warning: Backpressure signal received. Backing off for {seconds} seconds.')
-        time.sleep(seconds)
-        self.log(':warning: Backoff ending.')
+        Rather than sleeping, which would hold up the bots for every other channel in the process (and the renewal of
+        their leases), the bot skips the actions that call the API until the back-off is over.
 
-        self.back_pressure = None
+        :return: True while backing off
+        """
+        now = time.monotonic()
+        if self.back_pressure is not None:
+            seconds = self.back_pressure
+            self.log(f':warning: Backpressure signal received. Backing off for {seconds} seconds.')
+            self.back_off_until = now + seconds
+            self.back_pressure = None
+        if self.back_off_until is None:
+            return False
+        if now < self.back_off_until:
+            return True
+        self.log(':warning: Backoff ending.')
+        self.back_off_until = None
+        return False
 
     def heartbeat(self):
         """Log something to the console every 5 minutes to keep the Heroku worker alive.
@@ -411,6 +659,83 @@ class Hawthorne:
         """
         pass
 
+    def export_metrics(self):
+        """Publish this process's Bungie.net API metrics to Redis in Prometheus text format, for the web dyno to serve.
+
+        :return: 
+        """
+        self.redis.set(METRICS_REDIS_KEY.format(instance=METRICS_INSTANCE), self.bungie.metrics.to_prometheus(),
+                       ex=METRICS_TTL)
+
+    def log_metrics_summary(self):
+        """Post a summary of the busiest Bungie.net API endpoints to the log channel.
+
+        :return: 
+        """
+        self.log(f":bar_chart: Bungie.net API usage since startup:\n```\n{self.bungie.metrics.summary()}\n```")
+        caches = {
+            'slack_seen_cache': self.slack_seen_cache,
+            'unable_to_find_users_squelch': self.unable_to_find_users_squelch,
+            'membership_cache': self.membership_cache,
+            'last_polled': self.last_polled,
+            'poll_state': self.poll_state,
+        }
+        lines = []
+        for name, cache in caches.items():
+            stats = cache.stats()
+            hit_rate = 'n/a' if stats['hit_rate'] is None else f"{stats['hit_rate']:.1%}"
+            lines.append(f"{name}: {stats['size']}/{stats['maxsize']} entries, {hit_rate} hits, "
+                         f"{stats['evictions']} evicted")
+        lines = '\n'.join(lines)
+        self.log(f":bar_chart: Cache usage since startup:\n```\n{lines}\n```")
+
+    def checkpoint_state(self):
+        """Save the per-user state built up by this bot to Redis, for a restarted bot to pick up with restore_state().
+
+        :return: 
+        """
+        # Squelches are saved with the (wall clock) time they expire, so they run out on time across restarts.
+        now = time.time()
+        state = {
+            'unable_to_find_users_squelch_until': {
+                slack_id: now + seconds_left
+                for slack_id, squelched, seconds_left in self.unable_to_find_users_squelch.items() if squelched
+            },
+        }
+        self.redis.set(f"{self.redis_prefix}worker_state", json.dumps(state), ex=WORKER_STATE_TTL)
+
+    def restore_state(self):
+        """Restore the per-user state last saved by checkpoint_state(), e.g. before a deploy.
+
+        :return: True if there was a checkpoint to restore
+        """
+        state = self.redis.get(f"{self.redis_prefix}worker_state")
+        if not state:
+            return False
+        state = json.loads(state)
+        # Checkpoints from before the seen users were kept in Redis listed them; move them there.
+        if state.get('slack_seen'):
+            self.redis.sadd(f"{self.redis_prefix}slack_seen", *state['slack_seen'])
+        now = time.time()
+        for slack_id, expires_at in state.get('unable_to_find_users_squelch_until', {}).items():
+            if expires_at > now:
+                self.unable_to_find_users_squelch.set(slack_id, True, ttl=expires_at - now)
+        return True
+
+    def reload_activity_filter(self):
+        """Recompile the activity filter from the default rules plus any in the environment and Redis.
+
+        :return: 
+        """
+        try:
+            self.activity_filter = ActivityFilter.from_json(
+                optional_environment_variable('HAWTHORNE_ACTIVITY_FILTER'),
+                self.redis.get(ACTIVITY_FILTER_REDIS_KEY),
+                base_rules=DEFAULT_ACTIVITY_RULES
+            )
+        except ValueError as e:
+            self.log(f":warning: Ignoring invalid activity filter rules, keeping the previous ones: `{e}`")
+
     def cache_bungie_manifests(self):
         """Cache relevant Bungie manifests.
 
@@ -418,12 +743,44 @@ class Hawthorne:
         """
         self.log(":information_source: Caching Bungie.net manifests...")
         self.bungie_manifest = self.bungie.get_d2_manifest()
-        self.bungie_manifest_activity_definitions = requests.get('https://www.bungie.net/{}'.format(
-            self.bungie_manifest['jsonWorldComponentContentPaths']['en']['DestinyActivityDefinition'])
-        ).json()
-        self.bungie_manifest_activity_mode_definitions = requests.get('https://www.bungie.net/{}'.format(
-            self.bungie_manifest['jsonWorldComponentContentPaths']['en']['DestinyActivityModeDefinition'])
-        ).json()
+        # Bots for other channels in this process share the (large) definitions, downloading them once per version;
+        # bots in other processes, or after a restart, restore them from the snapshot in Redis.
+        version = self.bungie_manifest.get('version')
+        definitions = MANIFEST_CACHE.get(version) or self.restore_manifest_snapshot(version)
+        if definitions is None:
+            activity_definitions = self.bungie.get_d2_manifest_component(
+                self.bungie_manifest, 'DestinyActivityDefinition')
+            mode_definitions = self.bungie.get_d2_manifest_component(
+                self.bungie_manifest, 'DestinyActivityModeDefinition')
+            definitions = (
+                project(activity_definitions, ACTIVITY_DEFINITION_FIELDS),
+                project(mode_definitions, ACTIVITY_MODE_DEFINITION_FIELDS),
+                self.activity_emoji_table(activity_definitions),
+            )
+            self.redis.set(MANIFEST_SNAPSHOT_KEY, json.dumps({'version': version, 'definitions': definitions}))
+        self.use_manifest_definitions(version, definitions)
+
+    def restore_manifest_snapshot(self, version=None):
+        """Restore the manifest definitions last downloaded by any bot from Redis, without calling Bungie.net.
+
+        :param version: the manifest version wanted, or None for whichever version was last downloaded
+        :return: the definitions, as cached in MANIFEST_CACHE; or None if there's no snapshot of the version
+        """
+        snapshot = self.redis.get(MANIFEST_SNAPSHOT_KEY)
+        if not snapshot:
+            return None
+        snapshot = json.loads(snapshot)
+        if version is not None and snapshot['version'] != version:
+            return None
+        definitions = tuple(snapshot['definitions'])
+        self.use_manifest_definitions(snapshot['version'], definitions)
+        return definitions
+
+    def use_manifest_definitions(self, version, definitions):
+        MANIFEST_CACHE.clear()
+        MANIFEST_CACHE[version] = definitions
+        (self.bungie_manifest_activity_definitions, self.bungie_manifest_activity_mode_definitions,
+         self.activity_emoji) = definitions
 
     def cache_player_activities(self):
         """Cache the current activity for each player in the channel so we don't spam on startup or future ticks.
@@ -434,6 +791,13 @@ class Hawthorne:
         self.report_player_activity(cache_only=True)
         self.log(':information_source: Caching complete')
 
+    def activity_state_is_primed(self):
+        """Whether the activity state in Redis is recent enough to report against without priming it first.
+
+        :return: 
+        """
+        return bool(self.redis.exists(f"{self.redis_prefix}primed"))
+
     def report_player_activity(self, cache_only=False):
         """Report on player activity.
 
@@ -441,20 +805,25 @@ class Hawthorne:
         """
         self.debug('report_player_activity()')
         players_activities = self.get_players_activities(is_cache_run=cache_only)
+        announcements = []
+        offline = []
+        offline_activities = []
+        playing = []
         for activity in players_activities:
             if isinstance(activity, self.SlackIsNotProperlySetUpException):
                 slack_id = activity.context['slack_user']['slack_id']
                 slack_display_name = activity.context['slack_user']['slack_display_name']
             else:
-                slack_id = activity['slack_member']['slack_id']
-                slack_display_name = activity['slack_member']['slack_display_name']
+                slack_id = activity.slack_id
+                slack_display_name = activity.slack_display_name
 
             if not cache_only:
                 # Send an appropriate message to users on first contact.
                 if isinstance(activity, self.SlackUserHasNoCharacters):
                     if not self.unable_to_find_users_squelch.get(slack_id):
                         self.log(f":warning: Unable to find characters for member: {slack_id} {slack_display_name}")
-                    self.unable_to_find_users_squelch[slack_id] = True
+                        # Only squelch once, so the warning is repeated when the squelch expires.
+                        self.unable_to_find_users_squelch.set(slack_id, True)
                     msg = (
                         "You have some gamer tags in your user profile, but I wasn't able to locate any characters"
                         " for your gamer tags, and your activity won't be shown until that's the case."
@@ -463,7 +832,7 @@ class Hawthorne:
                 elif isinstance(activity, self.SlackUserHasNoGamerTags):
                     if not self.unable_to_find_users_squelch.get(slack_id):
                         self.log(f":warning: Player is a member of channel, but has no gamer tags: {slack_id} {slack_display_name}")
-                    self.unable_to_find_users_squelch[slack_id] = True
+                        self.unable_to_find_users_squelch.set(slack_id, True)
                     msg = (
                         "You currently do not have any gamer tags in your user profile, and your activity won't be shown"
                         " until that's the case. Check out the instructions pinned in the sidebar."
@@ -479,97 +848,174 @@ class Hawthorne:
             if isinstance(activity, self.SlackIsNotProperlySetUpException):
                 continue
 
-            # Handle the case where there is no activity for any of the player's characters.
-            active_character = activity['active_character']
-            if active_character is None:
+            # Handle the case where the player isn't playing: offline (every character reports no activity), or
+            # has no characters at all.
+            active_character = activity.active_character
+            if active_character is None or not activity.activity_hash:
                 self.debug(f"{slack_id} {slack_display_name}: No activity.")
+                offline_activities.append(activity)
+                if not cache_only:
+                    offline.append(self.session_key_for(activity))
                 continue
 
-            new_activity_hash = activity['activity_context']['currentActivityHash']
-            new_activity_mode_hash = activity['activity_context']['currentActivityModeHash']
-            new_activity_ts = activity['activity_context']['epochActivityStarted']
+            new_activity_hash = activity.activity_hash
+            new_activity_ts = activity.started
 
             # We use Redis to cache past activities to ensure we aren't too noisy. Redis needs some keys.
-            membership_type = activity['destiny_membership_type']
-            membership_id = activity['destiny_membership_id']
+            membership_type = activity.membership_type
+            membership_id = activity.membership_id
             #membership_activities_list_key = f"activities!{membership_type}!{membership_id}"
-            activity_instance_key = f"activity!{membership_type}!{membership_id}!{active_character}!{new_activity_hash}!{new_activity_ts}"
-            membership_latest_activity_key = f"latest_activity!{membership_type}!{membership_id}"
-
-            # Skip activities that have already been seen and, for some reason, are being seen again
-            if self.redis.exists(activity_instance_key):
-                self.debug(f"{slack_id} {slack_display_name}: SEEN: {activity_instance_key}")
-                continue
-            # Skip activities that are older than the most recently seen activity.
-            membership_latest_activity = self.redis.get(f"{membership_latest_activity_key}!ts")
-            if membership_latest_activity and new_activity_ts < float(membership_latest_activity):
-                self.debug(f"{slack_id} {slack_display_name}: Activity older than most recent: {activity_instance_key}")
-                continue
+            activity_instance_key = f"{self.redis_prefix}activity!{membership_type}!{membership_id}!{active_character}!{new_activity_hash}!{new_activity_ts}"
+            membership_latest_activity_key = f"{self.redis_prefix}latest_activity!{membership_type}!{membership_id}"
 
             #day = str(datetime.datetime.utcfromtimestamp(new_activity_ts).isoformat()[0:11])
             #activity_day_bucket = f"activity-bucket!{day}"
             #activity_day_membership_bucket = f"activity-bucket!{day}!{membership_type}!{membership_id}"
 
-            # Update the cache.
-            old_activity_hash = self.redis.get(f"{membership_latest_activity_key}!activity")
-            old_activity_char = self.redis.get(f"{membership_latest_activity_key}!active_character")
-            self.redis.set(f"{membership_latest_activity_key}!ts", new_activity_ts)
-            self.redis.set(f"{membership_latest_activity_key}!activity", new_activity_hash)
-            self.redis.set(f"{membership_latest_activity_key}!active_character", active_character)
-            self.redis.set(f"{membership_latest_activity_key}!activity_json", json.dumps(activity))
+            if not cache_only and not activity.blacklisted:
+                playing.append(self.session_key_for(activity))
+
+            # Claim the activity and update the cache, skipping activities that have already been seen (by us, or by
+            # another worker) or that are older than the most recently seen activity.
+            claim = self.claim_activity(activity_instance_key, membership_latest_activity_key, activity)
+            if claim is None:
+                self.debug(f"{slack_id} {slack_display_name}: SEEN or older than most recent: {activity_instance_key}")
+                continue
+            old_activity_hash, old_activity_char = claim
             #self.redis.lpush(membership_activities_list_key, activity_instance_key, ex=datetime.timedelta(days=30))
-            self.redis.set(activity_instance_key, 1, ex=datetime.timedelta(days=30))
 
             # Finally, announce the activity (if we need to).
             if not cache_only:
-                # Skip reporting activities that we aren't interested in.
-                if self._activity_is_blacklisted(new_activity_hash, new_activity_mode_hash):
+                # Skip reporting activities that we aren't interested in, e.g. orbit, which also ends a session.
+                if activity.blacklisted:
                     self.debug(f"SKIP reporting uninteresting activity: {activity_instance_key}")
+                    offline.append(self.session_key_for(activity))
                     continue
 
                 # Skip reporting duplicate activities that don't need to be reported.
-                for blacklist_activity_hash in ACTIVITY_DUPE_BLACKLIST:
-                    if (new_activity_hash == blacklist_activity_hash and
-                            new_activity_hash == old_activity_hash and
-                            active_character == old_activity_char
-                        ):
-                        self.debug(f"SKIP reporting duplicate activity: {activity_instance_key}")
-                        continue
-
-                # Announce the activity.
-                msg = self.activity_message_for(activity)
-                self.announce(msg)
-                membership_key = f"{activity['destiny_membership_type']}-{activity['destiny_membership_id']}"
+                if (self.activity_filter.suppresses_repeats(new_activity_hash) and
+                        new_activity_hash == old_activity_hash and
+                        active_character == old_activity_char):
+                    self.debug(f"SKIP reporting duplicate activity: {activity_instance_key}")
+                    continue
+
+                # Queue the activity to be announced along with any others started alongside it.
+                announcements.append(activity)
+                membership_key = f"{membership_type}-{membership_id}"
                 self.log_local(f":information_source: {membership_key}: {new_activity_hash}")
 
+        if announcements:
+            self.announce_activities(announcements)
+        if offline_activities:
+            self.record_offline(offline_activities)
+        if offline:
+            self.end_sessions(offline)
+        if playing:
+            # Keep the sessions of players still playing live, so their next activity is added to the same message.
+            pipeline = self.redis.pipeline()
+            for key in playing:
+                pipeline.set(f"{key}!live", 1, ex=SESSION_IDLE_TIMEOUT)
+            pipeline.execute()
+        self.redis.set(f"{self.redis_prefix}primed", 1, ex=PRIMED_TTL)
+        self.suppress_first_seen = False
+
+    def announce_activities(self, activities):
+        """Announce newly started activities, with one message per fireteam (or group of players starting together).
+
+        A group that is still together from its last activity has its existing message edited, rather than a new
+        message posted, so that each play session has a single message. That's only while the session is live: while
+        each of its players has been seen playing within the last SESSION_IDLE_TIMEOUT seconds.
+
+        :param activities: 
+        :return: 
+        """
+        for group in self.group_activities(activities):
+            session_keys = [self.session_key_for(activity) for activity in group]
+            values = self.redis.mget(session_keys + [f"{key}!live" for key in session_keys])
+            sessions_ts, live = values[:len(session_keys)], values[len(session_keys):]
+            session = None
+            if sessions_ts[0] and len(set(sessions_ts)) == 1 and all(live):
+                session = self.load_session(sessions_ts[0])
+                if session and set(session['players']) != set(session_keys):
+                    session = None
+
+            activity_label = self.activity_label_for(group[0])
+            if session is None:
+                self.leave_sessions(session_keys, sessions_ts)
+                session = {
+                    'ts': None,
+                    'players': session_keys,
+                    'active': session_keys,
+                    'labels': {key: self.player_label_for(activity) for key, activity in zip(session_keys, group)},
+                    'activities': [activity_label],
+                    'started': group[0].started,
+                }
+                text, blocks = self.session_message_for(session, group)
+                session['ts'] = self.announce(text, blocks=blocks)
+            else:
+                session['activities'].append(activity_label)
+                text, blocks = self.session_message_for(session, group)
+                self.update_announcement(session['ts'], text, blocks)
+            self.save_session(session)
+
+    def record_offline(self, activities):
+        """Record players' offline activities as their latest, in place of the activities they were last seen playing.
+
+        That way /hawthorne list no longer shows them playing, and their next activity isn't taken for a back-to-back
+        repeat of the one they played before going offline. The latest activity's start time is left alone, so older
+        activities are still ignored.
+
+        :param activities: the players' offline ActivityRecords
+        :return: 
+        """
+        pipeline = self.redis.pipeline()
+        for activity in activities:
+            membership_latest_activity_key = (
+                f"{self.redis_prefix}latest_activity!{activity.membership_type}!{activity.membership_id}")
+            pipeline.set(f"{membership_latest_activity_key}!activity", 0)
+            pipeline.delete(f"{membership_latest_activity_key}!active_character")
+            pipeline.set(f"{membership_latest_activity_key}!activity_json", activity.to_json())
+        pipeline.execute()
+
+    def end_sessions(self, session_keys):
+        """Note that players have stopped playing, and finish their sessions' messages once all their players have.
+
+        :param session_keys: as returned by session_key_for()
+        :return: 
+        """
+        sessions_ts = self.redis.mget(session_keys)
+        if not any(sessions_ts):
+            return
+        self.leave_sessions(session_keys, sessions_ts)
+        ended = [key for key, ts in zip(session_keys, sessions_ts) if ts]
+        self.redis.delete(*ended, *[f"{key}!live" for key in ended])
+
     def slash_list(self):
         """List current player activities by request.
         
         :return: 
         """
-        if not self.redis.llen('slash.list'):
+        # Each channel has its own queue, so the roster listed (and the workspace replied in) is the requester's.
+        queue = f'slash.list!{self.slack_channel_hawthorne}'
+        if not self.handles_slash_commands or not self.redis.llen(queue):
             return False
 
-        queued_cmd = self.redis.rpop('slash.list')
+        queued_cmd = self.redis.rpop(queue)
         channel_id, user_id = queued_cmd.split(',')
 
         self.log(f":information_source: Listing player activities on behalf of {user_id} in {channel_id}...")
         messages = []
         players_activities = self.get_players_activities(is_cache_run=True, fetch_from_cache=True)
+        # Skip players without a cached activity, e.g. because they have no gamertags or haven't been polled yet.
         players_activities = sorted(
-            players_activities,
-            key=lambda x: float(x.get("activity_context", {}).get("epochActivityStarted", 0)) if isinstance(x, dict) else 0
+            [activity for activity in players_activities if isinstance(activity, ActivityRecord)],
+            key=lambda activity: float(activity.started)
         )
         for activity in players_activities:
-            try:
-                if activity['active_character'] is None:
-                    continue
-            except Exception as e:
-                exc = traceback.format_exc()
-                ts = self.log(f":warning: Exception occurred in slash_list(): `{e}`")
-                self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+            if activity.active_character is None or not activity.activity_hash:
                 continue
-            if self._activity_is_blacklisted(activity['activity'], activity['activity_mode']):
+            # Cached activities may predate the current rules, so filter them afresh.
+            if self.activity_filter.is_blacklisted(activity.activity_hash, activity.activity_mode_hash):
                 continue
             messages.append(self.activity_message_for(activity, include_start=True))
         messages = '\n'.join(messages)
@@ -607,11 +1053,57 @@ class Hawthorne:
 
     # region HELPER METHODS
 
-    @staticmethod
-    def _activity_is_blacklisted(new_activity_hash, new_activity_mode_hash):
-        for blacklist_activity_hash, blacklist_activity_mode_hash in ACTIVITY_BLACKLIST:
-            if new_activity_hash == blacklist_activity_hash and new_activity_mode_hash == blacklist_activity_mode_hash:
-                return True
+    # Claim an activity instance and record it as the player's latest activity, atomically.
+    # KEYS: the instance key, then the latest activity's ts, activity, active_character and activity_json keys.
+    # ARGV: the activity's start epoch, activity hash, active character, JSON and the instance key's TTL in seconds.
+    # Returns {claimed, previous activity hash, previous active character}.
+    CLAIM_ACTIVITY_SCRIPT = """
+        if redis.call('exists', KEYS[1]) == 1 then
+            return {0, '', ''}
+        end
+        local latest_ts = redis.call('get', KEYS[2])
+        if latest_ts and tonumber(ARGV[1]) < tonumber(latest_ts) then
+            return {0, '', ''}
+        end
+        local old_activity = redis.call('get', KEYS[3]) or ''
+        local old_character = redis.call('get', KEYS[4]) or ''
+        redis.call('set', KEYS[1], 1, 'EX', ARGV[5])
+        redis.call('set', KEYS[2], ARGV[1])
+        redis.call('set', KEYS[3], ARGV[2])
+        redis.call('set', KEYS[4], ARGV[3])
+        redis.call('set', KEYS[5], ARGV[4])
+        return {1, old_activity, old_character}
+    """
+
+    def claim_activity(self, activity_instance_key, membership_latest_activity_key, activity):
+        """Atomically claim a newly seen activity, so that it's only announced once however many bots are polling.
+
+        :param activity_instance_key: 
+        :param membership_latest_activity_key: 
+        :param activity: 
+        :return: the player's previous activity hash and active character; or None if the activity has already been
+            seen or is older than the player's latest activity
+        """
+        with tracer.span('redis', 'claim_activity'):
+            claimed, old_activity_hash, old_activity_char = self.claim_activity_script(
+                keys=[
+                    activity_instance_key,
+                    f"{membership_latest_activity_key}!ts",
+                    f"{membership_latest_activity_key}!activity",
+                    f"{membership_latest_activity_key}!active_character",
+                    f"{membership_latest_activity_key}!activity_json",
+                ],
+                args=[
+                    activity.started,
+                    activity.activity_hash,
+                    activity.active_character,
+                    activity.to_json(),
+                    int(datetime.timedelta(days=30).total_seconds()),
+                ]
+            )
+        if not claimed:
+            return None
+        return int(old_activity_hash) if old_activity_hash else None, old_activity_char or None
 
     def first_seen(self, slack_id, slack_name, msg):
         """Onboard a user when they first join the channel.
@@ -621,7 +1113,7 @@ class Hawthorne:
         :param msg: 
         :return: 
         """
-        if not self.slack_seen_cache.get(slack_id):
+        if not self.has_seen(slack_id):
             slack_channel = self.slack_channel_hawthorne
             message = f":hawthorne: :wave: Welcome to <#{slack_channel}>, <@{slack_id}>! {msg}"
             self.log(f":wave: First seen: {slack_id} {slack_name}")
@@ -636,7 +1128,30 @@ class Hawthorne:
                 exc = traceback.format_exc()
                 ts = self.log(f":warning: Exception occurred in first_seen(): `{e}`")
                 self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
-            self.slack_seen_cache[slack_id] = True
+            self.mark_seen(slack_id)
+
+    def has_seen(self, slack_id):
+        """Whether a user has been seen in the channel (and welcomed) by this or any earlier run of the bot.
+
+        :param slack_id:
+        :return: bool
+        """
+        if self.slack_seen_cache.get(slack_id):
+            return True
+        seen = self.redis.sismember(f"{self.redis_prefix}slack_seen", slack_id)
+        if seen:
+            self.slack_seen_cache.set(slack_id, True)
+        return bool(seen)
+
+    def mark_seen(self, slack_id):
+        """Remember that a user has been seen in the channel, so that they are only welcomed once.
+
+        :param slack_id:
+        :return:
+        """
+        if not self.slack_seen_cache.get(slack_id):
+            self.redis.sadd(f"{self.redis_prefix}slack_seen", slack_id)
+            self.slack_seen_cache.set(slack_id, True)
 
     def get_players_activities(self, is_cache_run=False, fetch_from_cache=False):
         """Get a list of players (dicts) of a channel and their most recent activity.
@@ -649,49 +1164,220 @@ class Hawthorne:
         if self.slack_channel_for_staging_with_real_users:
             slack_channel = self.slack_channel_for_staging_with_real_users
         channel_members = self.fetch_slack_channel_members(slack_channel)
+        # Players whose poll can be put off this tick, because a fireteam-mate's poll showed them still playing.
+        deferred = set()
+        # Players in the fireteam of someone polled this tick (and not yet polled or deferred themselves), who are polled
+        # even once the budget is spent, so that a fireteam's new activity is announced together rather than over
+        # several ticks.
+        fireteam_mates = set()
+        polled = set()
+        # Priming and /list cover everyone; report ticks poll the players most likely to have changed first.
+        budget = None
+        if not (is_cache_run or fetch_from_cache):
+            channel_members = self.poll_order(channel_members)
+            budget = POLL_BUDGET or None
 
         for member in channel_members:
             slack_id = member['slack_id']
             slack_name = member['slack_display_name']
-            if is_cache_run:
-                self.slack_seen_cache[slack_id] = True
-            try:
-                activity = self.get_activity_for_slack_user(member, fetch_from_cache=fetch_from_cache)
-                players_activities.append(activity)
-                self.unable_to_find_users_squelch[slack_id] = False
-            except self.SlackUserHasNoGamerTags as e:
-                players_activities.append(e)
-            except self.SlackUserHasNoCharacters as e:
-                players_activities.append(e)
+            over_budget = budget is not None and budget <= 0
+            if over_budget and not fireteam_mates:
+                self.debug("Poll budget spent; leaving the remaining members for the next tick.")
+                break
+            if over_budget and not self.is_fireteam_mate(member, fireteam_mates):
+                continue
+            if is_cache_run or self.suppress_first_seen:
+                self.mark_seen(slack_id)
+            with tracer.span('member', slack_id):
+                try:
+                    if deferred and not is_cache_run:
+                        membership_id = str(self.get_membership_for_slack_user(member)[2])
+                        if membership_id in deferred:
+                            self.debug(f"{slack_id} {slack_name}: Poll deferred, their fireteam is unchanged.")
+                            continue
+                    if budget is not None:
+                        budget -= 1
+                    activity = self.get_activity_for_slack_user(member, fetch_from_cache=fetch_from_cache)
+                    players_activities.append(activity)
+                    self.unable_to_find_users_squelch.invalidate(slack_id)
+                    if not fetch_from_cache:
+                        deferred |= self.fireteam_mates_to_defer(activity)
+                        polled.add(str(activity.membership_id))
+                        fireteam_mates = (fireteam_mates | set(activity.party)) - deferred - polled
+                        self.record_poll(slack_id, activity)
+                except self.SlackUserHasNoGamerTags as e:
+                    players_activities.append(e)
+                    self.record_poll(slack_id, None)
+                except self.SlackUserHasNoCharacters as e:
+                    players_activities.append(e)
+                    self.record_poll(slack_id, None)
 
         return players_activities
 
+    def poll_order(self, channel_members):
+        """Order members by how likely their activity is to have changed since they were last polled.
+
+        Members fall into tiers: those never polled, or who started their activity within RECENTLY_ACTIVE_WINDOW
+        seconds, first; then those mid-way through a longer activity; then idle players (and those who can't be
+        polled). Members also age by the time since they were last polled: every POLL_PRIORITY_AGING seconds of
+        waiting moves a member up one tier, so a budgeted tick never starves anyone.
+
+        :param channel_members: as returned by fetch_slack_channel_members()
+        :return: a generator of the members, most likely to have changed first
+        """
+        now = time.time()
+        queue = []
+        for seq, member in enumerate(channel_members):
+            state = self.poll_state.get(member['slack_id'])
+            if state is None:
+                tier, waited = 0, POLL_STATE_TTL
+            else:
+                if state['active'] and now - state['started'] <= RECENTLY_ACTIVE_WINDOW:
+                    tier = 0
+                elif state['active']:
+                    tier = 1
+                else:
+                    tier = 2
+                waited = now - state['polled_at']
+            queue.append((tier * POLL_PRIORITY_AGING - waited, seq, member))
+        heapq.heapify(queue)
+        while queue:
+            yield heapq.heappop(queue)[2]
+
+    def record_poll(self, slack_id, activity):
+        """Remember when a member was polled and when they started their current activity, for poll_order().
+
+        :param slack_id: 
+        :param activity: the ActivityRecord polled, or None if the member couldn't be polled
+        :return: 
+        """
+        # Offline players are reported in activity 0, and those in orbit in a blacklisted one: both count as idle.
+        active = (activity is not None and activity.active_character is not None and bool(activity.activity_hash) and
+                  not activity.blacklisted)
+        self.poll_state.set(slack_id, {
+            'polled_at': time.time(),
+            'active': active,
+            'started': activity.started if active else 0,
+        })
+
+    def is_fireteam_mate(self, member, membership_ids):
+        """Whether a member's membership is one of a fireteam's.
+
+        :param member: as returned by fetch_slack_channel_members()
+        :param membership_ids: a set of membership ids (as strs)
+        :return: bool
+        """
+        try:
+            return str(self.get_membership_for_slack_user(member)[2]) in membership_ids
+        except self.SlackIsNotProperlySetUpException:
+            return False
+
+    def fireteam_mates_to_defer(self, activity):
+        """Work out whose polls a player's poll makes redundant, and remember it for the next tick.
+
+        If a player is still in the same activity as when last polled, so are the fireteam-mates listed in their
+        profile's transitory data that were in that activity too when last polled; their polls can be put off for up
+        to FIRETEAM_DEFER_MAX seconds since each was last polled. Their activity isn't inferred from the player's,
+        since each member's character, class and start time differ.
+
+        :param activity: the ActivityRecord just polled
+        :return: a set of membership ids (as strs) not to poll this tick
+        """
+        membership_id = str(activity.membership_id)
+        previous = self.last_polled.get(membership_id)
+        self.last_polled.set(membership_id, activity)
+        if (previous is None or activity.active_character is None or
+                (previous.activity_hash, previous.started) != (activity.activity_hash, activity.started)):
+            return set()
+        mates = set()
+        for mate_id in activity.party:
+            if mate_id == membership_id:
+                continue
+            mate = self.last_polled.get(mate_id)
+            if mate is not None and mate.activity_hash == activity.activity_hash and membership_id in mate.party:
+                mates.add(mate_id)
+        return mates
+
     def get_membership_for_slack_user(self, slack_user):
         """Get a Bungie.net membership for a given Slack user. 
+
+        Every gamertag in the user's profile is searched for concurrently, and the results are merged through their
+        cross-save linked profiles. The answer is cached per set of gamertags for MEMBERSHIP_CACHE_TTL seconds, both
+        locally and in Redis.
         
         :param slack_user: 
-        :return: 
+        :return: a three-tuple of player name, membership type and membership id
         """
         self.debug(f'get_membership_for_slack_user({slack_user=})')
-        # Ask for the user by gamertag and fetch their Bungie.net profile.
-        if 'destiny_psn_id' in slack_user and slack_user['destiny_psn_id']:
-            player = self.bungie.search_d2_player(membership_type=MEMBERSHIP_TYPE_PSN,
-                                                  display_name=slack_user['destiny_psn_id'])
-        elif 'destiny_stm_id' in slack_user and slack_user['destiny_stm_id']:
-            player = self.bungie.search_d2_player(membership_type=MEMBERSHIP_TYPE_STEAM,
-                                                  display_name=slack_user['destiny_stm_id'])
-        elif 'destiny_xbl_id' in slack_user and slack_user['destiny_xbl_id']:
-            player = self.bungie.search_d2_player(membership_type=MEMBERSHIP_TYPE_XBOX,
-                                                  display_name=slack_user['destiny_xbl_id'])
-        else:
+        gamertags = tuple(
+            (membership_type, slack_user[field]) for field, membership_type in GAMERTAG_FIELDS if slack_user.get(field)
+        )
+        if not gamertags:
             raise self.SlackUserHasNoGamerTags(context={'slack_user': slack_user})
-        if len(player) == 0:
+
+        membership = self.membership_cache.get(gamertags)
+        if membership is None:
+            # Share lookups with the bots for other channels (and other worker processes) through Redis.
+            membership_key = f"membership!{json.dumps(gamertags)}"
+            cached_membership = self.redis.get(membership_key)
+            if cached_membership is not None:
+                membership = tuple(json.loads(cached_membership))
+            # Entries written before only the resolved membership was kept also held the search results; resolve again.
+            if membership is None or len(membership) not in (0, 3):
+                membership = self._resolve_membership_for_gamertags(gamertags)
+                self.redis.set(membership_key, json.dumps(membership), ex=MEMBERSHIP_CACHE_TTL)
+            self.membership_cache.set(gamertags, membership)
+        if not membership:
             raise self.SlackUserHasNoCharacters(context={'slack_user': slack_user})
-        player_name = player[0]['displayName']
-        membership_type = player[0]['membershipType']
-        membership_id = player[0]['membershipId']
+        return membership
+
+    def _resolve_membership_for_gamertags(self, gamertags):
+        """Search for each of a player's gamertags concurrently and pick the membership to poll.
+
+        :param gamertags: a tuple of (membership type, gamertag) two-tuples, in order of preference
+        :return: a three-tuple of player name, membership type and membership id; or () if nothing was found
+        """
+        with ThreadPoolExecutor(max_workers=len(gamertags)) as executor:
+            searches = list(executor.map(
+                tracer.bind(
+                    lambda gamertag: self.bungie.search_d2_player(membership_type=gamertag[0], display_name=gamertag[1])
+                ),
+                gamertags
+            ))
+        players = [player for player in searches if len(player) > 0]
+        if not players:
+            return ()
+
+        # Map each platform's membership onto its canonical cross-save membership, keeping the first (most preferred)
+        # player found for each distinct primary.
+        primaries = self.bungie.get_primary_memberships(
+            [[(player[0]['membershipType'], player[0]['membershipId'])] for player in players]
+        )
+        candidates = {}
+        for player, (primary_membership_type, primary_membership_id) in zip(players, primaries):
+            if not primary_membership_id:
+                primary_membership_type = player[0]['membershipType']
+                primary_membership_id = player[0]['membershipId']
+            candidates.setdefault((primary_membership_type, primary_membership_id), player)
+
+        # Gamertags on separate, unlinked accounts: poll whichever account was played most recently.
+        if len(candidates) > 1:
+            with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+                last_played = dict(zip(candidates, executor.map(
+                    tracer.bind(lambda membership: self.bungie.get_d2_profile_cached(
+                        membership[1], membership[0], ['100'], fields=BungieApi.LAST_PLAYED_FIELDS)),
+                    candidates
+                )))
+            most_recent = max(
+                candidates,
+                key=lambda membership: parse_bungie_timestamp(last_played[membership]['profile']['data']['dateLastPlayed'])
+            )
+        else:
+            most_recent = next(iter(candidates))
 
-        return player, player_name, membership_type, membership_id
+        player = candidates[most_recent]
+        membership_type, membership_id = most_recent
+        return player[0]['displayName'], membership_type, membership_id
 
     def get_activity_for_slack_user(self, slack_user, fetch_from_cache=False):
         """Get the latest activity for a Slack user based on their user profile gamertags.
@@ -701,18 +1387,17 @@ class Hawthorne:
         :return: 
         """
         self.debug(f'get_activity_for_slack_user({slack_user=}')
-        player, player_name, membership_type, membership_id = self.get_membership_for_slack_user(slack_user)
+        player_name, membership_type, membership_id = self.get_membership_for_slack_user(slack_user)
 
         if fetch_from_cache:
-            membership_latest_activity_key = f"latest_activity!{membership_type}!{membership_id}!activity_json"
-            latest_activity = self.redis.get(membership_latest_activity_key)
+            membership_latest_activity_key = f"{self.redis_prefix}latest_activity!{membership_type}!{membership_id}!activity_json"
             try:
-                latest_activity = json.loads(str(latest_activity))
+                return ActivityRecord.from_json(self.redis.get(membership_latest_activity_key))
             except Exception as e:
                 exc = traceback.format_exc()
                 ts = self.log(f":warning: Exception occurred in get_activity_for_slack_user(): `{e}`")
                 self.log_thread(ts, f"Exception:\n```\n{exc}\n```")
-            return latest_activity
+                return None
 
         # Get the "current" activity for the player and hydrate that with additional context.
         character_activities = self.bungie.get_current_activity(membership_type, membership_id)
@@ -727,174 +1412,397 @@ class Hawthorne:
             tmp_char_activity_key = f'activity.{character_key}.{tmp_activity_hash}.{tmp_activity_mode_hash}'
             if not most_recent_activity or tmp_activity_epoch > most_recent_activity['epochActivityStarted']:
                 most_recent_activity = character_activities['characterActivities'][character_id]
+        if most_recent_activity is None:
+            # The player has no characters (left to report on).
+            most_recent_activity = {
+                'currentActivityHash': 0, 'currentActivityModeHash': 0, 'characterId': None, 'epochActivityStarted': 0
+            }
 
         activity = most_recent_activity['currentActivityHash']
         activity_mode = most_recent_activity['currentActivityModeHash']
         active_character = most_recent_activity['characterId']
 
-        most_recent_activity_blacklisted = False
-        for blacklist_activity_hash, blacklist_activity_mode_hash in ACTIVITY_BLACKLIST:
-            if (activity == blacklist_activity_hash and
-                activity_mode == blacklist_activity_mode_hash):
-                most_recent_activity_blacklisted = True
+        most_recent_activity_blacklisted = self.activity_filter.is_blacklisted(activity, activity_mode)
 
         activity_name = None
-        character = None
-        character_class = None
+        character_class_hash = None
         if active_character is not None and not most_recent_activity_blacklisted:
-            activity_name = ""
-            activity = self.bungie_manifest_activity_definitions[str(activity)]
-            if not activity["displayProperties"].get("name"):
-                activity_str = pp.pformat(activity)
-                character_str = pp.pformat(character_activities['characterActivities'])
-                self.log_local(f"Error in activity data, missing 'name': {activity_str}\n{character_str}")
-            activity_name += activity["displayProperties"].get("name", "Unknown")
-            try:
-                activity_mode = self.bungie_manifest_activity_mode_definitions[str(activity_mode)]
-                if not activity_mode["displayProperties"].get("name"):
-                    activity_str = pp.pformat(activity_mode)
-                    self.log_local(f"Error in activity mode data, missing 'name': {activity_str}")
-                activity_name = "{} - {}".format(activity_mode["displayProperties"]["name"], activity_name)
-            except:
-                pass
-            if activity["activityLightLevel"] > 0:
-                activity_name = "{} (PL{})".format(activity_name, activity["activityLightLevel"])
+            with tracer.span('manifest', str(activity)):
+                activity_name = ""
+                activity = self.bungie_manifest_activity_definitions[str(activity)]
+                if not activity["displayProperties"].get("name"):
+                    activity_str = pp.pformat(activity)
+                    character_str = pp.pformat(character_activities['characterActivities'])
+                    self.log_local(f"Error in activity data, missing 'name': {activity_str}\n{character_str}")
+                activity_name += activity["displayProperties"].get("name", "Unknown")
+                try:
+                    activity_mode = self.bungie_manifest_activity_mode_definitions[str(activity_mode)]
+                    if not activity_mode["displayProperties"].get("name"):
+                        activity_str = pp.pformat(activity_mode)
+                        self.log_local(f"Error in activity mode data, missing 'name': {activity_str}")
+                    activity_name = "{} - {}".format(activity_mode["displayProperties"]["name"], activity_name)
+                except:
+                    pass
+                if activity.get("activityLightLevel", 0) > 0:
+                    activity_name = "{} (PL{})".format(activity_name, activity["activityLightLevel"])
             character = self.bungie.get_d2_character(membership_type, membership_id, active_character, ['200'])
-            character_class = character.get('character', {}).get('data', {}).get('classHash', 0)
-            character_class = CLASSES.get(str(character_class))
-
-
-        return_activity = {
-            'slack_member': slack_user,
-            'destiny_player': player,
-            'destiny_player_name': player_name,
-            'destiny_membership_type': membership_type,
-            'destiny_membership_id': membership_id,
-            'destiny_character': character,
-            'destiny_character_class': character_class,
-            'activity': activity,
-            'activity_mode': activity_mode,
-            'active_character': active_character,
-            'activity_name': activity_name,
-            'transitory_data': character_activities.get('transitoryData'),
-            'activity_context': most_recent_activity
-        }
-        return return_activity
+            character_class_hash = str(character.get('character', {}).get('data', {}).get('classHash', 0))
+
+        party = [
+            str(member.get('membershipId'))
+            for member in (character_activities.get('transitoryData') or {}).get('partyMembers', [])
+        ]
+        return ActivityRecord(
+            slack_id=slack_user['slack_id'],
+            slack_display_name=slack_user['slack_display_name'],
+            destiny_player_name=player_name,
+            membership_type=membership_type,
+            membership_id=membership_id,
+            active_character=active_character,
+            character_class_hash=character_class_hash,
+            activity_hash=most_recent_activity['currentActivityHash'],
+            activity_mode_hash=most_recent_activity['currentActivityModeHash'],
+            started=most_recent_activity['epochActivityStarted'],
+            activity_name=activity_name,
+            blacklisted=most_recent_activity_blacklisted,
+            party=party,
+        )
 
     @staticmethod
-    def activity_emoji_for(activity_name):
-        """Return an emoji for a particular activity name.
-        
-        :param activity_name: 
-        :return: 
-        """
-        emoji = ""
-        if activity_name.startswith('Explore - '):
-            emoji = ':fireteam:'
-        elif activity_name.startswith('Control - '):
-            emoji = ':crucible:'
-        elif activity_name.startswith('Garden of Salvation'):
-            emoji = ':raid2:'
-        elif activity_name.startswith('Team Scorched - '):
-            emoji = ':crucible:'
-        elif activity_name.startswith('Scored Nightfall Strikes - '):
-            emoji = ':nightfall:'
-        elif activity_name.startswith('Normal Strikes - '):
-            emoji = ':vanguard2:'
-        elif activity_name.startswith('Clash - '):
-            emoji = ':crucible:'
-        elif activity_name.startswith('Gambit '):
-            emoji = ':gambit:'
-        elif activity_name.startswith('Dungeon - '):
-            emoji = ':dungeon:'
-        elif activity_name.startswith('Story - The Shattered Throne'):
-            emoji = ':dungeon:'
-        elif activity_name.startswith('Crucible'):
-            emoji = ':crucible:'
-        elif activity_name.startswith('Rumble'):
-            emoji = ':crucible:'
-        elif activity_name.startswith('Story -'):
-            emoji = ':fireteam:'
-        return emoji
+    def activity_emoji_table(activity_definitions):
+        """Categorize every activity in the manifest by its mode types, so rendering a message is a single lookup.
+
+        :param activity_definitions: the DestinyActivityDefinition manifest component
+        :return: a dict of activity hash (as a str) to emoji, for activities that have one
+        """
+        table = {}
+        for activity_hash, definition in activity_definitions.items():
+            mode_types = set(definition.get('activityModeTypes') or [])
+            if definition.get('directActivityModeType') is not None:
+                mode_types.add(definition['directActivityModeType'])
+            for emoji_mode_types, emoji in ACTIVITY_MODE_TYPE_EMOJI:
+                if mode_types & emoji_mode_types:
+                    table[str(activity_hash)] = emoji
+                    break
+        return table
 
     def fetch_slack_channel_members(self, slack_channel_id):
         """Fetch all the Slack members for a channel and their various Destiny usernames.
 
+        Members are read from the channel's roster in Redis, which the web app's Slack events endpoint keeps up to
+        date; the Slack API is only called for members whose profile we haven't seen yet, or for a full fetch when
+        the roster hasn't been synced recently.
+
         :param slack_channel_id: 
         :return: 
         """
         self.debug(f'fetch_slack_channel_members({slack_channel_id=})')
+        roster = Roster(self.redis, slack_channel_id)
+        synced = roster.is_synced()
+        if synced:
+            member_ids = roster.member_ids()
+            records = roster.records(member_ids)
+        else:
+            member_ids = self.slack.slack_as_user.channels_info(channel=slack_channel_id).data['channel'].get(
+                'members')
+            records = {}
+
+        for member_id in member_ids:
+            if member_id in records:
+                continue
+            try:
+                member = self.slack.slack_as_user.users_profile_get(user=member_id)
+            except TimeoutError as e:
+                self.log(f":warning: asyncio timeout when fetching Slack user profile for: <@{member_id}>`")
+                continue
+            records[member_id] = member_record(member_id, member.data.get('profile', {}))
+            if synced:
+                roster.update_record(records[member_id])
+        if not synced:
+            roster.replace(member_ids, list(records.values()))
+
         channel_members = []
-        raw_members = self.slack.slack_as_user.channels_info(channel=slack_channel_id).data['channel'].get(
-            'members')
-        for member_id in raw_members:
-            mute_timestamp_expiration = self.redis.get(f'mute.{member_id}')
+        mutes = self.redis.mget([f'mute.{member_id}' for member_id in member_ids]) if member_ids else []
+        now = datetime.datetime.now().timestamp()
+        for member_id, mute_timestamp_expiration in zip(member_ids, mutes):
             if mute_timestamp_expiration:
-                mute_timestamp_expiration = float(mute_timestamp_expiration)
-                now = datetime.datetime.now().timestamp()
-                if now > mute_timestamp_expiration:
+                if now > float(mute_timestamp_expiration):
                     self.redis.delete(f'mute.{member_id}')
                 else:
                     continue
-            try:
-                member = self.slack.slack_as_user.users_profile_get(user=member_id)
-            except TimeoutError as e:
-                self.log(f":warning: asyncio timeout when fetching Slack user profile for: <@{member_id}>`")
-            if 'bot_id' in member['profile']:
+            record = records.get(member_id)
+            if record is None or record['is_bot']:
                 continue
-            member_fields = member.data.get('profile', {}).get('fields', {}) or {}
-            slack_display_name = member.data.get('profile', {}).get('display_name', None)
-            if not slack_display_name or slack_display_name == '':
-                slack_display_name = member.data.get('profile', {}).get('real_name', None)
-            record = {
-                'slack_id': member_id,
-                'slack_display_name': slack_display_name,
-                'destiny_psn_id': member_fields.get(SLACK_FIELD_PSN, {}).get('value', None),
-                'destiny_xbl_id': member_fields.get(SLACK_FIELD_XBL, {}).get('value', None),
-                'destiny_stm_id': member_fields.get(SLACK_FIELD_STM, {}).get('value', None)
-            }
             channel_members.append(record)
         return channel_members
 
-    def activity_message_for(self, activity, include_start=False):
-        """Return a Slack-formatted message (raw, not blocks) representing the current activity.
-        
+    def session_key_for(self, activity):
+        """Return the Redis key holding the ts of the message for a player's current play session.
+
         :param activity: 
-        :param include_start:
         :return: 
         """
-        slack_display_name = activity["slack_member"]["slack_display_name"]
-        destiny_player_name = activity["destiny_player_name"]
-        character_class = activity["destiny_character_class"]
-        if character_class:
-            character_class_emoji = character_class['emoji']
-        else:
-            character_class_emoji = ""
-        activity_name = activity["activity_name"]
-        if not activity_name:
-            activity_name = 'Unknown'
-        activity_emoji = self.activity_emoji_for(activity_name)
+        return f"{self.redis_prefix}latest_activity!{activity.membership_type}!{activity.membership_id}!session"
+
+    def load_session(self, ts):
+        session = self.redis.get(f"{self.redis_prefix}session!{ts}")
+        return json.loads(session) if session else None
+
+    def save_session(self, session):
+        pipeline = self.redis.pipeline()
+        pipeline.set(f"{self.redis_prefix}session!{session['ts']}", json.dumps(session), ex=SESSION_TTL)
+        for key in session['active']:
+            pipeline.set(key, session['ts'], ex=SESSION_TTL)
+        pipeline.execute()
+
+    def leave_sessions(self, session_keys, sessions_ts):
+        """Remove players from the sessions they were in, finishing the messages of sessions nobody is left in.
+
+        :param session_keys: 
+        :param sessions_ts: each player's current session's ts, or None
+        :return: 
+        """
+        leaving = {}
+        for key, ts in zip(session_keys, sessions_ts):
+            if ts:
+                leaving.setdefault(ts, set()).add(key)
+        for ts, keys in leaving.items():
+            session = self.load_session(ts)
+            if session is None:
+                continue
+            session['active'] = [key for key in session['active'] if key not in keys]
+            if session['active']:
+                self.save_session(session)
+                continue
+            now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+            text = SESSION_ENDED_TEMPLATE.format(
+                players=', '.join(session['labels'][key] for key in session['players']),
+                activities=', '.join(session['activities']),
+                duration=humanize.naturaldelta(datetime.timedelta(seconds=now - session['started']))
+            )
+            self.update_announcement(ts, text, [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}}])
+            self.redis.delete(f"{self.redis_prefix}session!{ts}")
+
+    def session_message_for(self, session, activities):
+        """Return the text and Block Kit blocks for a session's message, listing its earlier activities.
+
+        :param session: 
+        :param activities: the session's players' current activities
+        :return: 
+        """
+        text, blocks = self.activity_announcement_for(activities)
+        if len(session['activities']) > 1:
+            blocks = blocks or [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': text}}]
+            history = SESSION_HISTORY_TEMPLATE.format(activities=', '.join(session['activities'][:-1]))
+            blocks.append({'type': 'context', 'elements': [{'type': 'mrkdwn', 'text': history}]})
+        return text, blocks
+
+    @staticmethod
+    def group_activities(activities):
+        """Group activities that were started together: the same activity, by players in the same fireteam or
+        starting it within ANNOUNCEMENT_WINDOW seconds of each other.
+
+        :param activities: 
+        :return: a list of lists of activities, in order of when they were started
+        """
+        groups = []
+        for activity in sorted(activities, key=lambda a: a.started):
+            party = set(activity.party)
+            for group in groups:
+                if (group['activity_hash'] == activity.activity_hash and (
+                        party & group['party'] or
+                        activity.started - group['started'] <= ANNOUNCEMENT_WINDOW)):
+                    group['activities'].append(activity)
+                    group['party'] |= party
+                    break
+            else:
+                groups.append({
+                    'activity_hash': activity.activity_hash,
+                    'started': activity.started,
+                    'party': party,
+                    'activities': [activity],
+                })
+        return [group['activities'] for group in groups]
+
+    @staticmethod
+    def is_fireteam(activities):
+        """Whether a group of players are in a fireteam together, going by their profiles' transitory party data.
+
+        :param activities: 
+        :return: True if each player's party includes another player of the group
+        """
+        membership_ids = {str(activity.membership_id) for activity in activities}
+        return all(
+            set(activity.party) & (membership_ids - {str(activity.membership_id)}) for activity in activities
+        )
+
+    def player_label_for(self, activity):
+        """Return a player's class emoji and name, as shown in activity messages.
+
+        :param activity: 
+        :return: 
+        """
+        slack_display_name = activity.slack_display_name
+        destiny_player_name = activity.destiny_player_name
+        character_class = CLASSES.get(activity.character_class_hash)
         if not slack_display_name:
             display_name = f'*{destiny_player_name}*'
         else:
             display_name = f'*{destiny_player_name}* (@{slack_display_name})'
+        return PLAYER_TEMPLATE.format(
+            class_emoji=character_class['emoji'] if character_class else "", display_name=display_name)
+
+    def activity_label_for(self, activity):
+        """Return an activity's emoji and name, as shown in activity messages.
 
+        :param activity: 
+        :return: 
+        """
+        return ACTIVITY_TEMPLATE.format(
+            activity_emoji=self.activity_emoji.get(str(activity.activity_hash), ""),
+            activity_name=activity.activity_name or 'Unknown'
+        )
+
+    def activity_message_for(self, activity, include_start=False):
+        """Return a Slack-formatted message (raw, not blocks) representing the current activity.
+        
+        :param activity: 
+        :param include_start:
+        :return: 
+        """
+        player = self.player_label_for(activity)
+        activity_label = self.activity_label_for(activity)
         if include_start:
             now = datetime.datetime.now(datetime.timezone.utc)
-            date_activity_started = activity["activity_context"]["epochActivityStarted"]
+            date_activity_started = activity.started
             delta = now.timestamp() - date_activity_started
             delta = datetime.timedelta(seconds=delta)
             delta_human = humanize.naturaltime(delta)
-            msg = f'{character_class_emoji} {display_name} started playing {activity_emoji} *{activity_name}* _{delta_human}_'
-        else:
-            msg = f'{character_class_emoji} {display_name} is playing {activity_emoji} *{activity_name}*'
+            return STARTED_PLAYING_TEMPLATE.format(player=player, activity=activity_label, started=delta_human)
+        return PLAYING_TEMPLATE.format(player=player, activity=activity_label)
+
+    def activity_announcement_for(self, activities):
+        """Return the text and Block Kit blocks announcing a group of players starting an activity together.
 
-        return msg
+        :param activities: as grouped by group_activities()
+        :return: a two-tuple of the notification text and the blocks, which are None for a single player
+        """
+        if len(activities) == 1:
+            return self.activity_message_for(activities[0]), None
+        players = [self.player_label_for(activity) for activity in activities]
+        activity_label = self.activity_label_for(activities[0])
+        text = FIRETEAM_PLAYING_TEMPLATE.format(players=', '.join(players), activity=activity_label)
+        # Players who merely started the same activity at about the same time aren't necessarily a fireteam.
+        header = FIRETEAM_HEADER_TEMPLATE if self.is_fireteam(activities) else PLAYERS_HEADER_TEMPLATE
+        blocks = [
+            {'type': 'section', 'text': {
+                'type': 'mrkdwn', 'text': header.format(activity=activity_label, count=len(players))
+            }},
+            {'type': 'section', 'text': {'type': 'mrkdwn', 'text': '\n'.join(players)}},
+        ]
+        return text, blocks
 
     pass
     # endregion
 
 
+# region SHARDED WORKER
+
+class ShardedHawthorne:
+    """Runs Hawthorne for whichever of several channels this worker process holds the Redis lease for.
+
+    Each worker claims its fair share of the configured channels, and a Hawthorne() is started for each channel it
+    holds and ticked in turn. When a worker dies its leases expire and the surviving workers pick up its channels;
+    when a worker starts, the others shed channels for it to claim. Add worker dynos to scale out.
+
+    With a single channel this is leader election: one worker runs the bot, and any others wait as hot standbys until
+    its lease is released (on SIGTERM) or expires (after LEASE_TTL seconds).
+    """
+
+    def __init__(self, bot, channel_configs, coordinator=None):
+        """
+        :param bot: a Hawthorne() whose Bungie.net, Slack and Redis clients are shared with the per-channel bots
+        :param channel_configs: a list of dicts as returned by channel_configs_from_environment()
+        :param coordinator: a sharding.ShardCoordinator, by default one for the configured channels
+        """
+        self.bot = bot
+        self.channel_configs = {config['channel']: config for config in channel_configs}
+        self.coordinator = coordinator or ShardCoordinator(bot.redis, list(self.channel_configs), lease_ttl=LEASE_TTL)
+        self.bots = {}
+
+    def start(self):
+        """Run the worker until SIGTERM is received and every channel's bot has stopped.
+
+        :return: 
+        """
+        Hawthorne.log_local(f"Starting sharded worker {self.coordinator.worker_id}.")
+        self.coordinator.start_renewing()
+        last_rebalance = 0
+        try:
+            while True:
+                now = time.monotonic()
+                if not SIGTERM_RECEIVED and now - last_rebalance >= ShardCoordinator.REBALANCE_INTERVAL:
+                    self.rebalance()
+                    last_rebalance = now
+                for channel, bot in list(self.bots.items()):
+                    try:
+                        still_running = bot.tick(sleep=0)
+                    except Exception as e:
+                        # As in Hawthorne.start(), but the bot will be restarted on the next rebalance while we hold
+                        # the channel's lease.
+                        exc = traceback.format_exc()
+                        ts = bot.log(f":big-red-siren: Exception occurred: `{e}`")
+                        bot.log_thread(ts, f"Exception:\n```\n{exc}\n```")
+                        still_running = False
+                    if not still_running:
+                        del self.bots[channel]
+                if SIGTERM_RECEIVED and not self.bots:
+                    break
+                time.sleep(1)  # As in Hawthorne.tick(), to prevent bot spam.
+        finally:
+            self.coordinator.release_all()
+
+    def rebalance(self):
+        """Start bots for channels this worker has newly claimed, and stop those for channels it has lost.
+
+        :return: 
+        """
+        owned_channels = self.coordinator.rebalance(before_release=self.hand_off)
+        for channel in list(self.bots):
+            if channel not in owned_channels:
+                self.hand_off(channel)
+        for channel in owned_channels:
+            if channel not in self.bots:
+                Hawthorne.log_local(f"Taking over channel {channel}.")
+                bot = self.bot.for_channel(self.channel_configs[channel])
+                try:
+                    # A channel reported on within the last few minutes was just being run by another bot (or by this
+                    # worker, before an exception), so there's nobody to tell that it's back.
+                    bot.begin(takeover=bot.activity_state_is_primed())
+                except Exception as e:
+                    Hawthorne.log_local(f"Unable to start the bot for channel {channel}, will retry: {e}")
+                    continue
+                self.bots[channel] = bot
+
+    def hand_off(self, channel):
+        """Stop the bot for a channel this worker is giving up, checkpointing it for the bot that takes over.
+
+        :param channel:
+        :return: 
+        """
+        bot = self.bots.pop(channel, None)
+        if bot is None:
+            return
+        Hawthorne.log_local(f"Handing off channel {channel}.")
+        bot.stop()
+        try:
+            bot.checkpoint_state()
+        except Exception as e:
+            Hawthorne.log_local(f"Unable to checkpoint the bot for channel {channel}: {e}")
+
+# endregion
+
+
 # region COMMAND LINE HANDLER
 
 def cli_bungie_auth(api_token):
@@ -940,7 +1848,8 @@ def start_hawthorne():
     bot = Hawthorne.instantiate_from_environment()
     signal.signal(signal.SIGTERM, receive_signal)
     print("Starting Hawthorne.")
-    bot.start()
+    # Even with a single channel, take a lease on it so that overlapping workers (e.g. during a deploy) don't both post.
+    ShardedHawthorne(bot, channel_configs_from_environment()).start()
     print("Hawthorne has stopped.")
 
 def receive_signal(signal_number, frame):
@@ -0,0 +1,161 @@
+"""In-process request metrics: counters and latency histograms per endpoint.
+
+Metrics are cheap to record from any thread and can be exported in the Prometheus text exposition format, or
+condensed into a short human-readable summary for the Slack log channel. Several processes' exports can be served
+together with merge_prometheus().
+"""
+import bisect
+import threading
+
+
+class Metrics:
+    """Per-endpoint request counts, latency histograms and response sizes for one API client."""
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._requests = {}  # (endpoint, status_code, error_status) -> count
+            self._latency = {}  # endpoint -> [bucket counts..., +Inf count, sum]
+            self._bytes = {}  # endpoint -> bytes received
+
+    def observe_request(self, endpoint, status_code, error_status, seconds, response_bytes):
+        """Record a single request, whether or not a response was received.
+
+        :param endpoint: the endpoint's URL template, e.g. '/Destiny2/{membershipType}/Profile/{destinyMembershipId}/'
+        :param status_code: the HTTP status code, or 'error' if no response was received
+        :param error_status: the API-level status (e.g. Bungie's ErrorStatus), the exception's name for a request that
+            got no response, or '' if there wasn't one
+        :param seconds: how long the request took
+        :param response_bytes: the size of the response body
+        :return:
+        """
+        bucket = bisect.bisect_left(self.LATENCY_BUCKETS, seconds)
+        with self._lock:
+            key = (endpoint, str(status_code), error_status or '')
+            self._requests[key] = self._requests.get(key, 0) + 1
+            latency = self._latency.get(endpoint)
+            if latency is None:
+                latency = self._latency[endpoint] = [0] * (len(self.LATENCY_BUCKETS) + 1) + [0.0]
+            latency[bucket] += 1
+            latency[-1] += seconds
+            self._bytes[endpoint] = self._bytes.get(endpoint, 0) + response_bytes
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format.
+
+        :return: str
+        """
+        ns = self.namespace
+        with self._lock:
+            requests = sorted(self._requests.items())
+            latencies = sorted((endpoint, list(latency)) for endpoint, latency in self._latency.items())
+            response_bytes = sorted(self._bytes.items())
+
+        lines = [
+            f'# HELP {ns}_requests_total Requests made, by endpoint, HTTP status code and API error status.',
+            f'# TYPE {ns}_requests_total counter',
+        ]
+        for (endpoint, status_code, error_status), count in requests:
+            labels = _labels(endpoint=endpoint, status_code=status_code, error_status=error_status)
+            lines.append(f'{ns}_requests_total{{{labels}}} {count}')
+
+        lines += [
+            f'# HELP {ns}_request_duration_seconds Request latency, by endpoint.',
+            f'# TYPE {ns}_request_duration_seconds histogram',
+        ]
+        for endpoint, latency in latencies:
+            cumulative = 0
+            for le, count in zip(self.LATENCY_BUCKETS + ('+Inf',), latency[:-1]):
+                cumulative += count
+                labels = _labels(endpoint=endpoint, le=str(le))
+                lines.append(f'{ns}_request_duration_seconds_bucket{{{labels}}} {cumulative}')
+            labels = _labels(endpoint=endpoint)
+            lines.append(f'{ns}_request_duration_seconds_sum{{{labels}}} {latency[-1]:.6f}')
+            lines.append(f'{ns}_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        lines += [
+            f'# HELP {ns}_response_bytes_total Response bytes received, by endpoint.',
+            f'# TYPE {ns}_response_bytes_total counter',
+        ]
+        for endpoint, count in response_bytes:
+            lines.append(f'{ns}_response_bytes_total{{{_labels(endpoint=endpoint)}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, top=10):
+        """Summarize the busiest endpoints as a few lines of text, most-called first.
+
+        :param top: how many endpoints to include
+        :return: str
+        """
+        with self._lock:
+            latencies = {endpoint: list(latency) for endpoint, latency in self._latency.items()}
+            response_bytes = dict(self._bytes)
+            failures = {}
+            for (endpoint, status_code, error_status), count in self._requests.items():
+                if status_code != '200' or error_status not in ('', 'Success'):
+                    failures[endpoint] = failures.get(endpoint, 0) + count
+
+        rows = []
+        for endpoint, latency in latencies.items():
+            count = sum(latency[:-1])
+            rows.append((count, endpoint, latency[-1] / count if count else 0.0))
+        rows.sort(reverse=True)
+
+        total = sum(row[0] for row in rows)
+        lines = [f'{self.namespace}: {total} requests across {len(rows)} endpoints']
+        for count, endpoint, mean_seconds in rows[:top]:
+            lines.append(
+                f'{count:>7} {endpoint}  mean {mean_seconds * 1000:.0f}ms'
+                f'  {failures.get(endpoint, 0)} failed  {response_bytes.get(endpoint, 0) / 1024:.0f}KiB'
+            )
+        return '\n'.join(lines)
+
+
+def merge_prometheus(texts):
+    """Merge the metrics exported by several processes into one exposition, telling them apart by an instance label.
+
+    Each metric's HELP and TYPE lines are kept once, followed by every process's samples of it.
+
+    :param texts: a dict of instance name to metrics in the Prometheus text format, e.g. from to_prometheus()
+    :return: str
+    """
+    families = {}  # metric name -> [comment lines, sample lines]
+    for instance, text in sorted(texts.items()):
+        instance_label = _labels(instance=instance)
+        family = None
+        for line in text.splitlines():
+            if line.startswith('#'):
+                parts = line.split(' ', 3)
+                if len(parts) >= 3 and parts[1] in ('HELP', 'TYPE'):
+                    family = families.setdefault(parts[2], [[], []])
+                    if line not in family[0]:
+                        family[0].append(line)
+                continue
+            if not line.strip() or family is None:
+                continue
+            name, brace, rest = line.partition('{')
+            if brace:
+                line = f'{name}{{{instance_label},{rest}'
+            else:
+                name, _, value = line.partition(' ')
+                line = f'{name}{{{instance_label}}} {value}'
+            family[1].append(line)
+
+    lines = []
+    for comments, samples in families.values():
+        lines += comments + samples
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _labels(**labels):
+    """Format Prometheus labels, escaping values as the exposition format requires."""
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
@@ -0,0 +1,149 @@
+"""Slack channel rosters kept in Redis, maintained from Slack Events API deltas.
+
+Rather than fetching a channel's members and every member's profile on every tick, the bot reads a roster from Redis.
+The web app's Slack events endpoint keeps it up to date as members join or leave a channel or change their profile,
+and the bot falls back to a full fetch from the Slack API when a roster has never been synced (or is due a resync, in
+case events were missed).
+
+Keys:
+    roster!{channel}!members  a set of the channel's member ids
+    roster!{channel}!synced   present while the roster is trusted, expiring after RESYNC_INTERVAL seconds
+    roster!profiles           a hash of member id to JSON member record, shared by all channels, and pruned of members
+                              who are in no channel's roster whenever a roster is resynced
+
+Example usage:
+    roster = Roster(my_redis, 'CR0NPJWBT')
+    handle_event(my_redis, {'type': 'member_left_channel', 'channel': 'CR0NPJWBT', 'user': 'U0123456'})
+    print(roster.member_ids())
+"""
+import json
+
+# Slack profile fields holding each platform's gamertag.
+SLACK_FIELD_PSN = 'Xf0DB6LM46'
+SLACK_FIELD_XBL = 'XfMDV8FH3K'
+SLACK_FIELD_STM = 'XfMKSQK1S8'
+
+PROFILES_KEY = 'roster!profiles'
+GAMERTAG_KEYS = ('destiny_psn_id', 'destiny_xbl_id', 'destiny_stm_id')
+RESYNC_INTERVAL = 6 * 60 * 60
+
+
+def member_record(member_id, profile):
+    """Build the record the bot keeps for a Slack member from their Slack profile.
+
+    :param member_id:
+    :param profile: a Slack user profile, as returned by users.profile.get or in a user_change event
+    :return: dict
+    """
+    member_fields = profile.get('fields', {}) or {}
+    slack_display_name = profile.get('display_name', None)
+    if not slack_display_name or slack_display_name == '':
+        slack_display_name = profile.get('real_name', None)
+    return {
+        'slack_id': member_id,
+        'slack_display_name': slack_display_name,
+        'is_bot': 'bot_id' in profile,
+        'destiny_psn_id': member_fields.get(SLACK_FIELD_PSN, {}).get('value', None),
+        'destiny_xbl_id': member_fields.get(SLACK_FIELD_XBL, {}).get('value', None),
+        'destiny_stm_id': member_fields.get(SLACK_FIELD_STM, {}).get('value', None)
+    }
+
+
+class Roster:
+    """The members of one Slack channel, and their profiles, as stored in Redis."""
+
+    def __init__(self, redis_client, channel):
+        self.redis = redis_client
+        self.channel = channel
+        self.members_key = f'roster!{channel}!members'
+        self.synced_key = f'roster!{channel}!synced'
+
+    def is_synced(self):
+        return bool(self.redis.exists(self.synced_key))
+
+    def replace(self, member_ids, records):
+        """Replace the roster with a full listing of the channel's members, e.g. fetched from the Slack API.
+
+        :param member_ids: every member of the channel
+        :param records: member records, as returned by member_record(), for those members whose profile was fetched
+        :return:
+        """
+        pipeline = self.redis.pipeline()
+        pipeline.delete(self.members_key)
+        if member_ids:
+            pipeline.sadd(self.members_key, *member_ids)
+        if records:
+            pipeline.hset(PROFILES_KEY, mapping={record['slack_id']: json.dumps(record) for record in records})
+        pipeline.set(self.synced_key, 1, ex=RESYNC_INTERVAL)
+        pipeline.execute()
+        prune_profiles(self.redis)
+
+    def member_ids(self):
+        return sorted(self.redis.smembers(self.members_key))
+
+    def records(self, member_ids):
+        """Fetch the stored records for some members.
+
+        :param member_ids:
+        :return: a dict of member id to record, omitting members whose profile hasn't been stored yet
+        """
+        if not member_ids:
+            return {}
+        profiles = self.redis.hmget(PROFILES_KEY, member_ids)
+        return {
+            member_id: json.loads(profile) for member_id, profile in zip(member_ids, profiles) if profile is not None
+        }
+
+    def update_record(self, record):
+        self.redis.hset(PROFILES_KEY, record['slack_id'], json.dumps(record))
+
+
+def prune_profiles(redis_client):
+    """Drop the stored profiles of members who are no longer in any channel's roster, e.g. since they left it.
+
+    :param redis_client: a redis.Redis
+    :return: the number of profiles dropped
+    """
+    member_ids = set()
+    for members_key in redis_client.scan_iter(match='roster!*!members'):
+        member_ids |= redis_client.smembers(members_key)
+    stale = set(redis_client.hkeys(PROFILES_KEY)) - member_ids
+    if stale:
+        redis_client.hdel(PROFILES_KEY, *stale)
+    return len(stale)
+
+
+def handle_event(redis_client, event):
+    """Apply a Slack Events API event to the rosters in Redis.
+
+    Handles member_joined_channel, member_left_channel and user_change events; others are ignored.
+
+    :param redis_client: a redis.Redis
+    :param event: the 'event' object of a Slack event callback
+    :return: True if the event was applied
+    """
+    event_type = event.get('type')
+    if event_type == 'member_joined_channel':
+        # The new member's profile is fetched by the bot on its next tick, unless it's stored already.
+        redis_client.sadd(Roster(redis_client, event['channel']).members_key, event['user'])
+        return True
+    if event_type == 'member_left_channel':
+        redis_client.srem(Roster(redis_client, event['channel']).members_key, event['user'])
+        return True
+    if event_type == 'user_change':
+        # Only keep profiles for members of a channel we have a roster for; the bot fetches any it's missing.
+        user = event['user']
+        stored = redis_client.hget(PROFILES_KEY, user['id'])
+        if stored is None:
+            return False
+        profile = user.get('profile', {})
+        record = member_record(user['id'], profile)
+        record['is_bot'] = record['is_bot'] or bool(user.get('is_bot'))
+        if 'fields' not in profile:
+            # Users in events don't always come with their custom profile fields, so keep the gamertags we have.
+            stored = json.loads(stored)
+            for key in GAMERTAG_KEYS:
+                record[key] = stored.get(key)
+        redis_client.hset(PROFILES_KEY, user['id'], json.dumps(record))
+        return True
+    return False
@@ -0,0 +1,178 @@
+"""Redis leases for spreading work (e.g. Slack channels) across several worker processes.
+
+Each shard is claimed with a lease: a Redis key holding the owner's id that expires unless the owner keeps renewing it.
+A worker that dies simply stops renewing, and any other worker can claim its shards once the leases expire.
+
+Example usage:
+    coordinator = ShardCoordinator(my_redis, ['CR0NPJWBT', 'CRJERJ0S3'])
+    while True:
+        owned_channels = coordinator.rebalance()
+        ...
+        time.sleep(ShardCoordinator.REBALANCE_INTERVAL)
+"""
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+
+
+class RedisLease:
+    """A time-limited, renewable claim on a named resource, held in Redis."""
+    # Renew or release the lease only if we still own it, atomically.
+    RENEW_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    RELEASE_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, redis_client, name, owner, ttl):
+        """
+        :param redis_client: a redis.Redis
+        :param name: the Redis key to hold the lease in
+        :param owner: a unique id for the process taking the lease
+        :param ttl: seconds the lease lasts without being renewed
+        """
+        self.redis = redis_client
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.acquired_at = None
+
+    def acquire(self):
+        """Take the lease if nobody holds it (or renew it if we already do).
+
+        :return: True if we hold the lease
+        """
+        if self.redis.set(self.name, self.owner, nx=True, px=int(self.ttl * 1000)):
+            self.acquired_at = time.monotonic()
+            return True
+        return self.renew()
+
+    def renew(self):
+        """Extend the lease, if we still hold it.
+
+        :return: True if we still hold the lease
+        """
+        renewed = bool(self.redis.eval(self.RENEW_SCRIPT, 1, self.name, self.owner, int(self.ttl * 1000)))
+        if not renewed:
+            self.acquired_at = None
+        return renewed
+
+    def release(self):
+        """Give up the lease, if we hold it."""
+        self.redis.eval(self.RELEASE_SCRIPT, 1, self.name, self.owner)
+        self.acquired_at = None
+
+    @property
+    def held(self):
+        return self.acquired_at is not None
+
+
+class ShardCoordinator:
+    """Spreads a fixed set of shards evenly across the live worker processes, using one RedisLease per shard.
+
+    Workers advertise themselves with a heartbeat in a sorted set. On each rebalance() a worker renews the leases it
+    holds, gives up any beyond its fair share (so a newly started worker gets some), and claims free shards until it
+    has its fair share.
+    """
+    LEASE_TTL = 60
+    REBALANCE_INTERVAL = 15
+
+    def __init__(self, redis_client, shard_ids, namespace='hawthorne', worker_id=None, lease_ttl=None):
+        self.redis = redis_client
+        self.shard_ids = list(shard_ids)
+        self.namespace = namespace
+        self.worker_id = worker_id or '{}:{}:{}'.format(
+            os.environ.get('DYNO', socket.gethostname()), os.getpid(), uuid.uuid4().hex[:8])
+        self.lease_ttl = lease_ttl or self.LEASE_TTL
+        self.workers_key = f'{namespace}!workers'
+        self.leases = {
+            shard_id: RedisLease(self.redis, f'{namespace}!lease!{shard_id}', self.worker_id, self.lease_ttl)
+            for shard_id in self.shard_ids
+        }
+        self._lock = threading.RLock()
+        self._renewer = None
+        self._stopped = threading.Event()
+
+    def heartbeat(self):
+        """Advertise this worker as alive, and forget workers that have stopped heartbeating."""
+        now = time.time()
+        self.redis.zadd(self.workers_key, {self.worker_id: now})
+        self.redis.zremrangebyscore(self.workers_key, '-inf', now - self.lease_ttl)
+
+    def live_workers(self):
+        return self.redis.zrangebyscore(self.workers_key, time.time() - self.lease_ttl, '+inf')
+
+    def owned_shards(self):
+        return [shard_id for shard_id in self.shard_ids if self.leases[shard_id].held]
+
+    def renew(self):
+        """Heartbeat and renew every lease this worker holds.
+
+        :return: the shard ids this worker still holds
+        """
+        with self._lock:
+            self.heartbeat()
+            for shard_id in self.owned_shards():
+                self.leases[shard_id].renew()
+            return self.owned_shards()
+
+    def start_renewing(self):
+        """Keep renewing held leases from a background thread, so they survive ticks that outlast the lease TTL."""
+        interval = min(self.REBALANCE_INTERVAL, self.lease_ttl / 3)
+
+        def renew_until_stopped():
+            while not self._stopped.wait(interval):
+                try:
+                    self.renew()
+                except Exception as e:
+                    print(f"Unable to renew shard leases: {e}")
+
+        self._renewer = threading.Thread(target=renew_until_stopped, daemon=True)
+        self._renewer.start()
+
+    def rebalance(self, before_release=None):
+        """Renew, shed and claim leases so this worker holds its fair share of the shards.
+
+        :param before_release: called with each shard id about to be shed, while this worker still holds its lease
+        :return: the shard ids this worker now holds, in configuration order
+        """
+        with self._lock:
+            return self._rebalance(before_release)
+
+    def _rebalance(self, before_release):
+        self.renew()
+        fair_share = math.ceil(len(self.shard_ids) / max(1, len(self.live_workers())))
+        owned = self.owned_shards()
+        if len(owned) > fair_share:
+            # Shed the most recently claimed shards first, which are the least likely to be mid-way through work.
+            for shard_id in sorted(owned, key=lambda s: self.leases[s].acquired_at)[fair_share:]:
+                if before_release:
+                    before_release(shard_id)
+                self.leases[shard_id].release()
+        elif len(owned) < fair_share:
+            # Start looking at a different shard on each worker so they don't all contend for the same leases.
+            offset = sum(self.worker_id.encode()) % max(1, len(self.shard_ids))
+            for shard_id in self.shard_ids[offset:] + self.shard_ids[:offset]:
+                if len(self.owned_shards()) >= fair_share:
+                    break
+                if not self.leases[shard_id].held:
+                    self.leases[shard_id].acquire()
+        return self.owned_shards()
+
+    def release_all(self):
+        """Give up every lease and stop advertising this worker, e.g. on shutdown."""
+        self._stopped.set()
+        with self._lock:
+            for shard_id in self.owned_shards():
+                self.leases[shard_id].release()
+            self.redis.zrem(self.workers_key, self.worker_id)
@@ -3,12 +3,15 @@
 Mostly to make oauth and client persistence easier.
 """
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from urllib import parse as urllib_parse
 from slacker import Slacker
 from slack import WebClient
 from requests.exceptions import HTTPError, ReadTimeout
 
+from tracing import traced
+
 
 class SlackApi:
     """A lean Python Slack API wrapper, using slacker and the official Slack API under the hood."""
@@ -72,14 +75,19 @@ class SlackApi:
         :param oauth_bot_token: 
         :return: 
         """
+        slackers = []
         if oauth_user_token:
-            self.slack_as_user = WebClient(oauth_user_token)
+            self.slack_as_user = traced(WebClient(oauth_user_token), 'slack')
             self.slacker_as_user = Slacker(oauth_user_token, self.incoming_webhook_url)
-            self._auth_slack(self.slacker_as_user)
+            slackers.append(self.slacker_as_user)
         if oauth_bot_token:
-            self.slack_as_bot = WebClient(oauth_bot_token)
+            self.slack_as_bot = traced(WebClient(oauth_bot_token), 'slack')
             self.slacker_as_bot = Slacker(oauth_bot_token, self.incoming_webhook_url)
-            self._auth_slack(self.slacker_as_bot)
+            slackers.append(self.slacker_as_bot)
+        # Test both tokens at once, rather than one round trip after the other.
+        if slackers:
+            with ThreadPoolExecutor(max_workers=len(slackers)) as executor:
+                list(executor.map(self._auth_slack, slackers))
 
         return self.slack_as_user, self.slack_as_bot, self.slacker_as_user, self.slacker_as_bot
 
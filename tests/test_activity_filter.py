@@ -0,0 +1,42 @@
+import unittest
+
+from activity_filter import ActivityFilter
+
+
+class ActivityFilterTest(unittest.TestCase):
+    def test_rules(self):
+        activity_filter = ActivityFilter.from_rules(
+            {'pairs': [(1, 2)], 'activities': [3]},
+            {'modes': ['4'], 'repeats': [5]},
+        )
+        self.assertTrue(activity_filter.is_blacklisted(1, 2))
+        self.assertFalse(activity_filter.is_blacklisted(1, 9))
+        self.assertTrue(activity_filter.is_blacklisted(3, 9))
+        self.assertTrue(activity_filter.is_blacklisted(9, 4))
+        self.assertTrue(activity_filter.suppresses_repeats(5))
+        self.assertFalse(activity_filter.suppresses_repeats(3))
+
+    def test_json_documents_add_to_the_base_rules(self):
+        activity_filter = ActivityFilter.from_json(
+            '{"pairs": [[1, 2]]}', None, '', '{"modes": [4]}', base_rules={'activities': [3]})
+        self.assertTrue(activity_filter.is_blacklisted(1, 2))
+        self.assertTrue(activity_filter.is_blacklisted(3, 9))
+        self.assertTrue(activity_filter.is_blacklisted(9, 4))
+        self.assertFalse(activity_filter.is_blacklisted(1, 9))
+
+    def test_invalid_rules_raise_value_error(self):
+        for document in (
+            'not json',
+            '[1, 2]',
+            '"modes"',
+            '{"colours": [1]}',
+            '{"modes": 4}',
+            '{"modes": "4"}',
+            '{"modes": ["four"]}',
+            '{"modes": [null]}',
+            '{"pairs": [1]}',
+            '{"pairs": [[1, 2, 3]]}',
+        ):
+            with self.subTest(document=document):
+                with self.assertRaises(ValueError):
+                    ActivityFilter.from_json(document)
@@ -0,0 +1,33 @@
+import json
+import unittest
+
+from activity_record import ActivityRecord
+
+
+class ActivityRecordTest(unittest.TestCase):
+    def setUp(self):
+        self.record = ActivityRecord(
+            'U1', 'u1', 'Player 1', 3, '4611686018467284386', active_character='2305843009260647024',
+            character_class_hash='671679327', activity_hash=1234, activity_mode_hash=5678, started=1572717867.0,
+            activity_name='The Whisper', blacklisted=False, party=['4611686018467284386', '4611686018467284387'])
+
+    def test_round_trips_through_json(self):
+        loaded = ActivityRecord.from_json(self.record.to_json())
+        self.assertEqual(repr(loaded), repr(self.record))
+        self.assertEqual(loaded.party, ('4611686018467284386', '4611686018467284387'))
+
+    def test_is_stored_with_its_format_version(self):
+        self.assertEqual(json.loads(self.record.to_json())[0], ActivityRecord.FORMAT_VERSION)
+
+    def test_rejects_other_formats(self):
+        fields = json.loads(self.record.to_json())
+        for document in (
+            None,
+            '',
+            json.dumps(fields[1:]),  # unversioned, from before the format had a version
+            json.dumps([ActivityRecord.FORMAT_VERSION + 1] + fields[1:]),
+            json.dumps(fields[:-1]),
+            json.dumps({'slack_id': 'U1'}),
+        ):
+            with self.subTest(document=document):
+                self.assertIsNone(ActivityRecord.from_json(document))
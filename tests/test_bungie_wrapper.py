@@ -0,0 +1,177 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from bungie_wrapper import BungieApi, project
+
+
+class ProjectionTest(unittest.TestCase):
+    PROFILE = {
+        'profile': {'data': {'dateLastPlayed': '2019-11-02T18:04:27Z', 'characterIds': ['C1', 'C2']}},
+        'characterActivities': {'data': {
+            'C1': {'currentActivityHash': 1, 'availableActivities': [{'activityHash': 1}] * 3},
+            'C2': {'currentActivityHash': 2, 'availableActivities': []},
+        }},
+        'profileTransitoryData': {'data': {'partyMembers': [
+            {'membershipId': 'M1', 'displayName': 'Player 1', 'status': 11},
+            {'membershipId': 'M2', 'displayName': 'Player 2', 'status': 11},
+        ]}},
+    }
+
+    def test_nested_paths_and_wildcards(self):
+        self.assertEqual(
+            project(self.PROFILE, ['profile.data.dateLastPlayed', 'characterActivities.data.*.currentActivityHash']),
+            {'profile': {'data': {'dateLastPlayed': '2019-11-02T18:04:27Z'}},
+             'characterActivities': {'data': {'C1': {'currentActivityHash': 1}, 'C2': {'currentActivityHash': 2}}}}
+        )
+
+    def test_missing_keys_are_left_out(self):
+        self.assertEqual(project(self.PROFILE, ['profile.data.missing', 'missing.data', 'profile.data.x.y']),
+                         {'profile': {'data': {}}})
+
+    def test_lists_are_projected_element_by_element(self):
+        self.assertEqual(
+            project(self.PROFILE, ['profileTransitoryData.data.partyMembers.membershipId']),
+            {'profileTransitoryData': {'data': {'partyMembers': [{'membershipId': 'M1'}, {'membershipId': 'M2'}]}}}
+        )
+
+    def test_paths_ending_at_a_container_keep_it_whole(self):
+        projected = project(self.PROFILE, ['profile.data.characterIds', 'profile', 'profile.data.dateLastPlayed'])
+        self.assertEqual(projected, {'profile': self.PROFILE['profile']})
+
+    def test_get_projects_the_response(self):
+        bungie = BungieApi('api-token')
+        response = mock.MagicMock(status_code=200, content=b'{}')
+        response.json.return_value = {'ErrorStatus': 'Success', 'Response': self.PROFILE}
+        bungie.session = mock.MagicMock()
+        bungie.session.get.return_value = response
+        self.assertEqual(
+            bungie._get(BungieApi.BASE_URL + '/Profile/', fields=['profile.data.characterIds']),
+            {'profile': {'data': {'characterIds': ['C1', 'C2']}}}
+        )
+        self.assertEqual(bungie._get(BungieApi.BASE_URL + '/Profile/'), self.PROFILE)
+
+
+class PrimaryMembershipTest(unittest.TestCase):
+    """Resolves primary memberships against canned GetMembershipsById and GetLinkedProfiles responses."""
+    def setUp(self):
+        self.bungie = BungieApi('api-token')
+        # Membership 1/X1 is cross-saved to Steam (3/S1), which overrides it and 2/P1.
+        self.linked_profiles = {
+            'X1': [{'membershipType': 3, 'membershipId': 'S1', 'isOverridden': False},
+                   {'membershipType': 1, 'membershipId': 'X1', 'isOverridden': True},
+                   {'membershipType': 2, 'membershipId': 'P1', 'isOverridden': True}],
+            'X2': [{'membershipType': 1, 'membershipId': 'X2', 'isOverridden': False}],
+        }
+        self.lookups = []
+        self.lookups_lock = threading.Lock()
+        self.bungie.get_user_membership = self.get_user_membership
+        self.bungie.get_d2_linked_profiles = lambda membership_id, membership_type: {
+            'profiles': self.linked_profiles.get(membership_id, [])}
+
+    def get_user_membership(self, membership_id, membership_type):
+        with self.lookups_lock:
+            self.lookups.append((str(membership_type), membership_id))
+        return {'destinyMemberships': [{'membershipType': membership_type, 'membershipId': membership_id}]}
+
+    def test_results_are_cached(self):
+        self.assertEqual(self.bungie.get_primary_membership(1, 'X1'), (3, 'S1'))
+        self.assertEqual(self.bungie.get_primary_membership('1', 'X1'), (3, 'S1'))
+        self.assertEqual(self.lookups, [('1', 'X1')])
+        self.bungie.get_primary_membership(1, 'X1', use_cache=False)
+        self.assertEqual(len(self.lookups), 2)
+
+    def test_overridden_memberships_share_the_cached_primary(self):
+        self.bungie.get_primary_membership(1, 'X1')
+        self.assertEqual(self.bungie.get_primary_membership(2, 'P1'), (3, 'S1'))
+        self.assertEqual(self.lookups, [('1', 'X1')])
+
+    def test_invalidating_a_membership_forgets_its_linked_memberships(self):
+        self.bungie.get_primary_membership(1, 'X1')
+        self.bungie.get_primary_membership(1, 'X2')
+        self.bungie.invalidate_primary_membership(1, 'X1')
+        # After a cross-save change, P1 is no longer overridden by S1.
+        self.linked_profiles['P1'] = [{'membershipType': 2, 'membershipId': 'P1', 'isOverridden': False}]
+        self.assertEqual(self.bungie.get_primary_membership(2, 'P1'), (2, 'P1'))
+        self.bungie.get_primary_membership(1, 'X2')
+        self.assertEqual(self.lookups, [('1', 'X1'), ('1', 'X2'), ('2', 'P1')])
+
+    def test_misses_are_only_cached_briefly(self):
+        self.assertEqual(self.bungie.get_primary_membership(2, 'P9'), (None, None))
+        self.assertEqual(self.bungie.get_primary_membership(2, 'P9'), (None, None))
+        self.assertEqual(len(self.lookups), 1)
+        self.linked_profiles['P9'] = [{'membershipType': 2, 'membershipId': 'P9', 'isOverridden': False}]
+        with mock.patch('utilities.time.monotonic',
+                        return_value=self.bungie._primary_membership_cache._entries[('2', 'P9')].expires_at + 1):
+            self.assertEqual(self.bungie.get_primary_membership(2, 'P9'), (2, 'P9'))
+        self.assertEqual(len(self.lookups), 2)
+
+    def test_get_primary_memberships_resolves_each_player_once(self):
+        self.bungie.get_primary_membership(1, 'X1')
+        primaries = self.bungie.get_primary_memberships([
+            [(2, 'P1'), (1, 'X2')],  # cached through the cross-save override above
+            [(1, 'X2'), (2, 'P2')],
+            [(1, 'X2')],  # shares a membership with the previous player
+            [],
+        ])
+        self.assertEqual(primaries, [(3, 'S1'), (1, 'X2'), (1, 'X2'), (None, None)])
+        self.assertEqual(self.lookups, [('1', 'X1'), ('1', 'X2')])
+
+
+class ClanRosterTest(unittest.TestCase):
+    def setUp(self):
+        self.bungie = BungieApi('api-token')
+        self.pages = [[self.member(i) for i in range(0, 20)], [self.member(i) for i in range(20, 25)]]
+        self.pages_fetched = []
+        self.profiles_fetched = threading.Semaphore(0)
+        self.profile_delay = 0
+        self.bungie.get_clan_members = self.get_clan_members
+        self.bungie.get_d2_profile_cached = self.get_d2_profile_cached
+
+    @staticmethod
+    def member(i):
+        return {'destinyUserInfo': {'membershipId': f'M{i}', 'membershipType': 3, 'displayName': f'Player {i}'},
+                'joinDate': '2019-11-02T18:04:27Z', 'isOnline': False}
+
+    def get_clan_members(self, clan_id, page=None):
+        self.pages_fetched.append(page)
+        return {'results': self.pages[page - 1], 'hasMore': page < len(self.pages)}
+
+    def get_d2_profile_cached(self, membership_id, membership_type, components=None, fields=None):
+        time.sleep(self.profile_delay)
+        self.profiles_fetched.release()
+        return {'profile': {'data': {'dateLastPlayed': '2019-11-02T18:04:27Z'}}}
+
+    def test_iter_clan_last_on_yields_every_member(self):
+        rows = list(self.bungie.iter_clan_last_on('clan'))
+        self.assertEqual(sorted(row['name'] for row in rows), sorted(f'Player {i}' for i in range(25)))
+        self.assertEqual(self.pages_fetched, [1, 2])
+
+    def test_rows_are_yielded_before_later_pages_arrive(self):
+        first_row_received = threading.Event()
+        get_clan_members = self.get_clan_members
+
+        def get_clan_members_after_the_first_row(clan_id, page=None):
+            if page > 1:
+                self.assertTrue(first_row_received.wait(timeout=5), 'no row yielded before the next page')
+            return get_clan_members(clan_id, page)
+
+        self.bungie.get_clan_members = get_clan_members_after_the_first_row
+        rows = self.bungie.iter_clan_last_on('clan')
+        next(rows)
+        first_row_received.set()
+        self.assertEqual(len(list(rows)), 24)
+        self.assertEqual(self.pages_fetched, [1, 2])
+
+    def test_closing_early_cancels_queued_fetches(self):
+        self.profile_delay = 0.05
+        rows = self.bungie.iter_clan_last_on('clan')
+        next(rows)
+        rows.close()
+        fetched = 0
+        while self.profiles_fetched.acquire(blocking=False):
+            fetched += 1
+        self.assertLess(fetched, 25)
+        time.sleep(0.1)
+        self.assertFalse(self.profiles_fetched.acquire(blocking=False))
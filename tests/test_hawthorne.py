@@ -0,0 +1,505 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+import fakeredis
+
+from activity_filter import ActivityFilter
+from activity_record import ActivityRecord
+import hawthorne
+from hawthorne import Hawthorne, ShardedHawthorne
+from sharding import ShardCoordinator
+
+
+def make_bot(redis_client=None, slack=None, bungie=None, channel='CHANNEL'):
+    """Build a Hawthorne on fakeredis, with mocked Slack and Bungie.net clients."""
+    return Hawthorne(
+        'xoxp-test', None, None, None, 'xoxp-test', 'api-token', None, channel, 'LOG', 'UBOT',
+        slack or mock.MagicMock(), bungie or mock.MagicMock(),
+        redis_client or fakeredis.FakeRedis(decode_responses=True)
+    )
+
+
+class BackOffTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = make_bot()
+        self.api_action = mock.MagicMock(__name__='api_action')
+        self.local_action = mock.MagicMock(__name__='local_action')
+        self.bot.action_registry = [
+            {'method': self.api_action, 'frequency': 0, 'last': 0, 'wait': 0, 'calls-api': True, 'seq': 0},
+            {'method': self.local_action, 'frequency': 0, 'last': 0, 'wait': 0, 'calls-api': False, 'seq': 1},
+        ]
+        self.bot.keep_running = True
+
+    def test_back_off_skips_api_actions_without_sleeping(self):
+        self.bot.back_pressure = 300
+        with mock.patch('hawthorne.time.sleep') as sleep:
+            self.assertTrue(self.bot.tick(sleep=0))
+            self.assertTrue(self.bot.tick(sleep=0))
+        self.assertEqual([call.args for call in sleep.call_args_list], [(0,), (0,)])
+        self.api_action.assert_not_called()
+        self.assertEqual(self.local_action.call_count, 2)
+
+    def test_api_actions_resume_after_back_off(self):
+        self.bot.back_pressure = 300
+        self.bot.tick(sleep=0)
+        self.bot.back_off_until -= 300
+        self.bot.action_registry[1]['last'] = float('inf')
+        self.bot.tick(sleep=0)
+        self.api_action.assert_called_once()
+        self.assertIsNone(self.bot.back_off_until)
+
+    def test_status_thread_is_kept_until_an_api_action_succeeds(self):
+        self.bot.status_thread_ts = self.bot.status_log_thread_ts = '1.0'
+        self.bot.back_pressure = 300
+        self.bot.tick(sleep=0)
+        self.local_action.assert_called_once()
+        self.assertEqual(self.bot.status_thread_ts, '1.0')
+        self.bot.back_off_until -= 300
+        self.bot.tick(sleep=0)
+        self.api_action.assert_called_once()
+        self.assertIsNone(self.bot.status_thread_ts)
+        self.assertIsNone(self.bot.status_log_thread_ts)
+
+
+def make_activity(activity_hash=1, started=1000.0, active_character='C1', **fields):
+    fields = dict(dict(slack_id='U1', slack_display_name='u1', destiny_player_name='Player 1', membership_type=3,
+                       membership_id='M1', character_class_hash='671679327', activity_mode_hash=2,
+                       activity_name='Activity'), **fields)
+    return ActivityRecord(active_character=active_character, activity_hash=activity_hash, started=started, **fields)
+
+
+class SlashListTest(unittest.TestCase):
+    def test_each_channel_answers_its_own_requests(self):
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+        bots = {}
+        for channel in ('C1', 'C2'):
+            bots[channel] = make_bot(redis_client, channel=channel)
+            bots[channel].get_players_activities = mock.MagicMock(return_value=[])
+        redis_client.lpush('slash.list!C2', 'C2,U1')
+        self.assertFalse(bots['C1'].slash_list())
+        bots['C2'].slash_list()
+        bots['C1'].slack.slack_as_bot.chat_postEphemeral.assert_not_called()
+        post = bots['C2'].slack.slack_as_bot.chat_postEphemeral
+        post.assert_called_once()
+        self.assertEqual((post.call_args.kwargs['channel'], post.call_args.kwargs['user']), ('C2', 'U1'))
+
+
+class ClaimActivityTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.bot = make_bot(self.redis)
+
+    def claim(self, activity):
+        key = f'activity!{activity.membership_id}!{activity.activity_hash}!{activity.started}'
+        return self.bot.claim_activity(key, f'latest_activity!{activity.membership_id}', activity)
+
+    def test_claims_each_activity_once(self):
+        self.assertEqual(self.claim(make_activity()), (None, None))
+        self.assertIsNone(self.claim(make_activity()))
+
+    def test_returns_the_previous_activity(self):
+        self.claim(make_activity(activity_hash=1, started=1000.0))
+        self.assertEqual(self.claim(make_activity(activity_hash=2, started=2000.0)), (1, 'C1'))
+        self.assertEqual(
+            ActivityRecord.from_json(self.redis.get('latest_activity!M1!activity_json')).activity_hash, 2)
+
+    def test_ignores_older_activities(self):
+        self.claim(make_activity(activity_hash=2, started=2000.0))
+        self.assertIsNone(self.claim(make_activity(activity_hash=1, started=1000.0)))
+
+    def test_script_is_sent_by_sha(self):
+        self.claim(make_activity())
+        with mock.patch.object(self.redis, 'eval', side_effect=AssertionError('EVAL used')):
+            self.claim(make_activity(started=2000.0))
+
+
+class MembershipCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.bungie = mock.MagicMock()
+        self.bungie.search_d2_player.return_value = [
+            {'displayName': 'Player 1', 'membershipType': 3, 'membershipId': 'M1', 'iconPath': '/icon.png'}]
+        self.bungie.get_primary_memberships.return_value = [(None, None)]
+        self.bot = make_bot(self.redis, bungie=self.bungie)
+        self.member = {'slack_id': 'U1', 'destiny_stm_id': 'player1'}
+        self.key = 'membership!' + json.dumps([[3, 'player1']])
+
+    def test_only_the_resolved_membership_is_kept_in_redis(self):
+        self.assertEqual(self.bot.get_membership_for_slack_user(self.member), ('Player 1', 3, 'M1'))
+        self.assertEqual(json.loads(self.redis.get(self.key)), ['Player 1', 3, 'M1'])
+        self.bot.membership_cache.invalidate()
+        self.bot.get_membership_for_slack_user(self.member)
+        self.bungie.search_d2_player.assert_called_once()
+
+    def test_entries_holding_search_results_are_resolved_again(self):
+        self.redis.set(self.key, json.dumps([[{'displayName': 'Player 1'}], 'Player 1', 3, 'M1']))
+        self.assertEqual(self.bot.get_membership_for_slack_user(self.member), ('Player 1', 3, 'M1'))
+        self.bungie.search_d2_player.assert_called_once()
+
+
+class ReloadActivityFilterTest(unittest.TestCase):
+    def test_keeps_the_previous_rules_when_redis_holds_invalid_ones(self):
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+        bot = make_bot(redis_client)
+        redis_client.set('activity_filter', '{"modes": [77]}')
+        bot.reload_activity_filter()
+        self.assertTrue(bot.activity_filter.is_blacklisted(1, 77))
+        for rules in ('[77]', '{"modes": 77}', '{"modes": ["seventy-seven"]}'):
+            redis_client.set('activity_filter', rules)
+            bot.reload_activity_filter()
+            self.assertTrue(bot.activity_filter.is_blacklisted(1, 77))
+
+
+class ActivityAnnouncementTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = make_bot()
+
+    def header_for(self, activities):
+        groups = self.bot.group_activities(activities)
+        self.assertEqual(len(groups), 1)
+        text, blocks = self.bot.activity_announcement_for(groups[0])
+        return blocks[0]['text']['text']
+
+    def test_fireteam(self):
+        header = self.header_for([
+            make_activity(membership_id='M1', slack_id='U1', party=['M1', 'M2']),
+            make_activity(membership_id='M2', slack_id='U2', started=1500.0, party=['M1', 'M2']),
+        ])
+        self.assertIn('with a fireteam of 2', header)
+
+    def test_players_starting_together_without_a_shared_party(self):
+        header = self.header_for([
+            make_activity(membership_id='M1', slack_id='U1', party=['M1']),
+            make_activity(membership_id='M2', slack_id='U2', started=1010.0, party=['M2']),
+        ])
+        self.assertIn('2 players started', header)
+        self.assertNotIn('fireteam', header)
+
+    def test_fireteam_joined_by_a_stranger(self):
+        header = self.header_for([
+            make_activity(membership_id='M1', slack_id='U1', party=['M1', 'M2']),
+            make_activity(membership_id='M2', slack_id='U2', party=['M1', 'M2']),
+            make_activity(membership_id='M3', slack_id='U3', started=1010.0, party=[]),
+        ])
+        self.assertIn('3 players started', header)
+
+
+class PlaySessionTest(unittest.TestCase):
+    """Drives a player through report_player_activity() ticks, checking the session messages posted and edited."""
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.posted = []
+        slack = mock.MagicMock()
+        slack.slack_as_bot.chat_postMessage.side_effect = self.post
+        self.chat_update = slack.slack_as_bot.chat_update
+        self.bungie = mock.MagicMock()
+        self.bungie.get_d2_character.return_value = {'character': {'data': {'classHash': 671679327}}}
+        self.bot = make_bot(self.redis, slack, self.bungie)
+        self.bot.activity_filter = ActivityFilter.from_rules({'pairs': [(0, 0)], 'activities': [9]})
+        self.bot.bungie_manifest_activity_definitions = {
+            str(activity_hash): {'displayProperties': {'name': f'Activity {activity_hash}'}}
+            for activity_hash in (1, 2, 3, 9)
+        }
+        self.bot.bungie_manifest_activity_mode_definitions = {}
+        member = {'slack_id': 'U1', 'slack_display_name': 'u1', 'is_bot': False}
+        self.bot.slack_seen_cache.set('U1', True)
+        self.bot.fetch_slack_channel_members = lambda channel: [member]
+        self.bot.get_membership_for_slack_user = lambda slack_user: ('Player 1', 3, 'M1')
+
+    def post(self, channel, text, **kwargs):
+        ts = f'{len(self.posted) + 1}.0'
+        self.posted.append((channel, ts, text))
+        return {'ts': ts}
+
+    def announcements(self):
+        return [ts for channel, ts, text in self.posted if channel == 'CHANNEL']
+
+    def play(self, activity_hash, started):
+        """Report on the player, who is playing an activity (or offline, for activity 0)."""
+        self.bungie.get_current_activity.return_value = {
+            'characterActivities': {'C1': {
+                'characterId': 'C1',
+                'currentActivityHash': activity_hash,
+                'currentActivityModeHash': 5 if activity_hash else 0,
+                'epochActivityStarted': started,
+            }},
+            'transitoryData': {'partyMembers': [{'membershipId': 'M1'}]} if activity_hash else {},
+        }
+        self.bot.report_player_activity()
+
+    def ended(self):
+        return [call for call in self.chat_update.call_args_list if 'played' in call.kwargs['text']]
+
+    def test_next_activity_of_a_live_session_edits_its_message(self):
+        self.play(1, 1000.0)
+        self.play(2, 2000.0)
+        self.assertEqual(self.announcements(), ['1.0'])
+        self.assertEqual(self.chat_update.call_args.kwargs['ts'], '1.0')
+        self.assertFalse(self.ended())
+
+    def test_going_offline_ends_the_session_and_coming_back_posts_a_new_message(self):
+        self.play(1, 1000.0)
+        self.play(0, 1000.0)
+        self.assertEqual(len(self.ended()), 1)
+        self.assertEqual(self.ended()[0].kwargs['ts'], '1.0')
+        self.play(2, 3000.0)
+        self.assertEqual(len(self.announcements()), 2)
+
+    def test_going_to_a_blacklisted_activity_ends_the_session(self):
+        self.play(1, 1000.0)
+        self.play(9, 2000.0)
+        self.assertEqual(len(self.ended()), 1)
+        self.play(2, 3000.0)
+        self.assertEqual(len(self.announcements()), 2)
+
+    def listed(self):
+        self.redis.lpush('slash.list!CHANNEL', 'CHANNEL,U2')
+        self.bot.slash_list()
+        return self.bot.slack.slack_as_bot.chat_postEphemeral.call_args.kwargs['text']
+
+    def test_list_leaves_out_players_who_went_offline(self):
+        self.play(1, 1000.0)
+        self.assertIn('Player 1', self.listed())
+        self.play(0, 1000.0)
+        self.assertNotIn('Player 1', self.listed())
+
+    def test_repeating_an_activity_after_going_offline_is_announced(self):
+        self.bot.activity_filter = ActivityFilter.from_rules({'pairs': [(0, 0)], 'activities': [9], 'repeats': [1]})
+        self.play(1, 1000.0)
+        self.play(1, 2000.0)
+        self.assertEqual(len(self.announcements()), 1)
+        self.play(0, 2000.0)
+        self.play(1, 3000.0)
+        self.assertEqual(len(self.announcements()), 2)
+
+    def test_session_stops_being_live_once_the_player_is_not_seen_playing(self):
+        self.play(1, 1000.0)
+        self.redis.delete('latest_activity!3!M1!session!live')
+        self.play(2, 2000.0)
+        self.assertEqual(len(self.announcements()), 2)
+        self.assertEqual(self.ended()[0].kwargs['ts'], '1.0')
+
+
+class WorkerStateTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.slack = mock.MagicMock()
+        self.bot = make_bot(self.redis, self.slack)
+
+    def welcomes(self):
+        return self.slack.slack_as_bot.chat_postEphemeral.call_count
+
+    def test_users_are_welcomed_once_even_after_leaving_the_cache(self):
+        self.bot.first_seen('U1', 'u1', 'Hello.')
+        self.bot.slack_seen_cache.invalidate()
+        self.bot.first_seen('U1', 'u1', 'Hello.')
+        make_bot(self.redis, self.slack).first_seen('U1', 'u1', 'Hello.')
+        self.assertEqual(self.welcomes(), 1)
+
+    def test_squelches_keep_their_expiry_across_restarts(self):
+        self.bot.unable_to_find_users_squelch.set('U1', True, ttl=60)
+        self.bot.unable_to_find_users_squelch.set('U2', True, ttl=3600)
+        self.bot.checkpoint_state()
+        with mock.patch('hawthorne.time.time', return_value=time.time() + 120):
+            restarted = make_bot(self.redis)
+            self.assertTrue(restarted.restore_state())
+        squelch = {slack_id: seconds_left for slack_id, squelched, seconds_left in
+                   restarted.unable_to_find_users_squelch.items()}
+        self.assertEqual(list(squelch), ['U2'])
+        self.assertLessEqual(squelch['U2'], 3600 - 120)
+
+    def test_restores_the_seen_users_of_old_checkpoints(self):
+        self.redis.set('worker_state', json.dumps({'slack_seen': ['U1'], 'unable_to_find_users_squelch': {}}))
+        self.bot.restore_state()
+        self.bot.first_seen('U1', 'u1', 'Hello.')
+        self.assertEqual(self.welcomes(), 0)
+
+
+class PollOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = make_bot()
+        self.now = 100000.0
+        patcher = mock.patch('hawthorne.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def order(self, slack_ids):
+        members = [{'slack_id': slack_id} for slack_id in slack_ids]
+        return [member['slack_id'] for member in self.bot.poll_order(members)]
+
+    def test_tiers(self):
+        self.bot.record_poll('offline', make_activity(activity_hash=0, active_character=None))
+        self.bot.record_poll('orbit', make_activity(activity_hash=0))
+        self.bot.record_poll('filtered', make_activity(activity_hash=9, blacklisted=True))
+        self.bot.record_poll('unpolled', None)
+        self.bot.record_poll('mid-activity', make_activity(started=self.now - 3600))
+        self.bot.record_poll('recent', make_activity(started=self.now - 60))
+        self.assertEqual(
+            self.order(['offline', 'orbit', 'filtered', 'unpolled', 'mid-activity', 'recent', 'new']),
+            ['new', 'recent', 'mid-activity', 'offline', 'orbit', 'filtered', 'unpolled']
+        )
+
+    def test_waiting_moves_members_up_a_tier(self):
+        self.bot.record_poll('offline', make_activity(activity_hash=0, active_character=None))
+        self.now += 3 * hawthorne.POLL_PRIORITY_AGING
+        self.bot.record_poll('recent', make_activity(started=self.now))
+        self.assertEqual(self.order(['recent', 'offline']), ['offline', 'recent'])
+
+    def test_budgeted_ticks_poll_everyone(self):
+        polled = []
+
+        def get_activity_for_slack_user(member, fetch_from_cache=False):
+            polled.append(member['slack_id'])
+            if member['slack_id'] == 'playing':
+                return make_activity(slack_id='playing', started=self.now)
+            return make_activity(slack_id=member['slack_id'], activity_hash=0, active_character=None)
+
+        members = [{'slack_id': slack_id, 'slack_display_name': slack_id}
+                   for slack_id in ('playing', 'idle-1', 'idle-2')]
+        self.bot.fetch_slack_channel_members = lambda channel: members
+        self.bot.get_activity_for_slack_user = get_activity_for_slack_user
+        with mock.patch('hawthorne.POLL_BUDGET', 1):
+            for tick in range(30):
+                self.bot.get_players_activities()
+                self.now += 30
+        self.assertEqual(len(polled), 30)
+        self.assertGreater(polled.count('playing'), polled.count('idle-1'))
+        # Idle players are still polled every few minutes, however often the playing one could be.
+        for slack_id in ('idle-1', 'idle-2'):
+            ticks = [tick for tick, polled_id in enumerate(polled) if polled_id == slack_id]
+            self.assertGreaterEqual(len(ticks), 3)
+            self.assertLessEqual(max(b - a for a, b in zip(ticks, ticks[1:])), 3 * hawthorne.POLL_PRIORITY_AGING / 30)
+
+
+def channel_config(channel):
+    return {'channel': channel, 'log_channel': 'LOG', 'staging_channel': None, 'redis_prefix': f'{channel}!',
+            'slash_commands': True}
+
+
+class ShardedHawthorneTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.slack = mock.MagicMock()
+        self.bot = make_bot(self.redis, self.slack)
+
+    def worker(self, worker_id, channels=('C1',)):
+        coordinator = ShardCoordinator(self.redis, channels, worker_id=worker_id)
+        return ShardedHawthorne(self.bot, [channel_config(channel) for channel in channels], coordinator)
+
+    def announced(self):
+        return [call.kwargs['text'] for call in self.slack.slack_as_bot.chat_postMessage.call_args_list]
+
+    def test_cold_start_is_announced(self):
+        self.worker('w1').rebalance()
+        self.assertIn("I'm back! [Bot started.]", self.announced())
+
+    def test_taking_over_a_recently_reported_channel_is_quiet(self):
+        self.redis.set('C1!primed', 1)
+        worker = self.worker('w1')
+        worker.rebalance()
+        self.assertIn('C1', worker.bots)
+        self.assertNotIn("I'm back! [Bot started.]", self.announced())
+
+    def test_handing_off_a_channel_checkpoints_its_bot(self):
+        first = self.worker('w1', ('C1', 'C2'))
+        first.rebalance()
+        bots = dict(first.bots)
+        self.assertEqual(set(bots), {'C1', 'C2'})
+        second = self.worker('w2', ('C1', 'C2'))
+        second.rebalance()
+        first.rebalance()
+        handed_off, = set(bots) - set(first.bots)
+        self.assertFalse(bots[handed_off].keep_running)
+        self.assertTrue(self.redis.exists(f'{handed_off}!worker_state'))
+        second.rebalance()
+        self.assertEqual(set(second.bots), {handed_off})
+
+
+class FireteamDeferralTest(unittest.TestCase):
+    """Report ticks put off polling members whose fireteam-mate was just polled in the same activity."""
+    def setUp(self):
+        self.bot = make_bot()
+        self.now = 1000.0
+        patcher = mock.patch('utilities.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.parties = {}
+        self.polled = []
+        self.bot.poll_order = lambda members: members
+        self.bot.get_membership_for_slack_user = lambda member: (member['slack_id'], 3, f"M{member['slack_id']}")
+        self.bot.get_activity_for_slack_user = self.get_activity
+
+    def get_activity(self, member, fetch_from_cache=False):
+        slack_id = member['slack_id']
+        self.polled.append(slack_id)
+        return make_activity(slack_id=slack_id, membership_id=f'M{slack_id}', party=self.parties.get(slack_id, ()))
+
+    def tick(self, *slack_ids):
+        self.polled = []
+        self.bot.fetch_slack_channel_members = lambda channel: [
+            {'slack_id': slack_id, 'slack_display_name': slack_id} for slack_id in slack_ids]
+        self.bot.get_players_activities()
+        self.now += 30
+        return self.polled
+
+    def test_fireteam_mates_of_a_player_still_in_the_same_activity_are_deferred(self):
+        self.parties = {'A': ['MA', 'MB'], 'B': ['MA', 'MB']}
+        self.assertEqual(self.tick('A', 'B'), ['A', 'B'])
+        self.assertEqual(self.tick('A', 'B'), ['A'])
+
+    def test_deferral_stops_after_fireteam_defer_max(self):
+        self.parties = {'A': ['MA', 'MB'], 'B': ['MA', 'MB']}
+        self.tick('A', 'B')
+        b_polled_at = self.now - 30
+        while self.tick('A', 'B') == ['A']:
+            self.assertLessEqual(self.now - 30 - b_polled_at, hawthorne.FIRETEAM_DEFER_MAX)
+        self.assertGreater(self.now - 30 - b_polled_at, hawthorne.FIRETEAM_DEFER_MAX)
+
+    def test_solo_players_are_never_deferred(self):
+        self.parties = {'A': ['MA'], 'B': []}
+        for tick in range(3):
+            self.assertEqual(self.tick('A', 'B'), ['A', 'B'])
+
+    def test_mates_are_only_deferred_if_they_list_the_player_too(self):
+        self.parties = {'A': ['MA', 'MB'], 'B': ['MB']}
+        self.tick('A', 'B')
+        self.assertEqual(self.tick('A', 'B'), ['A', 'B'])
+
+    def test_mates_in_another_activity_are_not_deferred(self):
+        self.parties = {'A': ['MA', 'MB'], 'B': ['MA', 'MB']}
+        self.tick('A', 'B')
+        self.bot.last_polled.set('MB', make_activity(activity_hash=2, membership_id='MB', party=['MA', 'MB']))
+        self.assertEqual(self.tick('A', 'B'), ['A', 'B'])
+
+    def test_fireteam_mates_are_polled_beyond_the_budget(self):
+        self.parties = {'A': ['MA', 'MC'], 'C': ['MA', 'MC']}
+        with mock.patch('hawthorne.POLL_BUDGET', 1):
+            self.assertEqual(self.tick('A', 'B', 'C'), ['A', 'C'])
+
+
+class ActivityEmojiTableTest(unittest.TestCase):
+    def test_activities_are_categorized_by_mode_type(self):
+        # (name, activityModeTypes, directActivityModeType, emoji), with mode types as listed in the manifest.
+        activities = [
+            ('Raid', [7, 4], 4, ':raid2:'),
+            ('Dungeon', [7, 82], 82, ':dungeon:'),
+            ('Strike', [7, 18, 3], 3, ':vanguard2:'),
+            ('Nightfall', [7, 18, 46, 16], 46, ':nightfall:'),
+            ('Crucible', [5, 10], 10, ':crucible:'),
+            ('Gambit', [7, 63], 63, ':gambit:'),
+            ('Patrol', [7, 6], 6, ':fireteam:'),
+            ('Story', [7, 2], 2, ':fireteam:'),
+            ('Direct mode type only', None, 4, ':raid2:'),
+            ('Social space', [7], 7, None),
+            ('No mode types', [], None, None),
+        ]
+        definitions = {
+            str(activity_hash): {'activityModeTypes': mode_types, 'directActivityModeType': direct_mode_type}
+            for activity_hash, (name, mode_types, direct_mode_type, emoji) in enumerate(activities)
+        }
+        table = Hawthorne.activity_emoji_table(definitions)
+        for activity_hash, (name, mode_types, direct_mode_type, emoji) in enumerate(activities):
+            with self.subTest(activity=name):
+                self.assertEqual(table.get(str(activity_hash)), emoji)
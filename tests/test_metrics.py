@@ -0,0 +1,68 @@
+import unittest
+
+from metrics import Metrics, merge_prometheus
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics('bungie_api')
+        self.metrics.observe_request('/Profile/', 200, 'Success', 0.2, 1024)
+        self.metrics.observe_request('/Profile/', 200, 'Success', 3.0, 1024)
+        self.metrics.observe_request('/Profile/', 503, 'SystemDisabled', 0.01, 100)
+        self.metrics.observe_request('/Search/', 'error', 'ConnectionError', 10.5, 0)
+
+    def test_to_prometheus(self):
+        lines = self.metrics.to_prometheus().splitlines()
+        for line in (
+            '# TYPE bungie_api_requests_total counter',
+            'bungie_api_requests_total{endpoint="/Profile/",status_code="200",error_status="Success"} 2',
+            'bungie_api_requests_total{endpoint="/Profile/",status_code="503",error_status="SystemDisabled"} 1',
+            'bungie_api_requests_total{endpoint="/Search/",status_code="error",error_status="ConnectionError"} 1',
+            '# TYPE bungie_api_request_duration_seconds histogram',
+            'bungie_api_request_duration_seconds_bucket{endpoint="/Profile/",le="0.05"} 1',
+            'bungie_api_request_duration_seconds_bucket{endpoint="/Profile/",le="0.25"} 2',
+            'bungie_api_request_duration_seconds_bucket{endpoint="/Profile/",le="2.5"} 2',
+            'bungie_api_request_duration_seconds_bucket{endpoint="/Profile/",le="5.0"} 3',
+            'bungie_api_request_duration_seconds_bucket{endpoint="/Profile/",le="+Inf"} 3',
+            'bungie_api_request_duration_seconds_sum{endpoint="/Profile/"} 3.210000',
+            'bungie_api_request_duration_seconds_count{endpoint="/Profile/"} 3',
+            'bungie_api_request_duration_seconds_bucket{endpoint="/Search/",le="10.0"} 0',
+            'bungie_api_request_duration_seconds_bucket{endpoint="/Search/",le="+Inf"} 1',
+            'bungie_api_response_bytes_total{endpoint="/Profile/"} 2148',
+            'bungie_api_response_bytes_total{endpoint="/Search/"} 0',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, lines)
+
+    def test_label_values_are_escaped(self):
+        self.metrics.observe_request('/a"b\\c\n/', 200, '', 0.1, 0)
+        self.assertIn('endpoint="/a\\"b\\\\c\\n/"', self.metrics.to_prometheus())
+
+    def test_summary_counts_errors_and_failed_responses(self):
+        lines = self.metrics.summary().splitlines()
+        self.assertEqual(lines[0], 'bungie_api: 4 requests across 2 endpoints')
+        self.assertIn('/Profile/', lines[1])
+        self.assertIn('1 failed', lines[1])
+        self.assertIn('1 failed', lines[2])
+        self.assertIn('mean 10500ms', lines[2])
+
+    def test_reset(self):
+        self.metrics.reset()
+        self.assertEqual(self.metrics.summary(), 'bungie_api: 0 requests across 0 endpoints')
+
+    def test_merge_prometheus_labels_each_instance(self):
+        other = Metrics('bungie_api')
+        other.observe_request('/Search/', 200, 'Success', 0.1, 10)
+        lines = merge_prometheus({'w2': other.to_prometheus(), 'w1': self.metrics.to_prometheus()}).splitlines()
+        self.assertEqual(lines.count('# TYPE bungie_api_requests_total counter'), 1)
+        self.assertIn('bungie_api_requests_total{instance="w1",endpoint="/Search/",status_code="error",'
+                      'error_status="ConnectionError"} 1', lines)
+        self.assertIn('bungie_api_requests_total{instance="w2",endpoint="/Search/",status_code="200",'
+                      'error_status="Success"} 1', lines)
+        # Each metric's samples follow its own HELP and TYPE lines.
+        type_line = lines.index('# TYPE bungie_api_response_bytes_total counter')
+        self.assertTrue(all(line.startswith('bungie_api_response_bytes_total') for line in lines[type_line + 1:]))
+        self.assertEqual(len(lines[type_line + 1:]), 3)
+
+    def test_merge_prometheus_of_nothing(self):
+        self.assertEqual(merge_prometheus({}), '')
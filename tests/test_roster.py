@@ -0,0 +1,54 @@
+import json
+import unittest
+
+import fakeredis
+
+import roster
+from roster import Roster, handle_event, member_record
+
+
+def profile(display_name, psn=None):
+    fields = {roster.SLACK_FIELD_PSN: {'value': psn}} if psn else {}
+    return {'display_name': display_name, 'fields': fields}
+
+
+class HandleEventTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.roster = Roster(self.redis, 'C1')
+        self.roster.replace(['U1'], [member_record('U1', profile('before', psn='Guardian#1'))])
+
+    def test_membership_changes(self):
+        self.assertTrue(handle_event(self.redis, {'type': 'member_joined_channel', 'channel': 'C1', 'user': 'U2'}))
+        self.assertEqual(self.roster.member_ids(), ['U1', 'U2'])
+        self.assertTrue(handle_event(self.redis, {'type': 'member_left_channel', 'channel': 'C1', 'user': 'U1'}))
+        self.assertEqual(self.roster.member_ids(), ['U2'])
+
+    def test_user_change_without_profile_fields_keeps_gamertags(self):
+        event = {'type': 'user_change', 'user': {'id': 'U1', 'profile': {'display_name': 'after'}}}
+        self.assertTrue(handle_event(self.redis, event))
+        record = self.roster.records(['U1'])['U1']
+        self.assertEqual(record['slack_display_name'], 'after')
+        self.assertEqual(record['destiny_psn_id'], 'Guardian#1')
+
+    def test_user_change_with_profile_fields_replaces_gamertags(self):
+        event = {'type': 'user_change', 'user': {'id': 'U1', 'profile': profile('after', psn='Guardian#2')}}
+        handle_event(self.redis, event)
+        self.assertEqual(self.roster.records(['U1'])['U1']['destiny_psn_id'], 'Guardian#2')
+
+    def test_user_change_for_users_outside_the_rosters_is_ignored(self):
+        event = {'type': 'user_change', 'user': {'id': 'U9', 'profile': profile('stranger', psn='Guardian#9')}}
+        self.assertFalse(handle_event(self.redis, event))
+        self.assertIsNone(self.redis.hget(roster.PROFILES_KEY, 'U9'))
+
+    def test_resync_prunes_profiles_of_members_in_no_roster(self):
+        Roster(self.redis, 'C2').replace(['U2', 'U3'], [member_record('U2', profile('u2')),
+                                                        member_record('U3', profile('u3'))])
+        handle_event(self.redis, {'type': 'member_left_channel', 'channel': 'C1', 'user': 'U1'})
+        handle_event(self.redis, {'type': 'member_left_channel', 'channel': 'C2', 'user': 'U3'})
+        handle_event(self.redis, {'type': 'member_joined_channel', 'channel': 'C1', 'user': 'U3'})
+        self.roster.replace(['U3'], [])
+        self.assertEqual(sorted(self.redis.hkeys(roster.PROFILES_KEY)), ['U2', 'U3'])
+
+    def test_other_events_are_ignored(self):
+        self.assertFalse(handle_event(self.redis, {'type': 'message', 'text': json.dumps({})}))
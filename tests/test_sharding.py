@@ -0,0 +1,97 @@
+import time
+import unittest
+from unittest import mock
+
+import fakeredis
+
+from sharding import RedisLease, ShardCoordinator
+
+
+class RedisLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.lease = RedisLease(self.redis, 'lease', 'w1', ttl=60)
+        self.rival = RedisLease(self.redis, 'lease', 'w2', ttl=60)
+
+    def test_only_one_owner_at_a_time(self):
+        self.assertTrue(self.lease.acquire())
+        self.assertFalse(self.rival.acquire())
+        self.assertTrue(self.lease.acquire())
+        self.lease.release()
+        self.assertFalse(self.lease.held)
+        self.assertTrue(self.rival.acquire())
+
+    def test_a_lost_lease_is_not_renewed(self):
+        self.lease.acquire()
+        self.redis.delete('lease')
+        self.rival.acquire()
+        self.assertFalse(self.lease.renew())
+        self.assertFalse(self.lease.held)
+        self.assertEqual(self.redis.get('lease'), 'w2')
+        self.assertGreater(self.redis.pttl('lease'), 59000)
+
+    def test_release_leaves_other_owners_leases_alone(self):
+        self.rival.acquire()
+        self.lease.release()
+        self.assertEqual(self.redis.get('lease'), 'w2')
+
+    def test_renew_extends_the_lease(self):
+        self.lease.acquire()
+        self.redis.pexpire('lease', 1000)
+        self.assertTrue(self.lease.renew())
+        self.assertGreater(self.redis.pttl('lease'), 59000)
+
+
+class ShardCoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        # fakeredis expires keys by time.time() too, so moving the clock on expires leases.
+        self.now = time.time()
+        patcher = mock.patch('sharding.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def coordinator(self, worker_id):
+        return ShardCoordinator(self.redis, ['C1', 'C2', 'C3', 'C4'], worker_id=worker_id, lease_ttl=60)
+
+    def test_two_workers_split_the_shards(self):
+        first, second = self.coordinator('w1'), self.coordinator('w2')
+        self.assertEqual(len(first.rebalance()), 4)
+        second.rebalance()
+        shed = []
+        self.assertEqual(len(first.rebalance(before_release=shed.append)), 2)
+        self.assertEqual(len(shed), 2)
+        self.assertEqual(sorted(second.rebalance()), sorted(shed))
+
+    def test_survivor_takes_over_once_the_leases_expire(self):
+        first, second = self.coordinator('w1'), self.coordinator('w2')
+        first.rebalance()
+        second.rebalance()
+        first.rebalance()
+        second.rebalance()
+        # The first worker dies, so stops heartbeating and renewing; its leases are still held until the TTL passes.
+        self.now += 30
+        self.assertEqual(len(second.rebalance()), 2)
+        self.now += 31
+        self.assertEqual(len(second.rebalance()), 4)
+        self.assertEqual(second.live_workers(), ['w2'])
+
+    def test_release_all(self):
+        first, second = self.coordinator('w1'), self.coordinator('w2')
+        first.rebalance()
+        first.release_all()
+        self.assertEqual(first.owned_shards(), [])
+        self.assertEqual(len(second.rebalance()), 4)
+        self.assertEqual(second.live_workers(), ['w2'])
+
+
+class ShardCoordinatorRenewerTest(unittest.TestCase):
+    def test_background_renewer_keeps_leases_alive(self):
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+        coordinator = ShardCoordinator(redis_client, ['C1'], worker_id='w1', lease_ttl=0.3)
+        coordinator.rebalance()
+        coordinator.start_renewing()
+        self.addCleanup(coordinator.release_all)
+        time.sleep(0.6)
+        self.assertEqual(redis_client.get('hawthorne!lease!C1'), 'w1')
+        self.assertEqual(coordinator.owned_shards(), ['C1'])
@@ -0,0 +1,73 @@
+import datetime
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+import fakeredis
+
+from token_store import TokenStore
+
+
+def token(name, expires_in):
+    now = datetime.datetime.now().timestamp()
+    return {'access_token': name, 'refresh_token': f'{name}-refresh', 'expires_at': now + expires_in,
+            'refresh_expires_at': now + 90 * 24 * 60 * 60}
+
+
+class TokenStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.redis.set('bungie!oauth_token', json.dumps(token('old', 60)))
+        self.refreshed_with = []
+        self.refreshed_with_lock = threading.Lock()
+
+    def make_store(self):
+        bungie = mock.MagicMock()
+
+        def refresh_oauth_token(persist=True):
+            with self.refreshed_with_lock:
+                self.refreshed_with.append(bungie.oauth_token['refresh_token'])
+            time.sleep(0.1)
+            return token(f'new-{len(self.refreshed_with)}', 3600)
+
+        bungie.refresh_oauth_token.side_effect = refresh_oauth_token
+        return TokenStore(self.redis, bungie)
+
+    def refresh_concurrently(self, stores):
+        results = []
+        threads = [threading.Thread(target=lambda store=store: results.append(store.refresh())) for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_threads_sharing_a_store_refresh_once(self):
+        store = self.make_store()
+        results = self.refresh_concurrently([store] * 8)
+        self.assertEqual(self.refreshed_with, ['old-refresh'])
+        self.assertEqual({result['access_token'] for result in results}, {'new-1'})
+
+    def test_two_stores_refresh_once(self):
+        results = self.refresh_concurrently([self.make_store(), self.make_store()])
+        self.assertEqual(self.refreshed_with, ['old-refresh'])
+        self.assertEqual({result['access_token'] for result in results}, {'new-1'})
+
+    def test_uses_a_token_refreshed_while_waiting_for_the_lease(self):
+        store = self.make_store()
+        acquire = store.lock.acquire
+
+        def acquire_after_another_process_refreshes():
+            self.redis.set('bungie!oauth_token', json.dumps(token('theirs', 3600)))
+            return acquire()
+
+        store.lock.acquire = acquire_after_another_process_refreshes
+        self.assertEqual(store.refresh()['access_token'], 'theirs')
+        self.assertEqual(self.refreshed_with, [])
+
+    def test_does_not_refresh_a_fresh_token(self):
+        self.redis.set('bungie!oauth_token', json.dumps(token('fresh', 3600)))
+        self.assertEqual(self.make_store().refresh()['access_token'], 'fresh')
+        self.assertEqual(self.refreshed_with, [])
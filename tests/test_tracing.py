@@ -0,0 +1,57 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import Tracer
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer(enabled=True)
+
+    def test_exclusive_time_excludes_children(self):
+        with self.tracer.tick('action') as tick:
+            with self.tracer.span('member', 'U1'):
+                time.sleep(0.02)
+                with self.tracer.span('bungie', 'profile'):
+                    time.sleep(0.05)
+        self.assertLess(tick.subsystem_seconds['member'], 0.04)
+        self.assertGreaterEqual(tick.subsystem_seconds['bungie'], 0.05)
+
+    def test_spans_on_pool_threads_are_parented_to_the_submitting_span(self):
+        def search(_):
+            with self.tracer.span('bungie', 'search'):
+                time.sleep(0.05)
+
+        with self.tracer.tick('action') as tick:
+            with self.tracer.span('member', 'U1') as member:
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    list(executor.map(self.tracer.bind(search), range(4)))
+
+        searches = [span for span in tick.spans if span.subsystem == 'bungie']
+        self.assertEqual(len(searches), 4)
+        self.assertTrue(all(span.parent is member for span in searches))
+        # The member span only waited on its concurrent searches, so has (almost) no time of its own.
+        self.assertLess(tick.subsystem_seconds['member'], 0.03)
+        self.assertGreaterEqual(tick.subsystem_seconds['bungie'], 0.2)
+
+    def test_spans_on_unrelated_threads_are_not_counted_in_the_tick(self):
+        def renew():
+            with self.tracer.span('redis', 'renew'):
+                time.sleep(0.01)
+
+        with self.tracer.tick('action') as tick:
+            with self.tracer.span('hawthorne', 'action'):
+                thread = threading.Thread(target=renew)
+                thread.start()
+                thread.join()
+        self.assertEqual([span.subsystem for span in tick.spans], ['hawthorne'])
+        self.assertNotIn('redis', tick.subsystem_seconds)
+
+    def test_bind_is_a_no_op_when_disabled(self):
+        def function():
+            pass
+
+        self.assertIs(Tracer(enabled=False).bind(function), function)
+        self.assertIs(self.tracer.bind(function), function)
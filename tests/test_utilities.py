@@ -0,0 +1,106 @@
+import datetime
+import unittest
+from unittest import mock
+
+from utilities import BUNGIE_TIMESTAMP_FORMAT, TtlCache, parse_bungie_timestamp
+
+
+class ParseBungieTimestampTest(unittest.TestCase):
+    def setUp(self):
+        parse_bungie_timestamp.cache_clear()
+
+    def test_z_suffix(self):
+        self.assertEqual(
+            parse_bungie_timestamp('2019-11-02T18:04:27Z'),
+            datetime.datetime(2019, 11, 2, 18, 4, 27, tzinfo=datetime.timezone.utc)
+        )
+
+    def test_explicit_offset(self):
+        parsed = parse_bungie_timestamp('2019-11-02T18:04:27+0100')
+        self.assertEqual(parsed, datetime.datetime(2019, 11, 2, 17, 4, 27, tzinfo=datetime.timezone.utc))
+        self.assertEqual(parsed.utcoffset(), datetime.timedelta(hours=1))
+
+    def test_fractional_seconds(self):
+        self.assertEqual(
+            parse_bungie_timestamp('2019-11-02T18:04:27.123Z'),
+            datetime.datetime(2019, 11, 2, 18, 4, 27, 123000, tzinfo=datetime.timezone.utc)
+        )
+
+    def test_invalid_input_raises_value_error(self):
+        for value in ('', 'yesterday', '2019-11-02', '2019-13-02T18:04:27Z', '2019-11-02T18:04:27'):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_bungie_timestamp(value)
+
+    def test_matches_strptime(self):
+        for value in ('2019-11-02T18:04:27Z', '1980-01-01T01:01:01Z', '2020-02-29T23:59:59Z',
+                      '2019-11-02T18:04:27+0000', '2019-11-02T18:04:27-0530'):
+            with self.subTest(value=value):
+                expected = datetime.datetime.strptime(value, BUNGIE_TIMESTAMP_FORMAT)
+                parsed = parse_bungie_timestamp(value)
+                self.assertEqual(parsed, expected)
+                self.assertEqual(parsed.utcoffset(), expected.utcoffset())
+
+    def test_memoized(self):
+        self.assertIs(parse_bungie_timestamp('2019-11-02T18:04:27Z'), parse_bungie_timestamp('2019-11-02T18:04:27Z'))
+
+
+class TtlCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('utilities.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = TtlCache(60)
+        cache.set('a', 1)
+        self.now += 60
+        self.assertEqual(cache.get('a'), 1)
+        self.now += 1
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_entries_can_have_their_own_ttl(self):
+        cache = TtlCache(60)
+        cache.set('a', 1, ttl=10)
+        self.now += 11
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+
+    def test_evicts_the_least_recently_used(self):
+        cache = TtlCache(60, maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_items_skip_expired_entries_and_report_the_time_left(self):
+        cache = TtlCache(60)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=10)
+        self.now += 20
+        self.assertEqual(cache.items(), [('a', 1, 40)])
+
+    def test_invalidate(self):
+        cache = TtlCache(60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.invalidate('a')
+        self.assertEqual([key for key, value, seconds_left in cache.items()], ['b'])
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+    def test_stats(self):
+        cache = TtlCache(60, maxsize=1)
+        self.assertIsNone(cache.stats()['hit_rate'])
+        cache.set('a', 1)
+        cache.get('a')
+        cache.set('b', 2)
+        cache.get('a')
+        cache.get('b')
+        cache.get('c')
+        self.assertEqual(cache.stats(), {'size': 1, 'maxsize': 1, 'hits': 2, 'misses': 2, 'evictions': 1,
+                                         'hit_rate': 0.5})
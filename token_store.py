@@ -0,0 +1,111 @@
+"""A Redis-backed store for the bot's Bungie.net OAuth token, refreshed in the background before it expires.
+
+The token is kept in Redis, so a restarted worker picks up where the last one left off instead of asking for a new
+login, and every worker sees a token refreshed by any other. Refreshes happen under a Redis lease, so that concurrent
+callers (threads or processes) don't refresh the same token twice, which would invalidate the first refresh.
+
+Example usage:
+    store = TokenStore(my_redis, bungie)
+    bungie.oauth_token = store.load() or cli_bungie_auth(api_token)
+    store.save(bungie.oauth_token)
+    store.start()
+"""
+import datetime
+import json
+import threading
+import time
+import uuid
+
+from sharding import RedisLease
+
+
+class TokenStore:
+    """Persists a BungieApi's OAuth token in Redis and keeps it fresh."""
+    REFRESH_MARGIN = 10 * 60
+    CHECK_INTERVAL = 60
+    LOCK_TTL = 30
+
+    def __init__(self, redis_client, bungie_api, key='bungie!oauth_token'):
+        """
+        :param redis_client: a redis.Redis
+        :param bungie_api: the BungieApi whose token to persist and refresh; it refreshes through this store
+        :param key: the Redis key to keep the token in
+        """
+        self.redis = redis_client
+        self.bungie = bungie_api
+        self.key = key
+        self.lock = RedisLease(redis_client, f'{key}!lock', uuid.uuid4().hex, self.LOCK_TTL)
+        self.bungie.token_store = self
+        # The lease only excludes other processes: every thread of this one shares its owner id.
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """Return the stored token, or None if there isn't one or it can no longer be refreshed.
+
+        :return: dict
+        """
+        token = self.redis.get(self.key)
+        if not token:
+            return None
+        token = json.loads(token)
+        if token.get('refresh_expires_at', 0) < datetime.datetime.now().timestamp():
+            return None
+        return token
+
+    def save(self, token):
+        self.redis.set(self.key, json.dumps(token))
+
+    def needs_refresh(self, token):
+        return token.get('expires_at', 0) - datetime.datetime.now().timestamp() < self.REFRESH_MARGIN
+
+    def refresh(self, force=False):
+        """Make sure the client has a token that won't expire within REFRESH_MARGIN seconds, refreshing it if needed.
+
+        Only the caller holding the lock (a thread lock, then a Redis lease) refreshes; others wait for it and then use
+        the token it stored.
+
+        :param force: refresh even if the token isn't due to expire yet
+        :return: the current token
+        """
+        with self._refresh_lock:
+            deadline = time.monotonic() + self.LOCK_TTL
+            while True:
+                stored = self.load()
+                if stored and not (force or self.needs_refresh(stored)):
+                    self.bungie.oauth_token = stored
+                    return stored
+                if self.lock.acquire():
+                    try:
+                        # Another process may have refreshed the token while we were waiting for the lease, in which
+                        # case the refresh token we loaded has been spent: use theirs.
+                        latest = self.load()
+                        if latest and latest != stored and not self.needs_refresh(latest):
+                            self.bungie.oauth_token = latest
+                            return latest
+                        if latest:
+                            self.bungie.oauth_token = latest
+                        token = self.bungie.refresh_oauth_token(persist=True)
+                        self.save(token)
+                        return token
+                    finally:
+                        self.lock.release()
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for another process to refresh the token in {self.key}")
+                time.sleep(0.5)
+
+    def start(self):
+        """Refresh the token from a background thread, ahead of its expiry, until stop() is called."""
+        def refresh_until_stopped():
+            while not self._stopped.wait(self.CHECK_INTERVAL):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Unable to refresh the Bungie.net OAuth token: {e}")
+
+        self._thread = threading.Thread(target=refresh_until_stopped, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,307 @@
+"""Lightweight tracing spans and an opt-in sampling profiler for the Hawthorne ticker.
+
+Code wraps units of work in spans attributed to a subsystem ('bungie', 'slack', 'redis', 'manifest', or 'hawthorne'
+and 'member' for the bot's own code, per action and per channel member). Each span's exclusive time (its duration
+minus the time covered by its child spans) is added to the subsystem totals of the current tick, so a slow tick can be
+blamed on the right dependency. Spans are passed to any registered hooks as they finish.
+
+Each thread has its own current tick. Work handed to other threads (e.g. a ThreadPoolExecutor) is parented to the
+submitting span, and counted in its tick, by wrapping it with tracer.bind(), so the time the submitting span spends
+waiting on it isn't counted twice. Spans on other threads (e.g. background lease renewal) aren't counted in any tick.
+
+Tracing is off unless HAWTHORNE_TRACE is set (or tracer.enabled is set to True), in which case span() costs a single
+attribute check. HAWTHORNE_PROFILE additionally runs a sampling profiler during each tick, and dumps its samples in
+the folded-stack format understood by flamegraph.pl and speedscope whenever a tick is slow.
+
+Example usage:
+    from tracing import tracer
+
+    with tracer.tick('report_player_activity') as tick:
+        with tracer.span('bungie', '/Destiny2/{membershipType}/Profile/{destinyMembershipId}/'):
+            ...
+        with tracer.span('member', slack_id):
+            results = list(executor.map(tracer.bind(search), gamertags))
+    print(tick.subsystem_seconds)
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class Span:
+    """A single timed unit of work."""
+    __slots__ = ('subsystem', 'name', 'started', 'duration', 'child_duration', 'child_intervals', 'parent')
+
+    def __init__(self, subsystem, name, parent):
+        self.subsystem = subsystem
+        self.name = name
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.duration = None
+        self.child_duration = 0.0
+        self.child_intervals = []
+
+    def _finish(self):
+        """Set the span's duration, and how much of it its child spans (which may overlap) covered."""
+        finished = time.perf_counter()
+        self.duration = finished - self.started
+        covered = 0.0
+        covered_until = self.started
+        for child_started, child_finished in sorted(self.child_intervals):
+            child_started = max(child_started, covered_until)
+            child_finished = min(child_finished, finished)
+            if child_finished > child_started:
+                covered += child_finished - child_started
+                covered_until = child_finished
+        self.child_duration = covered
+
+    @property
+    def exclusive_duration(self):
+        return self.duration - self.child_duration
+
+
+class Tick:
+    """The spans recorded while one action of the ticker ran, and the time they spent in each subsystem.
+
+    Spans finished on threads the tick's work was handed to with Tracer.bind() (e.g. concurrent Bungie.net lookups)
+    count towards the tick too, so subsystem totals can add up to more than the tick's wall-clock duration.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration = None
+        self.subsystem_seconds = collections.Counter()
+        self.spans = []
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.subsystem_seconds[span.subsystem] += span.exclusive_duration
+            self.spans.append(span)
+
+    def slowest(self, subsystem=None, count=5):
+        """Return the longest spans of the tick, optionally only those of one subsystem."""
+        spans = [s for s in self.spans if subsystem is None or s.subsystem == subsystem]
+        return sorted(spans, key=lambda s: s.duration, reverse=True)[:count]
+
+    def summary(self):
+        """Describe where the tick's time went, as a line of text."""
+        breakdown = ', '.join(f'{subsystem} {seconds:.2f}s' for subsystem, seconds in
+                              self.subsystem_seconds.most_common())
+        return f'{self.name} took {self.duration:.2f}s: {breakdown or "no spans"}'
+
+
+class _NullContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class _SpanContext:
+    __slots__ = ('tracer', 'subsystem', 'name', 'span')
+
+    def __init__(self, tracer, subsystem, name):
+        self.tracer = tracer
+        self.subsystem = subsystem
+        self.name = name
+        self.span = None
+
+    def __enter__(self):
+        self.span = self.tracer._push(self.subsystem, self.name)
+        return self.span
+
+    def __exit__(self, *exc_info):
+        self.tracer._pop(self.span)
+        return False
+
+
+class _TickContext:
+    __slots__ = ('tracer', 'tick', 'profiler')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.tick = Tick(name)
+        self.profiler = None
+
+    def __enter__(self):
+        self.tracer._local.tick = self.tick
+        if self.tracer.profile:
+            self.profiler = SamplingProfiler(threading.get_ident(), self.tracer.profile_interval)
+            self.profiler.start()
+        return self.tick
+
+    def __exit__(self, *exc_info):
+        self.tick.duration = time.perf_counter() - self.tick.started
+        self.tracer._local.tick = None
+        if self.profiler:
+            self.profiler.stop()
+            self.tick.profile = self.profiler
+        return False
+
+
+class Tracer:
+    """Creates spans and ticks, and hands finished spans to hooks."""
+    def __init__(self, enabled=False, profile=False, profile_interval=0.005):
+        self.enabled = enabled
+        self.profile = profile
+        self.profile_interval = profile_interval
+        self.hooks = []
+        # Each thread's span stack and current tick.
+        self._local = threading.local()
+
+    def add_hook(self, hook):
+        """Register a callable to receive every finished Span.
+
+        :param hook:
+        :return:
+        """
+        self.hooks.append(hook)
+
+    def span(self, subsystem, name=None):
+        """A context manager timing the enclosed block as a span of the given subsystem.
+
+        :param subsystem: e.g. 'bungie', 'slack', 'redis', 'manifest' or 'hawthorne'
+        :param name: what the span is doing, e.g. an endpoint or a Slack member id
+        :return:
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _SpanContext(self, subsystem, name)
+
+    def tick(self, name):
+        """A context manager collecting the spans of one ticker action into a Tick.
+
+        :param name:
+        :return:
+        """
+        return _TickContext(self, name)
+
+    def bind(self, function):
+        """Wrap a callable to be run on another thread so that its spans are children of the current span, in its tick.
+
+        :param function:
+        :return: the wrapped callable, or function itself if tracing is disabled or there's no current span
+        """
+        if not self.enabled:
+            return function
+        stack = getattr(self._local, 'stack', None)
+        if not stack:
+            return function
+        parent = stack[-1]
+        tick = getattr(self._local, 'tick', None)
+
+        def bound(*args, **kwargs):
+            previous = getattr(self._local, 'stack', None), getattr(self._local, 'tick', None)
+            self._local.stack, self._local.tick = [parent], tick
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._local.stack, self._local.tick = previous
+        return bound
+
+    def _push(self, subsystem, name):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        span = Span(subsystem, name, stack[-1] if stack else None)
+        stack.append(span)
+        return span
+
+    def _pop(self, span):
+        span._finish()
+        self._local.stack.pop()
+        if span.parent is not None:
+            span.parent.child_intervals.append((span.started, span.started + span.duration))
+        tick = getattr(self._local, 'tick', None)
+        if tick is not None:
+            tick.add(span)
+        for hook in self.hooks:
+            hook(span)
+
+
+class TracedProxy:
+    """Wrap an object so that every method call on it is recorded as a span of the given subsystem.
+
+    Example usage:
+        redis_client = TracedProxy(redis.from_url(url), 'redis')
+    """
+    def __init__(self, wrapped, subsystem, span_tracer=None):
+        self._wrapped = wrapped
+        self._subsystem = subsystem
+        self._tracer = span_tracer or tracer
+
+    def __getattr__(self, item):
+        attribute = getattr(self._wrapped, item)
+        if not callable(attribute):
+            return attribute
+
+        def traced(*args, **kwargs):
+            with self._tracer.span(self._subsystem, item):
+                return attribute(*args, **kwargs)
+        return traced
+
+
+def traced(wrapped, subsystem):
+    """Wrap an object in a TracedProxy for the given subsystem, but only if tracing is enabled.
+
+    :param wrapped:
+    :param subsystem:
+    :return:
+    """
+    if tracer.enabled and not isinstance(wrapped, TracedProxy):
+        return TracedProxy(wrapped, subsystem)
+    return wrapped
+
+
+class SamplingProfiler:
+    """Periodically samples one thread's call stack from a background thread, counting folded stacks."""
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        """Write the samples in folded-stack format ('frame;frame;frame count' per line).
+
+        :param path:
+        :return:
+        """
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+tracer = Tracer(
+    enabled=bool(os.environ.get('HAWTHORNE_TRACE', False)) or bool(os.environ.get('HAWTHORNE_PROFILE', False)),
+    profile=bool(os.environ.get('HAWTHORNE_PROFILE', False)),
+)
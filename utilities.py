@@ -1,6 +1,11 @@
 _logger = None
 
+import collections
+import datetime
+import functools
 import logging
+import threading
+import time
 
 try:
     from django.conf import settings
@@ -32,3 +37,134 @@ class Logger:
             _logger.log(msg=msg, level=logging.INFO)
 
 logger = Logger()
+
+BUNGIE_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_bungie_timestamp(value):
+    """Parse a Bungie.net timestamp such as '2019-11-02T18:04:27Z' into a timezone-aware datetime.
+
+    Built on fromisoformat() and memoized, since the same activity start times come back on every poll of every
+    character. Timestamps in Bungie's fixed format parse exactly as datetime.strptime(value, BUNGIE_TIMESTAMP_FORMAT)
+    would; 'Z' timestamps that fromisoformat() is laxer about, with fractional seconds or a space separator, are
+    accepted too. Anything else falls back to strptime, and raises its ValueError.
+
+    :param value: a timestamp string in Bungie's ISO 8601 format
+    :return: datetime.datetime
+    """
+    # Python 3.8's fromisoformat() doesn't understand the 'Z' suffix, only an explicit offset.
+    if value.endswith('Z'):
+        try:
+            return datetime.datetime.fromisoformat(value[:-1] + '+00:00')
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(value, BUNGIE_TIMESTAMP_FORMAT)
+
+
+class _CacheEntry:
+    __slots__ = ('expires_at', 'value')
+
+    def __init__(self, expires_at, value):
+        self.expires_at = expires_at
+        self.value = value
+
+
+class TtlCache:
+    """A small thread-safe in-process cache whose entries expire a fixed number of seconds after they are set.
+
+    Given a maxsize, it also holds at most that many entries, evicting the least recently used first, so that a cache
+    keyed by e.g. Slack user doesn't grow for as long as the process runs. It counts hits, misses and evictions, for
+    stats() to report.
+    """
+    def __init__(self, ttl, maxsize=None):
+        """
+        :param ttl: seconds an entry lasts after it is set
+        :param maxsize: the most entries to hold, or None for no limit
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or has expired.
+
+        :param key:
+        :param default:
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if time.monotonic() > entry.expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def set(self, key, value, ttl=None):
+        """Cache a value for key until the TTL elapses, evicting the least recently used entries if the cache is full.
+
+        :param key:
+        :param value:
+        :param ttl: seconds the entry lasts, if not the cache's TTL (e.g. the remainder of a restored entry's TTL)
+        :return:
+        """
+        with self._lock:
+            self._entries[key] = _CacheEntry(time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop a single key, or every key if none is given.
+
+        :param key:
+        :return:
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def items(self):
+        """Return the (key, value, seconds left) of the entries that haven't expired, e.g. to persist them.
+
+        :return: list
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, entry.value, entry.expires_at - now)
+                for key, entry in self._entries.items() if now <= entry.expires_at
+            ]
+
+    def stats(self):
+        """Report the cache's size and how well it is doing.
+
+        :return: dict
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }